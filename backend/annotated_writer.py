@@ -0,0 +1,130 @@
+"""
+Annotated video encoding in a separate process.
+
+Drawing boxes and mp4v encoding used to run inline with detection, one frame
+at a time. AnnotatedVideoWriter hands each frame to a writer process
+instead: the frame is copied into a slot of a shared-memory ring and only
+the slot number and the frame's (n, 6) detection array go through the
+queue. The writer draws, encodes and hands the slot back. When all slots are
+in use, write() waits, so a writer slower than detection applies back
+pressure rather than buffering the whole video.
+
+The writer process is spawned rather than forked, so it does not inherit
+the model or any GPU state.
+"""
+
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+WRITER_SLOTS = 16
+WRITER_POLL_SECONDS = 1.0
+
+
+def class_color(cls):
+    """Stable BGR color per class id."""
+    hue = (int(cls) * 47) % 180
+    return tuple(int(c) for c in cv2.cvtColor(np.uint8([[[hue, 200, 230]]]), cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def draw_detections(frame, detections, class_names):
+    """Draws (n, 6) x1, y1, x2, y2, confidence, class id boxes with labels onto frame in place."""
+    thickness = max(1, round(sum(frame.shape[:2]) / 2 * 0.003))
+    for x1, y1, x2, y2, conf, cls in detections.tolist():
+        color = class_color(cls)
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness, cv2.LINE_AA)
+        label = f"{class_names[int(cls)]} {conf:.2f}"
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, thickness / 3, max(1, thickness - 1))
+        top = y1 - h - 3 if y1 - h - 3 >= 0 else y1 + h + 3
+        cv2.rectangle(frame, (x1, y1), (x1 + w, top), color, -1, cv2.LINE_AA)
+        cv2.putText(frame, label, (x1, max(y1, top) - 2), cv2.FONT_HERSHEY_SIMPLEX, thickness / 3,
+                    (255, 255, 255), max(1, thickness - 1), cv2.LINE_AA)
+    return frame
+
+
+def _writer_main(shm_name, slots, shape, output_path, fps, class_names, todo, free):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (shape[1], shape[0]))
+    try:
+        while True:
+            item = todo.get()
+            if item is None:
+                break
+            slot, detections = item
+            frame = ring[slot]
+            if len(detections):
+                draw_detections(frame, detections, class_names)
+            out.write(frame)
+            free.put(slot)
+    finally:
+        out.release()
+        # Views into the segment must be gone before it can be closed
+        ring = frame = None
+        shm.close()
+
+
+class AnnotatedVideoWriter:
+    """
+    Args:
+        output_path: Video file to write (mp4v)
+        fps: Output frame rate
+        size: (width, height) of every frame written
+        class_names: Class names indexed by class id, for the labels
+        slots: Frames that can be in flight between the caller and the writer
+    """
+
+    def __init__(self, output_path, fps, size, class_names, slots=WRITER_SLOTS):
+        width, height = size
+        self._shape = (height, width, 3)
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * height * width * 3)
+        self._ring = np.ndarray((slots,) + self._shape, dtype=np.uint8, buffer=self._shm.buf)
+        context = multiprocessing.get_context("spawn")
+        self._todo = context.Queue()
+        self._free = context.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._process = context.Process(
+            target=_writer_main, name="annotated-writer", daemon=True,
+            args=(self._shm.name, slots, self._shape, output_path, fps, list(class_names), self._todo, self._free))
+        self._process.start()
+        self._closed = False
+
+    def write(self, frame, detections):
+        """Queues a BGR frame and its (n, 6) detections for drawing and encoding."""
+        if frame.shape != self._shape:
+            frame = cv2.resize(frame, (self._shape[1], self._shape[0]))
+        while True:
+            try:
+                slot = self._free.get(timeout=WRITER_POLL_SECONDS)
+                break
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError("Annotated video writer exited")
+        self._ring[slot] = frame
+        self._todo.put((slot, np.ascontiguousarray(detections, dtype=np.float32)))
+
+    def close(self):
+        """Waits for every queued frame to be encoded and stops the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._process.is_alive():
+                self._todo.put(None)
+            self._process.join()
+        finally:
+            del self._ring
+            self._shm.close()
+            self._shm.unlink()
+        if self._process.exitcode != 0:
+            raise RuntimeError(f"Annotated video writer failed (exit code {self._process.exitcode})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,154 +1,213 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Body
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
 from fastapi.staticfiles import StaticFiles
-import shutil
 import os
 import time
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
-from record_face_video import recognize_faces_from_video
-import tempfile
 import base64
-from PIL import Image
 import io
-import torch
 import numpy as np
-import cv2
-from insightface.app import FaceAnalysis
-import faiss
-import sqlite3
-import torchvision.transforms as transforms
+from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+from gallery_index import GalleryIndex, ShardedGallery, decode_embedding, EMBEDDING_DIM
+from federation import parse_peer_groups, scatter_gather, search_results, merge_topk
+import db
+import migrations
+import http_cache
+import thumbnails
+import web_video
+import chunked_upload
+import face_records
+import enroll_cache
+import enrollment_worker
+import model_registry
+import queue
+import threading
 
-app = FastAPI()
-
-# New endpoint to get all face records
-@app.get("/records")
-async def get_records():
-    """
-    Retrieve all face records from the SQLite database.
-    Returns:
-        List of records with id, name, thana, img
-    """
-    try:
-        conn = sqlite3.connect("faces.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, thana, img FROM faces")
-        rows = cursor.fetchall()
-        conn.close()
-        records = []
-        for row in rows:
-            record = {
-                "id": row[0],
-                "name": row[1],
-                "thana": row[2],
-                "img": row[3]
-            }
-            records.append(record)
-        return {"status": "success", "records": records}
-    except Exception as e:
-        print(f"Error retrieving records: {str(e)}")
-        return JSONResponse(
-            status_code=500,
-            content={"status": "error", "message": f"Error retrieving records: {str(e)}"}
-        )
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Body
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-import shutil
-import os
-import time
-import uuid
-from typing import List, Dict, Any
-import json
-from record_face_video import recognize_faces_from_video
-import tempfile
-import base64
-from PIL import Image
-import io
-import torch
-import numpy as np
-import cv2
-from insightface.app import FaceAnalysis
-import faiss
-import sqlite3
-import torchvision.transforms as transforms
+# cv2, PIL, insightface, faiss and the video/enrollment pipelines are imported
+# inside the functions that use them, and models load through model_registry,
+# so a process serving login, stations and records starts without them
+# (tests/test_startup.py enforces this)
 
 app = FastAPI()
 
 # Global variables
-DB_PATH = "faces.db"
+DB_PATH = db.DB_PATH
 tasks = {}  # Global tasks dictionary for progress tracking
 
+# Gallery index storage: float32, float16 or int8 (scalar-quantized)
+GALLERY_INDEX_DTYPE = os.environ.get("GALLERY_INDEX_DTYPE", "float32")
+# Re-rank quantized results in float32 over k * GALLERY_RERANK candidates (0 disables)
+GALLERY_RERANK = int(os.environ.get("GALLERY_RERANK", "0"))
+GALLERY_FULL_PRECISION_DIR = "gallery_fp32"
+SEARCH_MAX_TOP_K = 50
+
+# Listings are revalidated on every load against the table change counters
+# (see http_cache.py), so an unchanged table costs a 304 instead of a scan
+FACES_CACHE_CONTROL = "private, no-cache"
+STATIONS_CACHE_CONTROL = "public, no-cache"
+
+# On-demand thumbnails of crops and screenshots (see thumbnails.py)
+THUMBNAIL_CACHE_DIR = "thumbnail_cache"
+THUMBNAIL_CACHE_MAX_MB = int(os.environ.get("SHERLOCK_THUMBNAIL_CACHE_MB", "512"))
+# Listings give each image a thumbnail_version (the source's size and mtime) that
+# clients put in the URL as ?v=, so a replaced crop gets a new URL
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# For URLs without v, or with a v the source no longer has
+THUMBNAIL_REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# CCTV analysis: find persons with YOLOv8 before looking for faces (see person_cascade.py)
+FACE_CASCADE = os.environ.get("SHERLOCK_FACE_CASCADE", "0") == "1"
+
+# Federation: thanas whose shards this node serves (all when unset) and
+# peer nodes queried by /federated-search-faces (see federation.py)
+OWNED_THANAS = {t.strip() for t in os.environ.get("SHERLOCK_OWNED_THANAS", "").split(",") if t.strip()}
+PEER_GROUPS = parse_peer_groups(os.environ.get("SHERLOCK_PEERS", ""))
+FEDERATION_TIMEOUT = float(os.environ.get("SHERLOCK_PEER_TIMEOUT", "5.0"))
+FEDERATION_HEDGE_DELAY = float(os.environ.get("SHERLOCK_PEER_HEDGE_DELAY", "0.5"))
+
+# Background enrollment of uploaded suspects
+ENROLLMENT_BATCH_SIZE = 16
+ENROLLMENT_QUEUE_SIZE = 1000
+# Drop folder ingested incrementally by watch_ingest.py (disabled when unset)
+WATCH_DIR = os.environ.get("SHERLOCK_WATCH_DIR", "")
+
+gallery_index = None  # Cached ShardedGallery, one shard per thana
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Returns this thread's pooled WAL-mode connection (see db.py)."""
+    return db.get_connection(DB_PATH)
 
-def init_police_stations_table():
-    """Initialize the police_stations table if it doesn't exist"""
+def init_database_schema():
+    """Bring faces.db to the current schema version (tables and indexes)"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS police_stations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                thana_name TEXT NOT NULL,
-                thana_id TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                active BOOLEAN DEFAULT 1
-            )
-        ''')
-        conn.commit()
+        migrations.migrate(conn)
         conn.close()
-        print("Police stations table initialized successfully")
     except Exception as e:
-        print(f"Error initializing police stations table: {str(e)}")
+        print(f"Error migrating database schema: {str(e)}")
 
 # Initialize tables on startup
-init_police_stations_table()
+init_database_schema()
+
+def fetch_gallery_rows(thana: Optional[str] = None) -> Dict[str, tuple]:
+    """
+    Reads stored embeddings from SQLite, optionally for a single thana.
+    Returns:
+        Dict of thana -> (ids, embeddings, metadata) for rows that have an embedding
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if thana is None:
+        cursor.execute("SELECT id, name, thana, image_path, embedding FROM faces")
+    else:
+        cursor.execute("SELECT id, name, thana, image_path, embedding FROM faces WHERE thana = ?", (thana,))
+    records = cursor.fetchall()
+    conn.close()
+    
+    shards = {}
+    for record in records:
+        if OWNED_THANAS and record[2] not in OWNED_THANAS:
+            continue
+        if record[4]:  # If embedding exists
+            ids, embeddings, metadata = shards.setdefault(record[2], ([], [], []))
+            ids.append(record[0])
+            embeddings.append(decode_embedding(record[4]))
+            metadata.append((record[0], record[1], record[2], record[3]))
+    return shards
 
 def load_face_database():
-    """Load face database - placeholder implementation"""
-    # This function needs to be implemented based on your database structure
+    """Loads stored embeddings from SQLite into a per-thana ShardedGallery."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, location, image_path, embedding FROM faces")
-        records = cursor.fetchall()
-        conn.close()
-        
-        if not records:
-            return None, []
-            
-        # Create FAISS index and load embeddings
-        # This is a simplified implementation - adjust based on your actual database structure
-        embeddings = []
-        record_list = []
-        
-        for record in records:
-            if record[4]:  # If embedding exists
-                embedding = np.frombuffer(record[4], dtype=np.float32)
-                embeddings.append(embedding)
-                record_list.append((record[0], record[1], record[2], record[3]))
-        
-        if embeddings:
-            embeddings = np.array(embeddings).astype('float32')
-            index = faiss.IndexFlatIP(embeddings.shape[1])
-            faiss.normalize_L2(embeddings)
-            index.add(embeddings)
-            return index, record_list
-        else:
-            return None, []
+        shards = fetch_gallery_rows()
+        if not shards:
+            return None
+
+        first_embedding = next(iter(shards.values()))[1][0]
+        index = ShardedGallery(
+            dim=len(first_embedding),
+            dtype=GALLERY_INDEX_DTYPE,
+            full_precision_dir=GALLERY_FULL_PRECISION_DIR if GALLERY_RERANK > 0 else None
+        )
+        for thana, (ids, embeddings, metadata) in shards.items():
+            index.add(thana, ids, np.array(embeddings), metadata)
+        return index
     except Exception as e:
         print(f"Error loading face database: {str(e)}")
-        return None, []
+        return None
+
+def refresh_thana_shard(thana: str):
+    """Rebuilds only the given thana's shard of the cached gallery from SQLite."""
+    index = gallery_index
+    if index is None:
+        return
+    try:
+        # Hold the gallery lock over the read too, so an enrollment committed
+        # meanwhile is added to the new shard instead of being lost
+        with index.lock:
+            ids, embeddings, metadata = fetch_gallery_rows(thana).get(thana, ([], [], []))
+            index.rebuild_shard(thana, ids, np.array(embeddings), metadata)
+    except Exception as e:
+        print(f"Error refreshing shard for {thana}: {str(e)}")
+        invalidate_gallery_index()
+
+def get_face_app():
+    """Returns the shared FaceAnalysis model from the model registry, loading it on first use."""
+    return model_registry.get("face_analysis")
+
+def get_gallery_index():
+    """Returns the cached gallery index, loading it from SQLite if needed."""
+    global gallery_index
+    if gallery_index is None:
+        gallery_index = load_face_database()
+    return gallery_index
+
+def invalidate_gallery_index():
+    """Drops the cached gallery index so the next search reloads it."""
+    global gallery_index
+    if gallery_index is not None:
+        gallery_index.close()
+    gallery_index = None
+
+def decode_base64_image(base64_image: str) -> np.ndarray:
+    """Decodes a base64 (optionally data-URL) image into an RGB array."""
+    from PIL import Image
+    if "base64," in base64_image:
+        base64_image = base64_image.split("base64,")[1]
+    image_bytes = base64.b64decode(base64_image)
+    return np.array(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
 
-def process_and_monitor_progress(video_path: str, task_id: str):
+def embed_faces_batch(images: List[np.ndarray]):
+    """
+    Detects faces in every image, then embeds all aligned crops in a single
+    recognition batch.
+    Returns:
+        List of (image_index, bbox, embedding) tuples
+    """
+    from insightface.utils import face_align
+    app = get_face_app()
+    rec_model = app.models['recognition']
+    detected = []
+    crops = []
+    for image_index, img in enumerate(images):
+        bboxes, kpss = app.det_model.detect(img, max_num=0, metric='default')
+        if kpss is None:
+            continue
+        for bbox, kps in zip(bboxes, kpss):
+            crops.append(face_align.norm_crop(img, landmark=kps, image_size=rec_model.input_size[0]))
+            detected.append((image_index, [int(v) for v in bbox[:4]]))
+    if not crops:
+        return []
+    embeddings = rec_model.get_feat(crops)
+    return [(image_index, bbox, embedding) for (image_index, bbox), embedding in zip(detected, embeddings)]
+
+def process_and_monitor_progress(video_path: str, task_id: str, capture=None, cascade=False):
     """Process video using the face recognition function and update progress."""
+    from record_face_video import recognize_faces_from_video
     def update_progress(progress: int):
         if task_id in tasks:
             tasks[task_id]["progress"] = progress
@@ -160,7 +219,9 @@ def process_and_monitor_progress(video_path: str, task_id: str):
         skip_seconds=3,
         speed_up_factor=1.5,
         exit_delay=10,
-        progress_callback=update_progress
+        progress_callback=update_progress,
+        capture=capture,
+        cascade=cascade
     )
     
     # Update task results
@@ -182,11 +243,236 @@ app.add_middleware(
 )
 
 # Mount static files - use absolute paths or backend-relative paths
+# (SHERLOCK_DATA_DIR moves the writable folders elsewhere, e.g. for tests)
 import os
-static_base = os.path.dirname(os.path.abspath(__file__))
+static_base = os.environ.get("SHERLOCK_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))
+# record_face_video writes the screenshots; it is only imported once a video is analyzed
+for static_dir in ("screenshots_original", "cropped_faces"):
+    os.makedirs(os.path.join(static_base, static_dir), exist_ok=True)
 app.mount("/screenshots_original", StaticFiles(directory=os.path.join(static_base, "screenshots_original")), name="screenshots")
 app.mount("/cropped_faces", StaticFiles(directory=os.path.join(static_base, "cropped_faces")), name="cropped_faces")
-app.mount("/detected_clips_original", StaticFiles(directory=os.path.join(static_base, "detected_clips_original")), name="detected_clips")
+
+# Evidence clips are served with byte-range support so players can seek
+# without downloading the whole file (see web_video.py)
+CLIP_MEDIA_TYPES = {".mp4": "video/mp4", ".jpg": "image/jpeg"}
+
+def serve_clip(request: Request, directory: str, file_name: str):
+    """Serve a clip or its poster from one of the clip directories, honouring Range."""
+    media_type = CLIP_MEDIA_TYPES.get(os.path.splitext(file_name)[1].lower())
+    path = os.path.join(static_base, directory, file_name)
+    if os.path.basename(file_name) != file_name or media_type is None or not os.path.isfile(path):
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Clip not found"})
+    return web_video.range_response(request.headers.get("range"), path, media_type)
+
+@app.get("/detected_clips_original/{file_name}")
+def get_detected_clip(request: Request, file_name: str):
+    return serve_clip(request, "detected_clips_original", file_name)
+
+@app.get("/highlights/{file_name}")
+def get_highlight(request: Request, file_name: str):
+    return serve_clip(request, "highlights", file_name)
+
+# CCTV uploads: whole-file or resumable chunked sessions (see chunked_upload.py)
+upload_store = chunked_upload.UploadStore(os.path.join(static_base, chunked_upload.UPLOAD_DIR))
+UPLOAD_READ_SIZE = 1024 * 1024
+
+def get_task(task_id: str):
+    """Returns the analysis task, recreating it from its upload session after a restart."""
+    if task_id not in tasks:
+        meta = upload_store.get(task_id)
+        if meta is None:
+            return None
+        tasks[task_id] = {
+            "status": "uploaded" if meta["complete"] else "uploading",
+            "progress": 0,
+            "video_path": upload_store.part_path(task_id),
+            "upload_id": task_id
+        }
+    return tasks[task_id]
+
+@app.post("/upload-video")
+async def upload_video(video: UploadFile = File(...)):
+    """
+    Upload a whole CCTV video in one request. The file is written in 1 MB
+    pieces on a worker thread so the event loop never blocks on disk.
+    Returns:
+        task_id to pass to /analyze-video
+    """
+    if not video.filename.lower().endswith(chunked_upload.VIDEO_EXTENSIONS):
+        return JSONResponse(status_code=400, content={"status": "error", "message": "Unsupported file format"})
+
+    task_id = str(uuid.uuid4())
+    video_path = os.path.join(upload_store.upload_dir, f"{task_id}_{os.path.basename(video.filename)}")
+    try:
+        with open(video_path, "wb") as buffer:
+            while True:
+                chunk = await video.read(UPLOAD_READ_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(buffer.write, chunk)
+    except Exception as e:
+        print(f"Error saving uploaded video: {str(e)}")
+        if os.path.exists(video_path):
+            os.remove(video_path)
+        return JSONResponse(status_code=500, content={"status": "error", "message": f"Error saving video: {str(e)}"})
+
+    tasks[task_id] = {"status": "uploaded", "progress": 0, "video_path": video_path, "upload_id": None}
+    return {"status": "success", "task_id": task_id}
+
+@app.post("/upload-video/sessions")
+async def create_upload_session(filename: str = Form(...), size: int = Form(...),
+                                chunk_size: int = Form(chunked_upload.DEFAULT_CHUNK_SIZE)):
+    """
+    Start a resumable chunked upload of a CCTV video.
+    Returns:
+        upload_id (also the analysis task_id), chunk_size and offset 0
+    """
+    try:
+        meta = upload_store.create(filename, size, chunk_size)
+    except chunked_upload.UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"status": "error", "message": str(e)})
+    get_task(meta["upload_id"])
+    return {
+        "status": "success",
+        "upload_id": meta["upload_id"],
+        "task_id": meta["upload_id"],
+        "chunk_size": meta["chunk_size"],
+        "offset": 0
+    }
+
+@app.get("/upload-video/sessions/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """
+    Report how many bytes of an upload have been received, for resuming.
+    """
+    meta = upload_store.get(upload_id)
+    if meta is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Upload not found"})
+    return {"status": "success", "offset": meta["offset"], "size": meta["size"], "complete": meta["complete"]}
+
+@app.put("/upload-video/sessions/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request, offset: int):
+    """
+    Append the request body at offset. The body's SHA-256 goes in the
+    X-Chunk-SHA256 header. A 409 carries the offset to resume from.
+    """
+    data = await request.body()
+    try:
+        meta = await run_in_threadpool(
+            upload_store.write_chunk, upload_id, offset, data, request.headers.get("x-chunk-sha256")
+        )
+    except chunked_upload.UploadError as e:
+        content = {"status": "error", "message": str(e)}
+        if e.offset is not None:
+            content["offset"] = e.offset
+        return JSONResponse(status_code=e.status_code, content=content)
+
+    task = get_task(upload_id)
+    if meta["complete"] and task["status"] == "uploading":
+        task["status"] = "uploaded"
+    return {"status": "success", "offset": meta["offset"], "complete": meta["complete"]}
+
+def run_video_analysis(task_id: str):
+    """Runs face recognition for a task, following the file while its upload is still in progress."""
+    task = tasks[task_id]
+    capture = None
+    if task.get("upload_id") and not upload_store.is_complete(task["upload_id"]):
+        capture = chunked_upload.GrowingVideoCapture(
+            task["video_path"], lambda: upload_store.is_complete(task["upload_id"])
+        )
+    try:
+        process_and_monitor_progress(task["video_path"], task_id, capture, task.get("cascade", FACE_CASCADE))
+        task["status"] = "completed"
+        task["progress"] = 100
+    except Exception as e:
+        print(f"Error analyzing video for task {task_id}: {str(e)}")
+        task["status"] = "failed"
+        task["error"] = str(e)
+
+@app.post("/analyze-video/{task_id}")
+async def analyze_video(task_id: str, background_tasks: BackgroundTasks, cascade: Optional[bool] = None):
+    """
+    Start face recognition on an uploaded video. For a chunked upload this
+    may be called as soon as the first chunk has arrived; analysis follows
+    the received prefix while the rest is uploading.
+    cascade: look for faces only on persons found by YOLOv8 first
+    (defaults to SHERLOCK_FACE_CASCADE)
+    """
+    task = get_task(task_id)
+    if task is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Task not found"})
+    if task["status"] in ("processing", "completed"):
+        return {"status": "success", "task_id": task_id, "analysis_status": task["status"]}
+
+    task["status"] = "processing"
+    task["start_time"] = time.time()
+    task["cascade"] = FACE_CASCADE if cascade is None else cascade
+    background_tasks.add_task(run_video_analysis, task_id)
+    return {"status": "success", "task_id": task_id, "analysis_status": "processing"}
+
+@app.get("/analysis-status/{task_id}")
+async def get_analysis_status(task_id: str):
+    """
+    Get the progress of a video analysis and, once completed, its results.
+    """
+    task = get_task(task_id)
+    if task is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Task not found"})
+    response = {
+        "status": task["status"],
+        "progress": task.get("progress", 0),
+        "results": task.get("results", []),
+        "stats": task.get("stats"),
+        "processing_time": task.get("processing_time"),
+        "error": task.get("error")
+    }
+    if task.get("upload_id"):
+        meta = upload_store.get(task["upload_id"])
+        if meta is not None:
+            response["upload"] = {"offset": meta["offset"], "size": meta["size"], "complete": meta["complete"]}
+    return response
+
+thumbnail_cache = thumbnails.ThumbnailCache(
+    os.path.join(static_base, THUMBNAIL_CACHE_DIR), THUMBNAIL_CACHE_MAX_MB * 1024 * 1024
+)
+thumbnail_source_bases = (static_base, os.path.join(os.getcwd(), "backend"))
+
+@app.get("/thumbnail/{source_path:path}")
+def get_thumbnail(request: Request, source_path: str, w: int = 192, format: str = "auto", v: Optional[str] = None):
+    """
+    Serve a resized copy of a crop, uploaded photo or screenshot, e.g.
+    /thumbnail/cropped_faces/x.jpg?w=192&v=<thumbnail_version>. The width is
+    rounded up to a bucket; format is jpeg, webp or auto (webp when the
+    browser accepts it). With the source's current version as v the response
+    is cached as immutable, otherwise it is revalidated by ETag.
+    """
+    source = thumbnails.resolve_source(source_path, thumbnail_source_bases)
+    if source is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Image not found"})
+    if w < 1:
+        return JSONResponse(status_code=400, content={"status": "error", "message": "w must be positive"})
+
+    versioned = v is not None and v == thumbnails.source_version(source)
+    headers = {"Cache-Control": THUMBNAIL_CACHE_CONTROL if versioned else THUMBNAIL_REVALIDATE_CACHE_CONTROL}
+    if format == "auto":
+        format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        headers["Vary"] = "Accept"
+    if format not in thumbnails.FORMATS:
+        return JSONResponse(status_code=400, content={"status": "error", "message": "format must be jpeg, webp or auto"})
+
+    width = thumbnails.bucket_width(w)
+    headers["ETag"] = f'"{thumbnails.thumbnail_key(source, width, format)}"'
+    if http_cache.is_fresh(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = thumbnail_cache.get(source, width, format)
+    except Exception as e:
+        print(f"Error generating thumbnail for {source_path}: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": f"Error generating thumbnail: {str(e)}"}
+        )
+    return FileResponse(path, media_type=thumbnails.FORMATS[format][0], headers=headers)
 
 @app.post("/register-police-station")
 async def register_police_station(
@@ -326,12 +612,17 @@ async def test_endpoint():
     return {"message": "FastAPI is working!", "status": "success"}
 
 @app.get("/get-police-stations")
-async def get_police_stations():
+async def get_police_stations(request: Request):
     """
-    Get all active police stations from SQLite database
+    Get all active police stations from SQLite database.
+    Answers 304 when the client's ETag still matches the table's change counter.
     """
     try:
         conn = get_db_connection()
+        headers = http_cache.cache_headers(conn, "police_stations", STATIONS_CACHE_CONTROL)
+        if http_cache.is_fresh(request.headers, headers):
+            conn.close()
+            return Response(status_code=304, headers=headers)
         cursor = conn.cursor()
         cursor.execute("SELECT id, thana_name, thana_id FROM police_stations WHERE active = 1")
         rows = cursor.fetchall()
@@ -346,7 +637,7 @@ async def get_police_stations():
             }
             stations.append(station)
         
-        return {"status": "success", "stations": stations}
+        return JSONResponse(content={"status": "success", "stations": stations}, headers=headers)
     
     except Exception as e:
         print(f"Error retrieving police stations: {str(e)}")
@@ -355,15 +646,161 @@ async def get_police_stations():
             content={"status": "error", "message": f"Error retrieving police stations: {str(e)}"}
         )
 
+def add_enrolled_to_gallery(enrolled):
+    """Adds newly inserted (face_id, name, thana, image_path, embedding) rows to the live gallery."""
+    index = gallery_index
+    if index is None:
+        return
+    for face_id, name, thana, image_path, embedding in enrolled:
+        if not OWNED_THANAS or thana in OWNED_THANAS:
+            index.add(thana, [face_id], np.asarray(embedding).reshape(1, -1), [(face_id, name, thana, image_path)])
+
+def process_enrollment_batch(jobs: List[Dict[str, Any]]):
+    """
+    Detects, crops and embeds a batch of queued suspect uploads, inserts them
+    in one transaction and adds them to the live gallery index.
+    Faces matching an existing identity are flagged instead of inserted.
+    """
+    import cv2
+    import bulk_enroll
+    from insightface.utils import face_align
+    app = get_face_app()
+    rec_model = app.models['recognition']
+    
+    detected = []
+    for job in jobs:
+        img = cv2.imread(job["image_path"])
+        if img is None:
+            job["status"], job["error"] = enrollment_worker.FAILED, "Error loading image"
+            continue
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        bboxes, kpss = app.det_model.detect(img_rgb, max_num=1, metric='default')
+        if len(bboxes) == 0 or kpss is None:
+            job["error"] = "No face detected"
+            detected.append((job, None, None))
+            continue
+        img_h, img_w, _ = img.shape
+        x1, y1, x2, y2 = map(int, bboxes[0][:4])
+        cropped_face = img[max(0, y1):min(img_h, y2), max(0, x1):min(img_w, x2)]
+        aligned = face_align.norm_crop(img_rgb, landmark=kpss[0], image_size=rec_model.input_size[0])
+        detected.append((job, cropped_face, aligned))
+    
+    to_embed = [(job, aligned) for job, _, aligned in detected if aligned is not None]
+    embeddings = {}
+    if to_embed:
+        features = rec_model.get_feat([aligned for _, aligned in to_embed])
+        embeddings = {job["enrollment_id"]: feature for (job, _), feature in zip(to_embed, features)}
+    
+    index = get_gallery_index()
+    # Faces accepted earlier in this batch, so near-duplicates within the batch are caught too
+    batch_index = GalleryIndex()
+    conn = get_db_connection()
+    columns = bulk_enroll.faces_columns(conn)
+    cursor = conn.cursor()
+    # Statuses are only published once the transaction has committed
+    outcomes = []  # (job, fields)
+    added = []
+    try:
+        for job, cropped_face, _ in detected:
+            embedding = embeddings.get(job["enrollment_id"])
+            if embedding is not None and not job["allow_duplicate"]:
+                duplicate = (enroll_cache.find_near_duplicate(index, embedding)
+                             or enroll_cache.find_near_duplicate(batch_index, embedding))
+                if duplicate is not None:
+                    face_id, name, similarity = duplicate
+                    outcomes.append((job, {"status": enrollment_worker.DUPLICATE,
+                                           "duplicate_of": {"face_id": face_id, "name": name, "similarity": similarity}}))
+                    continue
+            
+            if embedding is None:
+                # Keep the record even without a usable face, as uploads always did
+                cursor.execute(
+                    "INSERT INTO faces (name, name_key, thana, image_path) VALUES (?, ?, ?, ?)",
+                    (job["name"], face_records.name_key(job["name"]), job["thana"], job["image_path"])
+                )
+                face_id = cursor.lastrowid
+                enroll_cache.store(cursor, job["content_hash"], face_id=face_id, error=job["error"])
+                outcomes.append((job, {"status": enrollment_worker.FAILED, "face_id": face_id}))
+                continue
+            
+            crop_bytes = cv2.imencode(".jpg", cropped_face)[1].tobytes() if cropped_face.size else None
+            face_id = bulk_enroll.insert_face(cursor, columns, job["name"], job["thana"], job["image_path"], embedding)
+            enroll_cache.store(cursor, job["content_hash"], crop=crop_bytes, embedding=embedding, face_id=face_id)
+            batch_index.add([face_id], np.asarray(embedding).reshape(1, -1), [(face_id, job["name"])])
+            outcomes.append((job, {"status": enrollment_worker.DONE, "face_id": face_id}))
+            added.append((job, face_id, embedding))
+        conn.commit()
+    except Exception:
+        # The enrollment worker marks every job of the batch failed
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    for job, fields in outcomes:
+        job.update(fields)
+        if fields["status"] == enrollment_worker.DUPLICATE and os.path.exists(job["image_path"]):
+            os.remove(job["image_path"])
+    
+    # Make the new suspects searchable right away
+    add_enrolled_to_gallery([
+        (face_id, job["name"], job["thana"], job["image_path"], embedding) for job, face_id, embedding in added
+    ])
+
+enrollment_queue = enrollment_worker.EnrollmentQueue(
+    process_enrollment_batch,
+    batch_size=ENROLLMENT_BATCH_SIZE,
+    max_pending=ENROLLMENT_QUEUE_SIZE
+)
+
+@app.on_event("startup")
+async def start_enrollment_worker():
+    """Starts the background enrollment worker thread, and the drop-folder watcher if configured."""
+    enrollment_queue.start()
+    if WATCH_DIR:
+        import watch_ingest
+        threading.Thread(
+            target=lambda: watch_ingest.watch(
+                WATCH_DIR,
+                db_path=DB_PATH,
+                rec_model=get_face_app().models['recognition'],
+                on_batch=add_enrolled_to_gallery
+            ),
+            name="watch-ingest",
+            daemon=True
+        ).start()
+
 @app.post("/upload-suspect")
 async def upload_suspect(
     suspect_image: UploadFile = File(...),
     suspect_name: str = Form(...),
     police_station: str = Form(...),
+    allow_duplicate: bool = Form(False),
 ):
     """
-    Upload a suspect image and store it in the database (name, thana, img).
+    Upload a suspect image and queue it for enrollment.
+    Detection, embedding and insertion happen on the background enrollment
+    worker; poll /enrollment-status/{enrollment_id} for the outcome.
+    An image that was already enrolled is reported as a duplicate instead of
+    being queued again, unless allow_duplicate is set.
     """
+    image_bytes = await suspect_image.read()
+    digest = enroll_cache.content_hash(image_bytes)
+
+    try:
+        conn = get_db_connection()
+        existing_id = enroll_cache.enrolled_face_id(conn, digest)
+        conn.close()
+        if existing_id is not None and not allow_duplicate:
+            return {
+                "status": "success",
+                "duplicate": True,
+                "face_id": existing_id,
+                "message": f"This image is already enrolled (face {existing_id})"
+            }
+    except Exception as e:
+        print(f"Error checking enrollment cache: {str(e)}")
+
     # Create a directory for uploaded images if it doesn't exist
     os.makedirs("backend/images", exist_ok=True)
 
@@ -373,26 +810,62 @@ async def upload_suspect(
     image_filename = f"{image_id}{image_ext}"
     image_path = f"backend/images/{image_filename}"
 
-    with open(image_path, "wb") as buffer:
-        shutil.copyfileobj(suspect_image.file, buffer)
+    def save_image():
+        with open(image_path, "wb") as buffer:
+            buffer.write(image_bytes)
+
+    await run_in_threadpool(save_image)
 
     try:
-        conn = sqlite3.connect("faces.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO faces (name, thana, image_path) VALUES (?, ?, ?)",
-            (suspect_name, police_station, image_path)
+        enrollment_id = enrollment_queue.submit(
+            image_path=image_path,
+            name=suspect_name,
+            thana=police_station,
+            content_hash=digest,
+            allow_duplicate=allow_duplicate
         )
-        conn.commit()
-        conn.close()
-        return {"status": "success", "message": f"Suspect {suspect_name} added successfully"}
-    except Exception as e:
-        print(f"Error storing suspect: {str(e)}")
+    except queue.Full:
+        os.remove(image_path)
         return JSONResponse(
-            status_code=500,
-            content={"status": "error", "message": f"Failed to store suspect: {str(e)}"}
+            status_code=503,
+            content={"status": "error", "message": "Enrollment queue is full, please retry shortly"}
         )
 
+    return {
+        "status": "success",
+        "duplicate": False,
+        "enrollment_id": enrollment_id,
+        "enrollment_status": enrollment_worker.QUEUED,
+        "message": f"Suspect {suspect_name} queued for enrollment"
+    }
+
+@app.get("/enrollment-status/{enrollment_id}")
+async def get_enrollment_status(enrollment_id: str):
+    """
+    Get the status of a queued suspect enrollment.
+    Returns:
+        status (queued, processing, done, duplicate or failed), face_id once
+        inserted, duplicate_of for flagged duplicates and error on failure
+    """
+    job = enrollment_queue.status(enrollment_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": "Enrollment not found"}
+        )
+    return {
+        "status": "success",
+        "enrollment": {
+            "enrollment_id": enrollment_id,
+            "name": job["name"],
+            "thana": job["thana"],
+            "status": job["status"],
+            "face_id": job.get("face_id"),
+            "duplicate_of": job.get("duplicate_of"),
+            "error": job.get("error")
+        }
+    }
+
 @app.post("/process-live-frame")
 async def process_live_frame(frame_data: Dict[str, Any] = Body(...)):
     """
@@ -404,6 +877,8 @@ async def process_live_frame(frame_data: Dict[str, Any] = Body(...)):
     Returns:
         Detection results with bounding boxes and recognition info
     """
+    import cv2
+    from PIL import Image
     try:
         base64_image = frame_data.get("image")
         if not base64_image:
@@ -427,15 +902,13 @@ async def process_live_frame(frame_data: Dict[str, Any] = Body(...)):
         img_rgb = cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB)
         
         # Get face features
-        face_app = FaceAnalysis(name='buffalo_l')
-        face_app.prepare(ctx_id=-1, det_size=(640, 640))
-        faces = face_app.get(img_rgb)
+        faces = get_face_app().get(img_rgb)
         
         if not faces:
             return {"status": "success", "detections": []}
         
         # Load face database
-        index, records = load_face_database()
+        index = get_gallery_index()
         if index is None:
             return {"status": "success", "detections": [], "message": "No faces in database"}
         
@@ -446,12 +919,8 @@ async def process_live_frame(frame_data: Dict[str, Any] = Body(...)):
             # Extract face bounding box
             x1, y1, x2, y2 = map(int, face.bbox)
             
-            # Get face embedding
-            feature_vector = face.embedding.reshape(1, -1).astype('float32')
-            faiss.normalize_L2(feature_vector)
-            
             # Search for similar faces in the database
-            similarity, index_match = index.search(feature_vector, 1)
+            similarity, index_match = index.search(face.embedding, 1, rerank=GALLERY_RERANK)
             best_similarity = similarity[0][0]
             
             if best_similarity < threshold:
@@ -465,7 +934,7 @@ async def process_live_frame(frame_data: Dict[str, Any] = Body(...)):
                 }
             else:
                 # Known face
-                matched_id, matched_name, matched_location, matched_image = records[index_match[0][0]]
+                matched_id, matched_name, matched_location, matched_image = index.records[int(index_match[0][0])]
                 detection = {
                     "bbox": [x1, y1, x2, y2],
                     "name": matched_name,
@@ -489,36 +958,298 @@ async def process_live_frame(frame_data: Dict[str, Any] = Body(...)):
             content={"status": "error", "message": f"Error processing frame: {str(e)}"}
         )
 
+class SearchFacesRequest(BaseModel):
+    # Base64-encoded images; every face found in each image is searched
+    images: List[str] = []
+    # Precomputed embeddings, searched as-is
+    embeddings: List[List[float]] = []
+    top_k: int = 5
+    threshold: float = 0.5
+    # Restrict candidates to these thanas (all thanas when omitted)
+    thana: Optional[List[str]] = None
+
+def validate_search_request(request: SearchFacesRequest):
+    """Returns a 400 JSONResponse if the search request is malformed, else None."""
+    if not request.images and not request.embeddings:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": "Provide images or embeddings to search"}
+        )
+    if not 1 <= request.top_k <= SEARCH_MAX_TOP_K:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"top_k must be between 1 and {SEARCH_MAX_TOP_K}"}
+        )
+    for embedding_index, embedding in enumerate(request.embeddings):
+        if len(embedding) != EMBEDDING_DIM:
+            return JSONResponse(
+                status_code=400,
+                content={"status": "error", "message": f"Embedding {embedding_index} must have {EMBEDDING_DIM} values"}
+            )
+    return None
+
+def build_search_queries(request: SearchFacesRequest):
+    """
+    Embeds the request's images in one batch and appends its precomputed embeddings.
+    Returns:
+        List of (source, source_index, bbox, embedding) tuples
+    """
+    queries = []
+    if request.images:
+        images = [decode_base64_image(image) for image in request.images]
+        for image_index, bbox, embedding in embed_faces_batch(images):
+            queries.append(("image", image_index, bbox, embedding))
+    for embedding_index, embedding in enumerate(request.embeddings):
+        queries.append(("embedding", embedding_index, None, embedding))
+    return queries
+
+def search_local_gallery(index, embeddings, top_k: int, threshold: float, thanas: Optional[List[str]]):
+    """
+    Runs one multi-query search over the local gallery.
+    Returns:
+        One list of candidate dicts per embedding, best first
+    """
+    # Thana filters route the search to those shards only
+    scores, ids = index.search(np.array(embeddings), top_k, rerank=GALLERY_RERANK, thanas=thanas or None)
+    
+    all_candidates = []
+    for row_scores, row_ids in zip(scores, ids):
+        candidates = []
+        for score, face_id in zip(row_scores, row_ids):
+            if face_id == -1 or score < threshold:
+                continue
+            matched_id, matched_name, matched_location, matched_image = index.records[int(face_id)]
+            candidates.append({
+                "id": matched_id,
+                "name": matched_name,
+                "location": matched_location,
+                "image_path": matched_image if matched_image else None,
+                "similarity": float(score)
+            })
+        all_candidates.append(candidates)
+    return all_candidates
+
+@app.post("/search-faces")
+def search_faces(request: SearchFacesRequest):
+    """
+    Search the gallery for many faces in one call.
+    Detection and embedding run as one batch, followed by a single
+    multi-query FAISS search.
+    
+    Returns:
+        Per-face top-k candidates with similarity scores at or above threshold
+    """
+    try:
+        error = validate_search_request(request)
+        if error is not None:
+            return error
+        
+        index = get_gallery_index()
+        if index is None:
+            return {"status": "success", "results": [], "message": "No faces in database"}
+        
+        queries = build_search_queries(request)
+        if not queries:
+            return {"status": "success", "results": []}
+        
+        all_candidates = search_local_gallery(
+            index, [query[3] for query in queries], request.top_k, request.threshold, request.thana
+        )
+        
+        results = []
+        for (source, source_index, bbox, _), candidates in zip(queries, all_candidates):
+            results.append({
+                "source": source,
+                "index": source_index,
+                "bbox": bbox,
+                "candidates": candidates
+            })
+        
+        return {"status": "success", "results": results}
+    
+    except Exception as e:
+        print(f"Error searching faces: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": f"Error searching faces: {str(e)}"}
+        )
+
+@app.post("/federated-search-faces")
+async def federated_search_faces(request: SearchFacesRequest):
+    """
+    Search this node and every peer in SHERLOCK_PEERS, then merge the top-k.
+    Faces are embedded once on this node and only embeddings go to peers.
+    Peers that fail or time out are listed in failed_peers and the response
+    is marked partial instead of failing the whole search.
+    """
+    try:
+        error = validate_search_request(request)
+        if error is not None:
+            return error
+        
+        queries = await run_in_threadpool(build_search_queries, request)
+        if not queries:
+            return {"status": "success", "results": [], "partial": False, "failed_peers": []}
+        embeddings = [np.asarray(query[3], dtype=np.float32).tolist() for query in queries]
+        
+        async def search_local():
+            index = await run_in_threadpool(get_gallery_index)
+            if index is None:
+                return [[] for _ in embeddings]
+            return await run_in_threadpool(
+                search_local_gallery, index, embeddings, request.top_k, request.threshold, request.thana
+            )
+        
+        peer_payload = {
+            "embeddings": embeddings,
+            "top_k": request.top_k,
+            "threshold": request.threshold,
+            "thana": request.thana
+        }
+        local_candidates, (responses, failures) = await asyncio.gather(
+            search_local(),
+            scatter_gather(PEER_GROUPS, "/search-faces", peer_payload, FEDERATION_TIMEOUT, FEDERATION_HEDGE_DELAY,
+                           parse=lambda data: search_results(data, len(embeddings)))
+        )
+        
+        # Candidate lists per query, tagged with the node that produced them
+        per_query = [[[dict(c, node="local") for c in candidates]] for candidates in local_candidates]
+        for node_url, peer_candidates in responses:
+            for query_lists, candidates in zip(per_query, peer_candidates):
+                query_lists.append([dict(c, node=node_url) for c in candidates])
+        
+        results = []
+        for (source, source_index, bbox, _), candidate_lists in zip(queries, per_query):
+            results.append({
+                "source": source,
+                "index": source_index,
+                "bbox": bbox,
+                "candidates": merge_topk(candidate_lists, request.top_k)
+            })
+        
+        return {
+            "status": "success",
+            "results": results,
+            "partial": bool(failures),
+            "failed_peers": failures
+        }
+    
+    except Exception as e:
+        print(f"Error in federated search: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": f"Error in federated search: {str(e)}"}
+        )
+
+@app.get("/gallery-shards")
+async def get_gallery_shards():
+    """
+    List the per-thana gallery shards and their sizes.
+    """
+    index = await run_in_threadpool(get_gallery_index)
+    if index is None:
+        return {"status": "success", "shards": []}
+    shards = [{"thana": thana, "faces": len(shard)} for thana, shard in index.shards.items()]
+    return {"status": "success", "shards": shards}
+
+def read_faces_page(request: Request, key: str, fields: Optional[str], thana: Optional[str],
+                    name_prefix: Optional[str], cursor: Optional[str], limit: int, format: str):
+    """
+    Shared implementation of /get-faces and /records: one keyset page as JSON
+    under `key`, or every matching row as NDJSON when format=ndjson. Answers
+    304 when the client's ETag still matches the faces change counter.
+    """
+    try:
+        selected = face_records.parse_fields(fields)
+        after = face_records.parse_cursor(cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    conn = get_db_connection()
+    headers = http_cache.cache_headers(conn, "faces", FACES_CACHE_CONTROL)
+    conn.close()
+    if http_cache.is_fresh(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    if format == "ndjson":
+        return StreamingResponse(
+            face_records.iter_ndjson(get_db_connection, selected, thana, name_prefix),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
+    if format != "json":
+        return JSONResponse(status_code=400, content={"status": "error", "message": "format must be json or ndjson"})
+    if limit < 1 or limit > face_records.MAX_PAGE_SIZE:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"limit must be between 1 and {face_records.MAX_PAGE_SIZE}"}
+        )
+
+    try:
+        conn = get_db_connection()
+        faces, next_cursor = face_records.query_faces(conn, selected, thana, name_prefix, after, limit)
+        conn.close()
+        if "image_path" in selected:
+            add_thumbnail_versions(faces)
+        return JSONResponse(content={"status": "success", key: faces, "next_cursor": next_cursor}, headers=headers)
+    except Exception as e:
+        print(f"Error retrieving {key}: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": f"Error retrieving {key}: {str(e)}"}
+        )
+
+def add_thumbnail_versions(faces):
+    """Sets each face's thumbnail_version, the v for its /thumbnail URLs (None without a local image)."""
+    for face in faces:
+        source = face["image_path"] and thumbnails.resolve_source(face["image_path"], thumbnail_source_bases)
+        face["thumbnail_version"] = thumbnails.source_version(source) if source else None
+
 @app.get("/get-faces")
-async def get_faces():
+def get_faces(request: Request, fields: Optional[str] = None, thana: Optional[str] = None, name_prefix: Optional[str] = None,
+              cursor: Optional[str] = None, limit: int = face_records.DEFAULT_PAGE_SIZE, format: str = "json"):
     """
-    Retrieve all faces from the SQLite database.
+    Retrieve faces from the SQLite database, one page at a time.
+    Args:
+        fields: Comma-separated subset of id, name, thana, image_path, created_at
+        thana: Only faces registered to this thana
+        name_prefix: Only faces whose name starts with this (case-insensitive)
+        cursor: next_cursor from the previous page
+        limit: Page size (max 500)
+        format: json for a page, ndjson to stream every matching face
     Returns:
-        List of faces with columns: id, name, thana, img
+        Page of faces and the next_cursor (null on the last page). With
+        image_path, JSON pages also give each face's thumbnail_version.
+    """
+    return read_faces_page(request, "faces", fields, thana, name_prefix, cursor, limit, format)
+
+@app.get("/get-faces/count")
+def get_faces_count(request: Request, thana: Optional[str] = None, name_prefix: Optional[str] = None):
+    """
+    Count the faces matching the same filters as /get-faces.
     """
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, thana, img FROM faces")
-        rows = cursor.fetchall()
+        headers = http_cache.cache_headers(conn, "faces", FACES_CACHE_CONTROL)
+        if http_cache.is_fresh(request.headers, headers):
+            conn.close()
+            return Response(status_code=304, headers=headers)
+        count = face_records.count_faces(conn, thana, name_prefix)
         conn.close()
-        faces = []
-        for row in rows:
-            face_data = {
-                "id": row[0],
-                "name": row[1],
-                "thana": row[2],
-                "img": row[3]
-            }
-            faces.append(face_data)
-        return {"status": "success", "faces": faces}
+        return JSONResponse(content={"status": "success", "count": count}, headers=headers)
     except Exception as e:
-        print(f"Error retrieving faces: {str(e)}")
+        print(f"Error counting faces: {str(e)}")
         return JSONResponse(
             status_code=500,
-            content={"status": "error", "message": f"Error retrieving faces: {str(e)}"}
+            content={"status": "error", "message": f"Error counting faces: {str(e)}"}
         )
 
+@app.get("/records")
+def get_records(request: Request, fields: Optional[str] = None, thana: Optional[str] = None, name_prefix: Optional[str] = None,
+                cursor: Optional[str] = None, limit: int = face_records.DEFAULT_PAGE_SIZE, format: str = "json"):
+    """
+    Same as /get-faces, with the page under "records".
+    """
+    return read_faces_page(request, "records", fields, thana, name_prefix, cursor, limit, format)
+
 @app.delete("/delete-face/{face_id}")
 async def delete_face(face_id: str):
     """
@@ -546,6 +1277,12 @@ async def delete_face(face_id: str):
         conn.commit()
         conn.close()
         
+        # Rebuild only the shard that held this face, on a worker thread
+        if gallery_index is not None and face_id.isdigit():
+            thana = gallery_index.thana_of(int(face_id))
+            if thana is not None:
+                await run_in_threadpool(refresh_thana_shard, thana)
+        
         # Delete associated image file if it exists
         if image_path:
             # Convert from relative URL to file system path if needed
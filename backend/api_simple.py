@@ -1,9 +1,11 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Body
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import sqlite3
+from fastapi.responses import JSONResponse, Response
 import time
 import os
+import db
+import migrations
+import http_cache
 
 app = FastAPI()
 
@@ -17,36 +19,24 @@ app.add_middleware(
 )
 
 # Database configuration
-DB_PATH = "faces.db"
+DB_PATH = db.DB_PATH
+STATIONS_CACHE_CONTROL = "public, no-cache"
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Returns this thread's pooled WAL-mode connection (see db.py)."""
+    return db.get_connection(DB_PATH)
 
-def init_police_stations_table():
-    """Initialize the police_stations table if it doesn't exist"""
+def init_database_schema():
+    """Bring faces.db to the current schema version (tables and indexes)"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS police_stations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                thana_name TEXT NOT NULL,
-                thana_id TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                active BOOLEAN DEFAULT 1
-            )
-        ''')
-        conn.commit()
+        migrations.migrate(conn)
         conn.close()
-        print("Police stations table initialized successfully")
     except Exception as e:
-        print(f"Error initializing police stations table: {str(e)}")
+        print(f"Error migrating database schema: {str(e)}")
 
 # Initialize tables on startup
-init_police_stations_table()
+init_database_schema()
 
 @app.get("/test")
 async def test_endpoint():
@@ -61,12 +51,17 @@ async def test_form_endpoint(
     return {"received": test_field, "status": "success"}
 
 @app.get("/get-police-stations")
-async def get_police_stations():
+async def get_police_stations(request: Request):
     """
-    Get all active police stations from SQLite database
+    Get all active police stations from SQLite database.
+    Answers 304 when the client's ETag still matches the table's change counter.
     """
     try:
         conn = get_db_connection()
+        headers = http_cache.cache_headers(conn, "police_stations", STATIONS_CACHE_CONTROL)
+        if http_cache.is_fresh(request.headers, headers):
+            conn.close()
+            return Response(status_code=304, headers=headers)
         cursor = conn.cursor()
         cursor.execute("SELECT id, thana_name, thana_id FROM police_stations WHERE active = 1")
         rows = cursor.fetchall()
@@ -81,7 +76,7 @@ async def get_police_stations():
             }
             stations.append(station)
         
-        return {"status": "success", "stations": stations}
+        return JSONResponse(content={"status": "success", "stations": stations}, headers=headers)
     
     except Exception as e:
         print(f"Error retrieving police stations: {str(e)}")
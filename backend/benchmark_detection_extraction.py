@@ -0,0 +1,88 @@
+"""
+Microbenchmark for pulling detections out of YOLOv8 results.
+
+Compares the old per-box loop (int()/float() on each tensor slice plus a
+dict per box) against yolo_video.detection_array + DetectionBuffer (one
+.cpu().numpy() per frame appended into column arrays), on synthetic
+ultralytics Boxes. Reports microseconds per frame for extraction and for
+turning the collected detections into JSON-ready lists.
+
+Usage: python benchmark_detection_extraction.py [frames] [boxes_per_frame] [device]
+"""
+
+import sys
+import time
+import torch
+from ultralytics.engine.results import Boxes
+import yolo_video
+
+NAMES = {i: f"class_{i}" for i in range(80)}
+ORIG_SHAPE = (720, 1280)
+
+
+def synthetic_boxes(frames, boxes_per_frame, device):
+    """Random Boxes per frame: xyxy inside a 1280x720 frame, confidence, class id."""
+    generator = torch.Generator().manual_seed(0)
+    results = []
+    for _ in range(frames):
+        xy = torch.rand(boxes_per_frame, 2, generator=generator) * torch.tensor([1180.0, 620.0])
+        wh = torch.rand(boxes_per_frame, 2, generator=generator) * 100 + 1
+        conf = torch.rand(boxes_per_frame, 1, generator=generator)
+        cls = torch.randint(0, len(NAMES), (boxes_per_frame, 1), generator=generator).float()
+        data = torch.cat([xy, xy + wh, conf, cls], dim=1).to(device)
+        results.append(Boxes(data, ORIG_SHAPE))
+    return results
+
+
+def per_box(all_boxes):
+    detections = []
+    for frame_index, boxes in enumerate(all_boxes):
+        for box in boxes:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            detections.append({
+                "frame": frame_index,
+                "class": NAMES[int(box.cls[0])],
+                "confidence": float(box.conf[0]),
+                "bbox": [x1, y1, x2, y2]
+            })
+    return detections
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def columnar(all_boxes):
+    buffer = yolo_video.DetectionBuffer()
+    for frame_index, boxes in enumerate(all_boxes):
+        buffer.append(frame_index, yolo_video.detection_array(_Result(boxes)))
+    return buffer
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    return time.perf_counter() - start, value
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    boxes_per_frame = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    device = sys.argv[3] if len(sys.argv) > 3 else "cpu"
+
+    all_boxes = synthetic_boxes(frames, boxes_per_frame, device)
+    per_box(all_boxes[:10]), columnar(all_boxes[:10])  # warm-up
+
+    loop_time, detections = timed(per_box, all_boxes)
+    extract_time, buffer = timed(columnar, all_boxes)
+    serialize_time, columns = timed(buffer.to_lists)
+    assert len(detections) == len(buffer) == len(columns["frame"])
+
+    print(f"\n{frames} frames x {boxes_per_frame} boxes on {device}")
+    print(f"{'method':<26}{'us/frame':>12}")
+    print(f"{'per-box loop':<26}{loop_time * 1e6 / frames:>12.1f}")
+    print(f"{'bulk + column buffers':<26}{extract_time * 1e6 / frames:>12.1f}")
+    print(f"{'  + to_lists (once)':<26}{(extract_time + serialize_time) * 1e6 / frames:>12.1f}")
+    print(f"speedup: {loop_time / (extract_time + serialize_time):.1f}x, "
+          f"column memory {sum(v.nbytes for v in buffer.columns().values()) / len(buffer):.0f} bytes/detection")
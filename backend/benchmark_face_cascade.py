@@ -0,0 +1,112 @@
+"""
+Benchmark for the person-first face recognition cascade.
+
+Runs full-frame face detection (face_app.get, the current path) and
+person_cascade.detect_faces over every n-th frame of test footage and
+reports milliseconds per frame, the share of frames the cascade skipped for
+having no persons, face recall (full-frame faces also found by the cascade,
+IoU >= 0.5) and, when faces.db has a gallery, identity agreement (same best
+match above the threshold).
+
+Usage: python benchmark_face_cascade.py video_path [frame_step] [max_frames]
+"""
+
+import sys
+import time
+import cv2
+import numpy as np
+import model_registry
+import person_cascade
+from record_face_video import load_face_data
+
+THRESHOLD = 0.3
+IOU_MATCH = 0.5
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def best_match(embedding, names, gallery):
+    """Name of the most similar gallery entry above THRESHOLD, or None."""
+    if not names:
+        return None
+    scores = gallery @ (embedding / np.linalg.norm(embedding))
+    best = int(np.argmax(scores))
+    return names[best] if scores[best] >= THRESHOLD else None
+
+
+def sample_frames(video_path, frame_step, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    frame_index = 0
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_index % frame_step == 0:
+            frames.append(frame)
+        frame_index += 1
+    cap.release()
+    return frames
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    video_path = sys.argv[1]
+    frame_step = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    max_frames = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    face_database = load_face_data()
+    names = list(face_database)
+    gallery = np.array([v / np.linalg.norm(v) for v in face_database.values()]) if names else None
+    face_app = model_registry.get("face_analysis")
+    person_model = person_cascade.get_person_model()
+    frames = sample_frames(video_path, frame_step, max_frames)
+    if not frames:
+        sys.exit(f"No frames read from {video_path}")
+
+    # Warm-up both paths
+    warm_rgb = cv2.cvtColor(frames[0], cv2.COLOR_BGR2RGB)
+    face_app.get(warm_rgb)
+    person_cascade.detect_faces(face_app, person_model, frames[0], warm_rgb)
+
+    full_time = cascade_time = 0.0
+    full_faces = found = same_identity = identified = skipped = 0
+    for frame in frames:
+        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        start = time.perf_counter()
+        full = face_app.get(img_rgb)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        cascade, persons = person_cascade.detect_faces(face_app, person_model, frame, img_rgb)
+        cascade_time += time.perf_counter() - start
+        skipped += persons == 0
+
+        for face in full:
+            full_faces += 1
+            matches = [c for c in cascade if iou(face.bbox, c.bbox) >= IOU_MATCH]
+            if not matches:
+                continue
+            found += 1
+            expected = best_match(face.embedding, names, gallery)
+            if expected is not None:
+                identified += 1
+                same_identity += best_match(matches[0].embedding, names, gallery) == expected
+
+    n = len(frames)
+    print(f"\n{video_path}: {n} frames (every {frame_step}th), gallery {len(names)}")
+    print(f"{'path':<12}{'ms/frame':>10}")
+    print(f"{'full-frame':<12}{full_time * 1000 / n:>10.1f}")
+    print(f"{'cascade':<12}{cascade_time * 1000 / n:>10.1f}")
+    print(f"speedup {full_time / cascade_time:.2f}x, frames skipped (no persons) {skipped / n * 100:.1f}%")
+    print(f"face recall vs full-frame: {found}/{full_faces}"
+          + (f" ({found / full_faces * 100:.1f}%)" if full_faces else ""))
+    if identified:
+        print(f"same identity on matched faces: {same_identity}/{identified} ({same_identity / identified * 100:.1f}%)")
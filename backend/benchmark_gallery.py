@@ -0,0 +1,89 @@
+"""
+Benchmark for quantized gallery storage.
+
+Compares float16 and int8 gallery indexes (with and without float32
+re-ranking) against the float32 baseline on synthetic vectors and, if
+present, the real vectors in features.json. Reports memory, search
+latency and top-1 agreement with the baseline.
+
+Usage: python benchmark_gallery.py [gallery_size] [num_queries]
+"""
+
+import json
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from gallery_index import GalleryIndex, STORAGE_DTYPES, EMBEDDING_DIM, normalize
+
+RERANK_FACTOR = 4
+
+
+def synthetic_vectors(gallery_size, num_queries, dim=EMBEDDING_DIM, seed=0):
+    """Random unit gallery plus noisy copies of gallery entries as queries."""
+    rng = np.random.default_rng(seed)
+    gallery = normalize(rng.standard_normal((gallery_size, dim)))
+    picks = rng.integers(0, gallery_size, num_queries)
+    noise = normalize(rng.standard_normal((num_queries, dim)))
+    queries = normalize(gallery[picks] + 0.8 * noise)
+    return gallery, queries
+
+
+def features_json_vectors(path, num_queries, seed=0):
+    """Loads real ArcFace vectors from features.json; queries are perturbed gallery entries."""
+    with open(path, "r") as f:
+        feature_dict = json.load(f)
+    gallery = normalize(np.array(list(feature_dict.values()), dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(gallery), num_queries)
+    noise = normalize(rng.standard_normal((num_queries, gallery.shape[1])))
+    queries = normalize(gallery[picks] + 0.3 * noise)
+    return gallery, queries
+
+
+def run_case(gallery, queries, dtype, rerank, workdir):
+    """Builds one index and returns (memory_bytes, ms_per_query, top1_ids)."""
+    fp_path = os.path.join(workdir, f"{dtype}_fp32.bin") if rerank else None
+    index = GalleryIndex(dim=gallery.shape[1], dtype=dtype, full_precision_path=fp_path)
+    ids = np.arange(len(gallery))
+    index.add(ids, gallery, [None] * len(gallery))
+
+    index.search(queries[:1], 1, rerank=rerank)  # warm-up
+    start = time.perf_counter()
+    _, found = index.search(queries, 1, rerank=rerank)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return index.memory_bytes(), elapsed_ms, found[:, 0]
+
+
+def benchmark(label, gallery, queries):
+    print(f"\n{label}: {len(gallery)} gallery vectors, {len(queries)} queries, dim {gallery.shape[1]}")
+    print(f"{'storage':<18}{'memory (KB)':>14}{'ms/query':>12}{'top-1 agree':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        baseline = None
+        for dtype in STORAGE_DTYPES:
+            for rerank in ([0] if dtype == "float32" else [0, RERANK_FACTOR]):
+                memory, latency, top1 = run_case(gallery, queries, dtype, rerank, workdir)
+                if baseline is None:
+                    baseline = top1
+                # Exact duplicates in the gallery tie, so a different id with the
+                # same float32 score as the baseline still counts as agreement
+                exact = np.einsum("ij,ij->i", gallery[top1], queries)
+                exact_baseline = np.einsum("ij,ij->i", gallery[baseline], queries)
+                agreement = float(np.mean((top1 == baseline) | (exact >= exact_baseline - 1e-6))) * 100
+                name = dtype + (f" +rerank{rerank}" if rerank else "")
+                print(f"{name:<18}{memory / 1024:>14.1f}{latency:>12.3f}{agreement:>13.2f}%")
+
+
+if __name__ == "__main__":
+    gallery_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    gallery, queries = synthetic_vectors(gallery_size, num_queries)
+    benchmark("Synthetic", gallery, queries)
+
+    if os.path.exists("features.json"):
+        gallery, queries = features_json_vectors("features.json", num_queries)
+        benchmark("features.json", gallery, queries)
+    else:
+        print("\nfeatures.json not found, skipping real-vector benchmark")
@@ -0,0 +1,140 @@
+"""
+Benchmark for batched, strided YOLOv8 video inference.
+
+Runs the model over a video twice, once per frame (the old /detect/video
+loop) and once through yolo_video.detect_batches, and reports frames per
+second and how many of the per-frame detections the batched run reproduces
+(same class, IoU >= 0.5) on the frames both runs processed. With a stride
+above 1 the speedup includes the skipped frames. The batched run is repeated
+while saving an annotated video, inline (result.plot() + VideoWriter) and
+through annotated_writer's writer process, to compare against detection only.
+
+Usage: python benchmark_yolo_video.py [video_path] [batch_size] [stride] [imgsz]
+Without a video path a synthetic clip of moving shapes is generated.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import cv2
+import numpy as np
+from ultralytics import YOLO
+import annotated_writer
+import yolo_video
+
+MODEL_PATH = "yolov8n.pt"
+CONF = 0.25
+IOU_MATCH = 0.5
+
+
+def synthetic_video(path, frames=240, size=(640, 384), fps=30):
+    """Writes a clip of moving rectangles and circles over noise."""
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(frames):
+        frame = rng.integers(0, 40, (size[1], size[0], 3), dtype=np.uint8)
+        x = (i * 4) % (size[0] - 120)
+        cv2.rectangle(frame, (x, 80), (x + 100, 300), (200, 180, 160), -1)
+        cv2.circle(frame, (x + 50, 60), 35, (170, 150, 140), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def boxes_of(result):
+    return [(int(box.cls[0]), box.xyxy[0].tolist()) for box in result.boxes]
+
+
+def run_per_frame(model, path, imgsz):
+    """Returns (seconds, {frame_index: boxes}) for one model call per frame."""
+    options = {"conf": CONF, "verbose": False}
+    if imgsz:
+        options["imgsz"] = imgsz
+    cap = cv2.VideoCapture(path)
+    detections = {}
+    start = time.perf_counter()
+    frame_index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        detections[frame_index] = boxes_of(model(frame, **options)[0])
+        frame_index += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed, detections
+
+
+def run_batched(model, path, batch_size, stride, imgsz, save=None, output_path=None):
+    """save: None (detection only), "inline" or "writer" (annotated video to output_path)."""
+    cap = cv2.VideoCapture(path)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    fps = max(1.0, cap.get(cv2.CAP_PROP_FPS) / stride)
+    names = [model.names[i] for i in range(len(model.names))]
+    detections = {}
+    start = time.perf_counter()
+    if save == "inline":
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    elif save == "writer":
+        out = annotated_writer.AnnotatedVideoWriter(output_path, fps, size, names)
+    for frame_index, frame, result in yolo_video.detect_batches(model, cap, CONF, stride, batch_size, imgsz):
+        detections[frame_index] = boxes_of(result)
+        if save == "inline":
+            out.write(result.plot())
+        elif save == "writer":
+            out.write(frame, yolo_video.detection_array(result))
+    if save == "inline":
+        out.release()
+    elif save == "writer":
+        out.close()
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed, detections
+
+
+def agreement(baseline, candidate):
+    """Fraction of baseline boxes on the candidate's frames matched by class and IoU."""
+    total = matched = 0
+    for frame_index, boxes in candidate.items():
+        for cls, box in baseline.get(frame_index, []):
+            total += 1
+            if any(c == cls and iou(box, b) >= IOU_MATCH for c, b in boxes):
+                matched += 1
+    return matched / total if total else 1.0
+
+
+if __name__ == "__main__":
+    video_path = sys.argv[1] if len(sys.argv) > 1 else None
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else yolo_video.DEFAULT_BATCH_SIZE
+    stride = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    imgsz = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if video_path is None:
+            video_path = synthetic_video(os.path.join(workdir, "synthetic.mp4"))
+        model = YOLO(MODEL_PATH)
+        model(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)  # warm-up
+
+        base_time, base = run_per_frame(model, video_path, imgsz)
+        batch_time, batch = run_batched(model, video_path, batch_size, stride, imgsz)
+        saved_output = os.path.join(workdir, "annotated.mp4")
+        inline_time, _ = run_batched(model, video_path, batch_size, stride, imgsz, "inline", saved_output)
+        writer_time, _ = run_batched(model, video_path, batch_size, stride, imgsz, "writer", saved_output)
+
+    total_frames = len(base)
+    print(f"\n{video_path}: {total_frames} frames, batch {batch_size}, stride {stride}, imgsz {imgsz or 'default'}")
+    print(f"{'mode':<16}{'frames run':>12}{'seconds':>10}{'video fps':>12}{'agree':>10}")
+    print(f"{'per-frame':<16}{len(base):>12}{base_time:>10.2f}{total_frames / base_time:>12.1f}{'100.00%':>10}")
+    print(f"{'batched':<16}{len(batch):>12}{batch_time:>10.2f}{total_frames / batch_time:>12.1f}"
+          f"{agreement(base, batch) * 100:>9.2f}%")
+    for label, elapsed in (("+ inline save", inline_time), ("+ writer proc", writer_time)):
+        print(f"{label:<16}{len(batch):>12}{elapsed:>10.2f}{total_frames / elapsed:>12.1f}{'':>10}")
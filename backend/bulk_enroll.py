@@ -0,0 +1,264 @@
+"""
+Parallel bulk enrollment of suspect photos.
+
+Decoding and face detection run in a process pool; aligned crops are
+embedded in batches by the recognition model in the parent process; every
+batch is inserted in a single SQLite transaction together with its manifest
+rows, so an interrupted import can be re-run and continues where it stopped.
+Images already seen are served from the enrollment cache (enroll_cache.py)
+and faces matching an existing identity are not inserted again.
+
+Usage: python bulk_enroll.py <images_folder> <name.txt> <location.txt> [workers] [batch_size]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+from multiprocessing import Pool
+import cv2
+from tqdm.auto import tqdm
+from gallery_index import encode_embedding
+import db
+import migrations
+import enroll_cache
+import face_records
+from enroll_cache import file_hash
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "faces.db")
+CROPPED_FACES_DIR = "cropped_faces"
+DET_SIZE = (640, 640)
+# Storage dtype for the faces.embedding blob (see gallery_index.STORAGE_DTYPES)
+EMBEDDING_STORAGE_DTYPE = os.environ.get("EMBEDDING_STORAGE_DTYPE", "float32")
+
+_detector = None  # Per-worker detection-only FaceAnalysis
+_cache_conn = None  # Per-worker read-only connection for cache lookups
+_retry_failed = False  # Per-worker: ignore cached errors
+
+
+def _init_worker(det_size, db_path, retry_failed=False):
+    """Loads the detection model and opens the cache connection once per worker process."""
+    global _detector, _cache_conn, _retry_failed
+    from insightface.app import FaceAnalysis
+    _detector = FaceAnalysis(name='buffalo_l', allowed_modules=['detection'])
+    _detector.prepare(ctx_id=-1, det_size=det_size)
+    _cache_conn = db.connect(db_path)
+    _retry_failed = retry_failed
+
+
+def _detect(job):
+    """
+    Hashes one image and serves it from the enrollment cache, or decodes it
+    and detects its most prominent face.
+    Returns:
+        Dict with job, hash (None if the file couldn't be read), and either
+        cached (cache entry) or crop (JPEG bytes) + aligned (112x112 RGB) or error
+    """
+    from insightface.utils import face_align
+    image_path = job[0]
+    item = {"job": job, "hash": None, "cached": None, "crop": None, "aligned": None, "error": None}
+    try:
+        item["hash"] = file_hash(image_path)
+        cached = enroll_cache.lookup(_cache_conn, item["hash"])
+        if cached is not None and (cached["embedding"] is not None or (
+                not _retry_failed and enroll_cache.is_cacheable_error(cached["error"]))):
+            item["cached"] = cached
+            return item
+
+        img = cv2.imread(image_path)
+        if img is None:
+            item["error"] = "Error loading image"
+            return item
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        bboxes, kpss = _detector.det_model.detect(img_rgb, max_num=1, metric='default')
+        if len(bboxes) == 0 or kpss is None:
+            item["error"] = "No face detected"
+            return item
+        img_h, img_w, _ = img.shape
+        x1, y1, x2, y2 = map(int, bboxes[0][:4])
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(img_w, x2), min(img_h, y2)
+        face_crop = img[y1:y2, x1:x2]
+        if face_crop.size == 0:
+            item["error"] = "Invalid face crop"
+            return item
+        item["crop"] = cv2.imencode(".jpg", face_crop)[1].tobytes()
+        item["aligned"] = face_align.norm_crop(img_rgb, landmark=kpss[0], image_size=112)
+    except Exception as e:
+        item["error"] = str(e)
+    return item
+
+
+def completed_sources(conn, retry_failed=False):
+    """Returns the source paths that a resumed run should skip."""
+    statuses = ("done", "duplicate") if retry_failed else ("done", "duplicate", "failed")
+    placeholders = ",".join("?" * len(statuses))
+    cursor = conn.execute(f"SELECT source_path FROM enrollment_manifest WHERE status IN ({placeholders})", statuses)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def faces_columns(conn):
+    """Returns the column names of the faces table."""
+    return [col[1] for col in conn.execute("PRAGMA table_info(faces)").fetchall()]
+
+
+def insert_face(cursor, columns, name, thana, image_path, embedding):
+    """Inserts one face row using whichever column layout faces.db has."""
+    values = {"name": name, "image_path": image_path}
+    values["thana" if "thana" in columns else "location"] = thana
+    if "name_key" in columns:
+        values["name_key"] = face_records.name_key(name)
+    if "embedding" in columns:
+        values["embedding"] = encode_embedding(embedding, EMBEDDING_STORAGE_DTYPE)
+    if "features" in columns:
+        values["features"] = json.dumps(embedding.tolist())
+    names = ", ".join(values)
+    placeholders = ", ".join("?" * len(values))
+    cursor.execute(f"INSERT INTO faces ({names}) VALUES ({placeholders})", list(values.values()))
+    return cursor.lastrowid
+
+
+def _set_manifest(cursor, source_path, status, face_id=None, error=None):
+    """Records the outcome for one source image in the manifest."""
+    cursor.execute(
+        "INSERT OR REPLACE INTO enrollment_manifest (source_path, status, face_id, error, updated_at) VALUES (?, ?, ?, ?, ?)",
+        (source_path, status, face_id, error, time.strftime('%Y-%m-%d %H:%M:%S'))
+    )
+
+
+def _commit_batch(conn, columns, rec_model, gallery, items, on_batch):
+    """
+    Embeds the cache misses of a batch, drops duplicates of existing
+    identities and stores the rest, the manifest and the cache in one
+    transaction.
+    Returns:
+        Counts of enrolled, duplicate and failed items
+    """
+    counts = {"enrolled": 0, "duplicate": 0, "failed": 0}
+    to_embed = [item for item in items if item["aligned"] is not None]
+    if to_embed:
+        for item, embedding in zip(to_embed, rec_model.get_feat([item["aligned"] for item in to_embed])):
+            item["embedding"] = embedding
+
+    enrolled = []
+    cursor = conn.cursor()
+    with conn:
+        for item in items:
+            image_path, name, thana = item["job"]
+            cached = item["cached"]
+            if cached is not None:
+                item["crop"], item["embedding"], item["error"] = cached["crop"], cached["embedding"], cached["error"]
+            elif item["hash"] and enroll_cache.is_cacheable_error(item["error"]):
+                enroll_cache.store(cursor, item["hash"], error=item["error"])
+
+            if item["error"]:
+                _set_manifest(cursor, image_path, "failed", error=item["error"])
+                counts["failed"] += 1
+                continue
+
+            duplicate = enroll_cache.find_near_duplicate(gallery, item["embedding"])
+            if duplicate is not None:
+                face_id, existing_name, similarity = duplicate
+                print(f"{image_path} matches existing face {face_id} ({existing_name}, {similarity:.2f}), not inserting")
+                _set_manifest(cursor, image_path, "duplicate", face_id=face_id)
+                if cached is None:
+                    enroll_cache.store(cursor, item["hash"], crop=item["crop"], embedding=item["embedding"], face_id=face_id)
+                counts["duplicate"] += 1
+                continue
+
+            # Unique name: source file names repeat across folders and drop-folder imports
+            cropped_face_path = os.path.join(CROPPED_FACES_DIR, f"{uuid.uuid4()}.jpg")
+            with open(cropped_face_path, "wb") as f:
+                f.write(item["crop"])
+            face_id = insert_face(cursor, columns, name, thana, cropped_face_path, item["embedding"])
+            _set_manifest(cursor, image_path, "done", face_id=face_id)
+            enroll_cache.store(cursor, item["hash"], crop=item["crop"], embedding=item["embedding"], face_id=face_id)
+            gallery.add([face_id], item["embedding"], [(face_id, name)])
+            enrolled.append((face_id, name, thana, cropped_face_path, item["embedding"]))
+            counts["enrolled"] += 1
+    if on_batch and enrolled:
+        on_batch(enrolled)
+    return counts
+
+
+def enroll_images(jobs, db_path=DB_PATH, rec_model=None, workers=None, batch_size=64,
+                  retry_failed=False, on_batch=None):
+    """
+    Enrolls many images in parallel.
+
+    Args:
+        jobs: List of (image_path, name, thana) tuples
+        db_path: SQLite database to insert into
+        rec_model: insightface recognition model; buffalo_l is loaded if None
+        workers: Detection processes (defaults to CPU count)
+        batch_size: Faces embedded and committed per transaction
+        retry_failed: Re-attempt images the manifest records as failed, ignoring cached errors
+        on_batch: Optional callback receiving each committed batch as a list of
+            (face_id, name, thana, cropped_face_path, embedding), e.g. to
+            update a live gallery index incrementally
+
+    Returns:
+        Stats dict with enrolled, duplicate, failed, skipped and elapsed seconds
+    """
+    os.makedirs(CROPPED_FACES_DIR, exist_ok=True)
+    if rec_model is None:
+        from insightface.app import FaceAnalysis
+        face_app = FaceAnalysis(name='buffalo_l', allowed_modules=['detection', 'recognition'])
+        face_app.prepare(ctx_id=-1, det_size=DET_SIZE)
+        rec_model = face_app.models['recognition']
+
+    conn = db.connect(db_path)
+    migrations.migrate(conn)
+    columns = faces_columns(conn)
+    gallery = enroll_cache.load_gallery(conn)
+    skip = completed_sources(conn, retry_failed)
+    pending = [job for job in jobs if job[0] not in skip]
+    stats = {"enrolled": 0, "duplicate": 0, "failed": 0, "skipped": len(jobs) - len(pending)}
+    start_time = time.time()
+
+    def flush(items):
+        for key, count in _commit_batch(conn, columns, rec_model, gallery, items, on_batch).items():
+            stats[key] += count
+
+    batch = []
+    try:
+        with Pool(processes=workers, initializer=_init_worker, initargs=(DET_SIZE, db_path, retry_failed)) as pool:
+            results = pool.imap_unordered(_detect, pending, chunksize=4)
+            for item in tqdm(results, total=len(pending), desc="Enrolling"):
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+        if batch:
+            flush(batch)
+    finally:
+        conn.close()
+
+    stats["elapsed"] = time.time() - start_time
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    from store_face import natural_sort_key, load_names_and_locations
+
+    folder, name_path, location_path = sys.argv[1:4]
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    batch_size = int(sys.argv[5]) if len(sys.argv) > 5 else 64
+
+    image_files = sorted(
+        [f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.png', '.jpeg'))],
+        key=natural_sort_key
+    )
+    names, locations = load_names_and_locations(name_path, location_path)
+    if len(image_files) != len(names) or len(image_files) != len(locations):
+        print("Error: The number of images, names, and locations do not match!")
+        sys.exit(1)
+
+    jobs = [(os.path.join(folder, f), n, l) for f, n, l in zip(image_files, names, locations)]
+    stats = enroll_images(jobs, workers=workers, batch_size=batch_size)
+    print(f"Enrolled {stats['enrolled']}, duplicates {stats['duplicate']}, failed {stats['failed']}, "
+          f"skipped {stats['skipped']} in {stats['elapsed']:.1f}s")
@@ -0,0 +1,206 @@
+"""
+Resumable chunked uploads for large CCTV files.
+
+Protocol (see the /upload-video/sessions endpoints in api.py):
+
+    1. Create a session with the file name and total size -> upload_id, offset 0
+    2. PUT chunks in order at ?offset=<current offset>, each with its SHA-256
+       in the X-Chunk-SHA256 header. A chunk at the wrong offset is refused
+       with the server's current offset; a checksum mismatch is refused and
+       nothing is written.
+    3. After a dropped connection, GET the session for its offset and resume.
+
+Sessions live on disk (<upload_id>.part plus a .json sidecar holding the
+committed offset), so uploads survive a server restart. The sidecar is only
+advanced after a chunk is fully written, and a restart truncates the part
+file back to it.
+
+GrowingVideoCapture lets analysis read a file that is still being uploaded.
+It follows the received prefix, which works for streamable containers
+(faststart MP4, MPEG-TS, AVI). For an MP4 with its index at the end, it
+waits until the upload completes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+UPLOAD_DIR = "uploads"
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".ts")
+
+
+class UploadError(Exception):
+    """A chunk was refused. status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400, offset=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class UploadStore:
+    """Upload sessions in a directory, safe to use from several threads."""
+
+    def __init__(self, upload_dir=UPLOAD_DIR):
+        self.upload_dir = upload_dir
+        self._locks = {}  # upload_id -> lock serializing writes to that session
+        self._locks_guard = threading.Lock()
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.json")
+
+    def part_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _lock(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _write_meta(self, meta):
+        tmp_path = self._meta_path(meta["upload_id"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(meta["upload_id"]))
+
+    def create(self, filename, size, chunk_size=DEFAULT_CHUNK_SIZE, **extra):
+        """Starts a session and returns its metadata dict. extra fields are stored with it."""
+        if not filename.lower().endswith(VIDEO_EXTENSIONS):
+            raise UploadError("Unsupported file format")
+        if size <= 0:
+            raise UploadError("size must be positive")
+        upload_id = str(uuid.uuid4())
+        meta = dict(extra, upload_id=upload_id, filename=os.path.basename(filename), size=size,
+                    chunk_size=min(chunk_size, MAX_CHUNK_SIZE), offset=0, created_at=time.time())
+        open(self.part_path(upload_id), "wb").close()
+        self._write_meta(meta)
+        return meta
+
+    def get(self, upload_id):
+        """Returns the session metadata (with a complete flag), or None if unknown."""
+        if not all(c in "0123456789abcdef-" for c in upload_id):
+            return None
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        meta["complete"] = meta["offset"] >= meta["size"]
+        return meta
+
+    def write_chunk(self, upload_id, offset, data, sha256=None):
+        """
+        Appends a chunk at offset after verifying its checksum.
+        Returns:
+            The updated session metadata
+        Raises:
+            UploadError: unknown session (404), offset mismatch (409, carries
+                the current offset), bad checksum or oversized chunk (400/413)
+        """
+        if len(data) > MAX_CHUNK_SIZE:
+            raise UploadError(f"Chunks are limited to {MAX_CHUNK_SIZE} bytes", status_code=413)
+        if sha256 is not None and hashlib.sha256(data).hexdigest() != sha256.lower():
+            raise UploadError("Chunk checksum mismatch")
+
+        with self._lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError("Upload not found", status_code=404)
+            if offset != meta["offset"]:
+                raise UploadError("Offset does not match the received data", status_code=409, offset=meta["offset"])
+            if offset + len(data) > meta["size"]:
+                raise UploadError("Chunk runs past the declared file size")
+
+            with open(self.part_path(upload_id), "r+b") as f:
+                # Drops any bytes left by a write that failed before its offset was recorded
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            meta["offset"] = offset + len(data)
+            meta.pop("complete")
+            self._write_meta(meta)
+        return self.get(upload_id)
+
+    def is_complete(self, upload_id):
+        meta = self.get(upload_id)
+        return meta is not None and meta["complete"]
+
+
+class GrowingVideoCapture:
+    """
+    cv2.VideoCapture-like reader over a file that may still be growing.
+    When a read fails before is_complete() is true, it waits for more data,
+    reopens the file and seeks back to the next frame. It gives up after
+    stall_timeout seconds without growth.
+    """
+
+    def __init__(self, path, is_complete, poll_seconds=1.0, stall_timeout=600):
+        self.path = path
+        self._is_complete = is_complete
+        self._poll_seconds = poll_seconds
+        self._stall_timeout = stall_timeout
+        self._next_frame = 0
+        self._cap = None
+        self._open()
+
+    def _wait_for_growth(self):
+        """Blocks until the file grows or is complete. Returns False on a stall."""
+        size = os.path.getsize(self.path)
+        deadline = time.time() + self._stall_timeout
+        while time.time() < deadline:
+            if self._is_complete():
+                return True
+            time.sleep(self._poll_seconds)
+            if os.path.getsize(self.path) != size:
+                return True
+        return False
+
+    def _open(self):
+        import cv2
+        while True:
+            self._cap = cv2.VideoCapture(self.path)
+            if self._cap.isOpened() or self._is_complete() or not self._wait_for_growth():
+                return
+            self._cap.release()
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def read(self):
+        import cv2
+        while True:
+            ret, frame = self._cap.read()
+            if ret:
+                self._next_frame += 1
+                return ret, frame
+            if self._is_complete() or not self._wait_for_growth():
+                return ret, frame
+            # Reopen so the demuxer sees the new bytes, then resume at the next frame
+            self._cap.release()
+            self._cap = cv2.VideoCapture(self.path)
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, self._next_frame)
+
+    def grab(self):
+        return self.read()[0]
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._next_frame)
+        return self._cap.get(prop)
+
+    def set(self, prop, value):
+        import cv2
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._next_frame = int(value)
+        return self._cap.set(prop, value)
+
+    def release(self):
+        self._cap.release()
@@ -0,0 +1,78 @@
+"""
+Shared SQLite access layer.
+
+Connections are opened in WAL mode with tuned pragmas and a busy timeout,
+so readers never block on writers and short write bursts wait instead of
+failing with "database is locked". get_connection() hands out one pooled
+connection per thread; calling close() on it returns it to the pool (rolling
+back anything left uncommitted) instead of closing it, so endpoints keep
+their open/query/close pattern while reusing the connection and its
+prepared-statement cache.
+"""
+
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.environ.get("SHERLOCK_DB_PATH", "faces.db")
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",      # Durable at checkpoints, safe in WAL mode
+    "PRAGMA cache_size=-20000",       # ~20 MB page cache per connection
+    "PRAGMA mmap_size=268435456",     # Memory-map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+_local = threading.local()
+
+
+def _apply_pragmas(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+
+def connect(db_path=DB_PATH):
+    """Opens a new, unpooled connection with the standard pragmas (for long-running writers)."""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=CACHED_STATEMENTS)
+    _apply_pragmas(conn)
+    return conn
+
+
+class PooledConnection(sqlite3.Connection):
+    """Per-thread connection whose close() returns it to the pool."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_for_real(self):
+        super().close()
+
+
+def get_connection(db_path=DB_PATH):
+    """
+    Returns this thread's pooled connection to db_path (rows as sqlite3.Row),
+    opening it on first use.
+    """
+    pool = getattr(_local, "connections", None)
+    if pool is None:
+        pool = _local.connections = {}
+    conn = pool.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(
+            db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=CACHED_STATEMENTS,
+            factory=PooledConnection
+        )
+        _apply_pragmas(conn)
+        conn.row_factory = sqlite3.Row
+        pool[db_path] = conn
+    elif conn.in_transaction:
+        # A previous user of this thread's connection failed before committing
+        conn.rollback()
+    return conn
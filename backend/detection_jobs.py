@@ -0,0 +1,161 @@
+"""
+Background YOLO video detection jobs.
+
+POST /detect/video?job=true returns a job id at once and the video is
+processed in the background, on the job store's own max_concurrent worker
+threads rather than the server's threadpool. Job state lives on disk (one directory per job
+holding job.json, the growing detections.ndjson and the outputs), so every
+worker process can answer status and result requests for any job.
+
+At most max_concurrent jobs run at a time across all worker processes
+sharing jobs_dir: a job must hold an exclusive lock on one of the slot files
+before it starts. Locks are released by the OS when a process dies, so a
+crashed worker never leaks a slot.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the limit then only holds within one process
+    fcntl = None
+
+JOBS_DIR = "detection_jobs"
+MAX_CONCURRENT_JOBS = int(os.environ.get("SHERLOCK_MAX_DETECTION_JOBS", "2"))
+SLOT_POLL_SECONDS = 0.5
+PARTIAL_READ_BYTES = 1024 * 1024
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED_STATES = (COMPLETED, FAILED)
+
+_local_slots = {}
+_local_slots_guard = threading.Lock()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+class JobStore:
+    """Job records in a directory, safe to use from several threads and processes."""
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_concurrent=MAX_CONCURRENT_JOBS):
+        self.jobs_dir = jobs_dir
+        self.max_concurrent = max(1, max_concurrent)
+        os.makedirs(os.path.join(jobs_dir, "slots"), exist_ok=True)
+        # More threads would only wait for a slot; queued jobs wait in the executor instead
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="detection-job")
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def path(self, job_id, name):
+        """Path of a file belonging to a job (input, outputs, partial detections)."""
+        return os.path.join(self.job_dir(job_id), name)
+
+    def _write(self, job):
+        tmp_path = self.path(job["job_id"], f"job.json.{os.getpid()}.{threading.get_ident()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self.path(job["job_id"], "job.json"))
+
+    def create(self, **fields):
+        """Records a queued job owned by this process and returns it."""
+        job_id = str(uuid.uuid4())
+        os.makedirs(self.job_dir(job_id))
+        job = dict(fields, job_id=job_id, status=QUEUED, progress=0.0, pid=os.getpid(),
+                   created_at=time.time())
+        self._write(job)
+        return job
+
+    def submit(self, fn, *args):
+        """Runs fn(*args) on the store's job threads and returns its future."""
+        return self._executor.submit(fn, *args)
+
+    def get(self, job_id):
+        """
+        Returns the job dict, or None if unknown. A queued or running job whose
+        process has exited is reported (and recorded) as failed.
+        """
+        if not all(c in "0123456789abcdef-" for c in job_id):
+            return None
+        try:
+            with open(self.path(job_id, "job.json"), "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            return None
+        if job["status"] not in FINISHED_STATES and not _pid_alive(job["pid"]):
+            job = self.update(job_id, status=FAILED, error="Worker process exited before the job finished")
+        return job
+
+    def update(self, job_id, **fields):
+        """Merges fields into the job record. Only the owning process should call this."""
+        with open(self.path(job_id, "job.json"), "r", encoding="utf-8") as f:
+            job = json.load(f)
+        job.update(fields)
+        self._write(job)
+        return job
+
+    @contextmanager
+    def slot(self):
+        """Blocks until one of the max_concurrent job slots is free and holds it."""
+        if fcntl is None:
+            with _local_semaphore(self.jobs_dir, self.max_concurrent):
+                yield
+            return
+        while True:
+            for i in range(self.max_concurrent):
+                f = open(os.path.join(self.jobs_dir, "slots", f"slot-{i}.lock"), "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+                return
+            time.sleep(SLOT_POLL_SECONDS)
+
+    def read_partial(self, job_id, name, offset=0, max_bytes=PARTIAL_READ_BYTES):
+        """
+        Reads complete NDJSON lines of a job file starting at byte offset.
+        Returns:
+            (parsed lines, offset to continue from)
+        """
+        try:
+            with open(self.path(job_id, name), "rb") as f:
+                f.seek(offset)
+                data = f.read(max_bytes)
+        except FileNotFoundError:
+            return [], offset
+        # Only hand out whole lines; a line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        lines = [json.loads(line) for line in data[:end].splitlines() if line]
+        return lines, offset + end
+
+
+@contextmanager
+def _local_semaphore(jobs_dir, limit):
+    with _local_slots_guard:
+        semaphore = _local_slots.setdefault(jobs_dir, threading.BoundedSemaphore(limit))
+    with semaphore:
+        yield
@@ -0,0 +1,117 @@
+"""
+Content-addressed enrollment cache.
+
+Entries are keyed by the SHA-256 of the image bytes plus the face model
+version and hold the face crop (JPEG), its embedding and the face row it was
+enrolled as. Re-importing the same photo is served from here without
+decoding, detection or recognition, and an image already in the gallery is
+reported as a duplicate instead of being inserted twice. Images in which no
+face was found are cached too, with their error; other failures (unreadable
+files, exceptions) may be transient and are not.
+"""
+
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from gallery_index import GalleryIndex, encode_embedding, decode_embedding
+
+MODEL_VERSION = "buffalo_l/w600k_r50"
+# Cosine similarity above which a new face is treated as an existing identity.
+# Re-scans and re-encodes of one photo score ~0.95; distinct photos of the
+# same person usually stay well below 0.9.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Errors that the same image bytes and model always produce again
+CACHEABLE_ERRORS = ("No face detected", "Invalid face crop")
+
+
+def content_hash(data):
+    """SHA-256 hex digest of raw image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_cacheable_error(error):
+    """True for failures determined by the image itself, which are worth caching."""
+    return error in CACHEABLE_ERRORS
+
+
+def lookup(conn, digest, model_version=MODEL_VERSION):
+    """
+    Returns the cache entry for an image hash as a dict with crop (JPEG bytes),
+    embedding (float32 array), face_id and error, or None on a miss.
+    """
+    row = conn.execute(
+        "SELECT crop, embedding, face_id, error FROM enrollment_cache WHERE content_hash = ? AND model_version = ?",
+        (digest, model_version)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "crop": row[0],
+        "embedding": decode_embedding(row[1]),
+        "face_id": row[2],
+        "error": row[3],
+    }
+
+
+def store(conn, digest, crop=None, embedding=None, face_id=None, error=None, model_version=MODEL_VERSION):
+    """Inserts or replaces a cache entry. The caller commits."""
+    conn.execute(
+        "INSERT OR REPLACE INTO enrollment_cache (content_hash, model_version, crop, embedding, face_id, error, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (digest, model_version, crop, None if embedding is None else encode_embedding(embedding),
+         face_id, error, time.strftime('%Y-%m-%d %H:%M:%S'))
+    )
+
+
+def enrolled_face_id(conn, digest, model_version=MODEL_VERSION):
+    """Returns the id of the face row this exact image was enrolled as, if that row still exists."""
+    row = conn.execute(
+        "SELECT c.face_id FROM enrollment_cache c JOIN faces f ON f.id = c.face_id "
+        "WHERE c.content_hash = ? AND c.model_version = ?",
+        (digest, model_version)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def load_gallery(conn):
+    """Builds a GalleryIndex over every stored face embedding for near-duplicate checks."""
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(faces)").fetchall()]
+    index = GalleryIndex()
+    if "embedding" in columns:
+        rows = conn.execute("SELECT id, name, embedding FROM faces WHERE embedding IS NOT NULL").fetchall()
+        vectors = [decode_embedding(row[2]) for row in rows]
+    elif "features" in columns:
+        rows = conn.execute("SELECT id, name, features FROM faces WHERE features IS NOT NULL").fetchall()
+        vectors = [np.array(json.loads(row[2]), dtype=np.float32) for row in rows]
+    else:
+        return index
+    if rows:
+        index.add([row[0] for row in rows], np.array(vectors), [(row[0], row[1]) for row in rows])
+    return index
+
+
+def find_near_duplicate(index, embedding, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Checks an embedding against the gallery.
+    Returns:
+        (face_id, name, similarity) of an existing identity above threshold, or None
+    """
+    if index is None or len(index) == 0:
+        return None
+    scores, ids = index.search(embedding, 1)
+    if ids[0][0] == -1 or scores[0][0] < threshold:
+        return None
+    face_id = int(ids[0][0])
+    record = index.records.get(face_id)
+    return face_id, record[1] if record else None, float(scores[0][0])
@@ -0,0 +1,103 @@
+"""
+Background enrollment queue for uploaded suspect photos.
+
+Uploads are queued and return immediately with an enrollment id. A single
+worker thread drains the queue in batches so that a burst of uploads shares
+one recognition batch, and records per-enrollment status for polling.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Enrollment states
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+FINISHED_STATES = (DONE, DUPLICATE, FAILED)
+
+
+class EnrollmentQueue:
+    """
+    Args:
+        process_batch: Callable receiving a list of job dicts. It must set each
+            job's "status" to one of FINISHED_STATES and may add result fields.
+        batch_size: Maximum jobs handed to process_batch at once
+        max_pending: Queue capacity; submit raises queue.Full beyond it
+        max_tracked: Finished jobs kept for status queries before the oldest are dropped
+    """
+
+    def __init__(self, process_batch, batch_size=16, max_pending=1000, max_tracked=10000):
+        self._process_batch = process_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._batch_size = batch_size
+        self._max_tracked = max_tracked
+        self._jobs = OrderedDict()  # enrollment id -> job dict
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Starts the worker thread if it isn't running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="enrollment-worker", daemon=True)
+            self._thread.start()
+
+    def submit(self, **payload):
+        """Queues a job and returns its enrollment id. Raises queue.Full when saturated."""
+        enrollment_id = str(uuid.uuid4())
+        job = dict(payload, enrollment_id=enrollment_id, status=QUEUED, queued_at=time.time())
+        with self._lock:
+            self._jobs[enrollment_id] = job
+            self._prune()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(enrollment_id, None)
+            raise
+        return enrollment_id
+
+    def status(self, enrollment_id):
+        """Returns a copy of the job dict, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(enrollment_id)
+            return dict(job) if job else None
+
+    def pending(self):
+        """Number of jobs waiting in the queue."""
+        return self._queue.qsize()
+
+    def _prune(self):
+        """Drops the oldest finished jobs beyond max_tracked. Caller holds the lock."""
+        excess = len(self._jobs) - self._max_tracked
+        for enrollment_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[enrollment_id]["status"] in FINISHED_STATES:
+                del self._jobs[enrollment_id]
+                excess -= 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for job in batch:
+                job["status"] = PROCESSING
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                print(f"Error processing enrollment batch: {str(e)}")
+                for job in batch:
+                    if job["status"] not in FINISHED_STATES:
+                        job["status"] = FAILED
+                        job["error"] = str(e)
+            for job in batch:
+                job["finished_at"] = time.time()
@@ -0,0 +1,159 @@
+"""
+Paginated, filterable reads of the faces table for the records endpoints.
+
+Pages are keyed on rowid (keyset pagination): a page ends with an opaque
+cursor and the next page starts strictly after it, so every page costs the
+same however deep the client has scrolled, and rows inserted or deleted in
+between never shift or repeat a page. Filters are an exact thana and a
+case-insensitive name prefix, both served by indexes from migrations.py.
+Names are matched on name_key, folded by name_key() on both sides, so the
+prefix search is case-insensitive beyond ASCII too.
+
+Public field names are mapped onto whichever faces columns are present, so
+a database that hasn't been migrated yet (thana as location, image_path as
+img) still reads correctly.
+"""
+
+import json
+import unicodedata
+
+FACE_FIELDS = ("id", "name", "thana", "image_path", "created_at")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+
+# Field (public ones plus name_key) -> candidate columns, first match wins
+_FIELD_COLUMNS = {
+    "id": ("id",),
+    "name": ("name",),
+    "thana": ("thana", "location"),
+    "image_path": ("image_path", "img"),
+    "created_at": ("created_at",),
+    "name_key": ("name_key",),
+}
+
+
+def name_key(name):
+    """Case-folded form of a name stored in faces.name_key and used for prefix search."""
+    return unicodedata.normalize("NFKC", name or "").casefold()
+
+
+def column_map(conn):
+    """Maps each public field to the faces column backing it (None if the table lacks it)."""
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(faces)").fetchall()]
+    return {
+        field: next((c for c in candidates if c in columns), None)
+        for field, candidates in _FIELD_COLUMNS.items()
+    }
+
+
+def parse_fields(fields):
+    """
+    Parses a comma-separated field list.
+    Returns:
+        List of public field names (all of FACE_FIELDS when fields is empty)
+    Raises:
+        ValueError: on an unknown field
+    """
+    if not fields:
+        return list(FACE_FIELDS)
+    selected = []
+    for field in fields.split(","):
+        field = field.strip()
+        if field not in FACE_FIELDS:
+            raise ValueError(f"Unknown field '{field}', expected any of {', '.join(FACE_FIELDS)}")
+        if field not in selected:
+            selected.append(field)
+    return selected
+
+
+def parse_cursor(cursor):
+    """Decodes a page cursor. Raises ValueError if it isn't one this module issued."""
+    if cursor is None or cursor == "":
+        return None
+    if not cursor.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(cursor)
+
+
+def _prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _where(columns, thana=None, name_prefix=None, after=None):
+    """Builds the WHERE clause and parameters for the filters."""
+    clauses, params = [], []
+    if thana:
+        if columns["thana"] is None:
+            clauses.append("0")
+        else:
+            clauses.append(f"{columns['thana']} = ?")
+            params.append(thana)
+    if name_prefix and columns["name_key"]:
+        # A range on the name_key index rather than LIKE, which can't use it
+        prefix = name_key(name_prefix)
+        clauses.append("name_key >= ? AND name_key < ?")
+        params.extend([prefix, _prefix_upper_bound(prefix)])
+    elif name_prefix:
+        # Not migrated yet: NOCASE folds ASCII only
+        prefix = name_prefix.lower()
+        clauses.append("name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE")
+        params.extend([prefix, _prefix_upper_bound(prefix)])
+    if after is not None:
+        clauses.append("rowid > ?")
+        params.append(after)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query_faces(conn, fields=None, thana=None, name_prefix=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Reads one page of faces in insertion order.
+    Args:
+        fields: Public field names to return (default all)
+        thana: Exact thana to filter on
+        name_prefix: Case-insensitive name prefix to filter on
+        after: Cursor returned with the previous page
+        limit: Page size
+    Returns:
+        (list of face dicts, cursor of the next page or None on the last page)
+    """
+    columns = column_map(conn)
+    fields = fields or list(FACE_FIELDS)
+    select = ", ".join(
+        f"{columns[field]} AS {field}" if columns[field] else f"NULL AS {field}"
+        for field in fields
+    )
+    where, params = _where(columns, thana, name_prefix, after)
+    rows = conn.execute(
+        f"SELECT rowid, {select} FROM faces{where} ORDER BY rowid LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+    faces = [dict(zip(fields, row[1:])) for row in rows[:limit]]
+    return faces, next_cursor
+
+
+def count_faces(conn, thana=None, name_prefix=None):
+    """Number of faces matching the filters."""
+    where, params = _where(column_map(conn), thana, name_prefix)
+    return conn.execute(f"SELECT COUNT(*) FROM faces{where}", params).fetchone()[0]
+
+
+def iter_ndjson(get_conn, fields=None, thana=None, name_prefix=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields every matching face as one JSON line, reading the table in keyset
+    chunks so memory stays flat. get_conn is called per chunk, because a
+    streaming response may resume the generator on a different thread.
+    """
+    after = None
+    while True:
+        conn = get_conn()
+        try:
+            faces, after = query_faces(conn, fields, thana, name_prefix, after, chunk_size)
+        finally:
+            conn.close()
+        if faces:
+            yield "".join(json.dumps(face) + "\n" for face in faces)
+        if after is None:
+            break
@@ -1,11 +1,12 @@
 import cv2
 import numpy as np
-import json
 import faiss
 
-import sqlite3
 import os
 from insightface.app import FaceAnalysis
+import db
+import migrations
+from gallery_index import decode_embedding
 DB_PATH = os.path.join(os.path.dirname(__file__), "faces.db")
 
 # Initialize FaceAnalysis model
@@ -14,18 +15,18 @@ face_app.prepare(ctx_id=-1, det_size=(640, 640))
 
 def load_face_database():
     """Fetches stored face data from SQLite and builds a FAISS index."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(DB_PATH)
+    migrations.migrate(conn)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, name, location, features FROM faces")
+    cursor.execute("SELECT id, name, thana, embedding FROM faces WHERE embedding IS NOT NULL")
     rows = cursor.fetchall()
     conn.close()
     records = []
     feature_vectors = []
     for row in rows:
-        face_id, name, location, features_json = row
-        feature_vector = json.loads(features_json)
+        face_id, name, location, embedding = row
         records.append((face_id, name, location))
-        feature_vectors.append(np.array(feature_vector).astype('float32'))
+        feature_vectors.append(decode_embedding(embedding))
     if not feature_vectors:
         return None, []
     feature_vectors = np.array(feature_vectors).astype('float32')
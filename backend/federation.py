@@ -0,0 +1,160 @@
+"""
+Scatter-gather search across multiple SherlockAI nodes.
+
+Each node serves /search-faces over the gallery shards it owns. A
+coordinator fans the same query out to its peers over HTTP, hedges slow
+peers onto their replicas, tolerates peers that time out or fail, and
+merges every node's candidates into one top-k per face.
+
+Peers are configured as a comma-separated list of peer groups; replicas
+of the same shards are joined with "|":
+
+    SHERLOCK_PEERS="http://10.0.0.2:8001|http://10.0.0.3:8001,http://10.0.0.4:8001"
+
+Local test with three nodes on one box (each with its own database):
+
+    SHERLOCK_DB_PATH=north.db uvicorn api:app --port 8002
+    SHERLOCK_DB_PATH=south.db uvicorn api:app --port 8003
+    SHERLOCK_PEERS=http://localhost:8002,http://localhost:8003 uvicorn api:app --port 8001
+
+then POST to http://localhost:8001/federated-search-faces.
+"""
+
+import asyncio
+
+
+class PeerError(Exception):
+    """Raised when no replica of a peer group returned a usable response."""
+
+
+def parse_peer_groups(spec):
+    """Parses a SHERLOCK_PEERS string into a list of replica URL lists."""
+    groups = []
+    for group in (spec or "").split(","):
+        replicas = [url.strip().rstrip("/") for url in group.split("|") if url.strip()]
+        if replicas:
+            groups.append(replicas)
+    return groups
+
+
+async def _post_json(client, url, payload, parse=None):
+    """
+    POSTs payload to url and returns the decoded body of a successful
+    response, passed through parse if given.
+    """
+    response = await client.post(url, json=payload)
+    response.raise_for_status()
+    data = response.json()
+    if not isinstance(data, dict):
+        raise PeerError(f"{url} returned a malformed response")
+    if data.get("status") != "success":
+        raise PeerError(data.get("message", f"{url} returned status {data.get('status')}"))
+    return parse(data) if parse else data
+
+
+async def hedged_post(client, replicas, path, payload, timeout, hedge_delay, parse=None):
+    """
+    Sends payload to the first replica and, if it has not answered within
+    hedge_delay seconds (or has already failed), to the next one as well.
+    The first successful answer wins and the other requests are cancelled.
+    An answer that parse rejects counts as a failed replica.
+
+    Returns:
+        (replica_url, response_json or what parse returned)
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = {}
+    errors = []
+    next_replica = 0
+
+    while next_replica < len(replicas) or pending:
+        wait_for = None
+        if next_replica < len(replicas):
+            url = replicas[next_replica]
+            next_replica += 1
+            pending[asyncio.create_task(_post_json(client, url + path, payload, parse))] = url
+            if next_replica < len(replicas):
+                wait_for = hedge_delay
+
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        wait_for = remaining if wait_for is None else min(wait_for, remaining)
+        done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            url = pending.pop(task)
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return url, task.result()
+            errors.append(f"{url}: {task.exception()!r}")
+
+    for task in pending:
+        task.cancel()
+    raise PeerError("; ".join(errors) or f"timed out after {timeout}s")
+
+
+async def scatter_gather(peer_groups, path, payload, timeout=5.0, hedge_delay=0.5, parse=None):
+    """
+    Queries every peer group concurrently.
+
+    Args:
+        parse: Optional callable validating and converting each response;
+            raising PeerError marks the replica as failed
+
+    Returns:
+        (responses, failures) where responses is a list of (replica_url, json)
+        and failures lists the peer groups that gave no usable answer
+    """
+    if not peer_groups:
+        return [], []
+    import httpx
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        outcomes = await asyncio.gather(
+            *[hedged_post(client, group, path, payload, timeout, hedge_delay, parse) for group in peer_groups],
+            return_exceptions=True
+        )
+
+    responses = []
+    failures = []
+    for group, outcome in zip(peer_groups, outcomes):
+        if isinstance(outcome, Exception):
+            failures.append({"peer": "|".join(group), "error": str(outcome)})
+        else:
+            responses.append(outcome)
+    return responses, failures
+
+
+def search_results(data, num_queries):
+    """
+    Validates a peer's /search-faces response.
+
+    Returns:
+        One candidate list per query embedding
+    Raises:
+        PeerError: a result is missing, has an out-of-range index or
+            carries candidates without a numeric similarity
+    """
+    results = data.get("results")
+    if not isinstance(results, list):
+        raise PeerError("response has no results list")
+    per_query = [[] for _ in range(num_queries)]
+    for result in results:
+        index = result.get("index") if isinstance(result, dict) else None
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < num_queries:
+            raise PeerError(f"result index {index!r} is not one of the {num_queries} queries")
+        candidates = result.get("candidates")
+        if not isinstance(candidates, list) or not all(
+                isinstance(c, dict) and isinstance(c.get("similarity"), (int, float)) for c in candidates):
+            raise PeerError(f"result {index} has malformed candidates")
+        per_query[index] = candidates
+    return per_query
+
+
+def merge_topk(candidate_lists, k):
+    """Merges several nodes' candidate lists for one face into a single top-k."""
+    merged = [candidate for candidates in candidate_lists for candidate in candidates]
+    merged.sort(key=lambda candidate: candidate["similarity"], reverse=True)
+    return merged[:k]
@@ -0,0 +1,400 @@
+"""
+In-memory gallery index for suspect face embeddings.
+
+ArcFace vectors are 512-d float32 (2 KB per suspect). The gallery can be
+kept as float32, float16 or int8 scalar-quantized codes, both in the SQLite
+blob column and in the FAISS index. Quantized searches can optionally be
+re-ranked against the full-precision vectors, which are kept in a
+memory-mapped sidecar file instead of resident memory.
+"""
+
+import os
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+EMBEDDING_DIM = 512
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# Quantized blobs carry a 4-byte tag; untagged blobs are legacy raw float32
+_BLOB_TAGS = {
+    "float16": b"F16\x00",
+    "int8": b"SQ8\x00",
+}
+_TAG_DTYPES = {tag: dtype for dtype, tag in _BLOB_TAGS.items()}
+
+
+def normalize(vectors):
+    """Returns a float32 copy of the vectors, L2-normalized row-wise."""
+    import faiss
+    vectors = np.array(vectors, dtype=np.float32, copy=True)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def encode_embedding(vector, dtype="float32"):
+    """Serializes one embedding to a SQLite blob in the requested storage dtype."""
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unsupported storage dtype: {dtype}")
+    vector = normalize(vector)[0]
+    if dtype == "float32":
+        return vector.tobytes()
+    if dtype == "float16":
+        return _BLOB_TAGS["float16"] + vector.astype(np.float16).tobytes()
+    # Symmetric per-vector int8 quantization, scale stored as float32
+    scale = float(np.abs(vector).max()) / 127.0 or 1.0
+    codes = np.clip(np.round(vector / scale), -127, 127).astype(np.int8)
+    return _BLOB_TAGS["int8"] + np.float32(scale).tobytes() + codes.tobytes()
+
+
+def decode_embedding(blob):
+    """Deserializes a blob written by encode_embedding (or a legacy float32 blob)."""
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    dtype = _TAG_DTYPES.get(blob[:4])
+    if dtype == "float16":
+        return np.frombuffer(blob[4:], dtype=np.float16).astype(np.float32)
+    if dtype == "int8":
+        scale = np.frombuffer(blob[4:8], dtype=np.float32)[0]
+        return np.frombuffer(blob[8:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=np.float32).copy()
+
+
+def _make_faiss_index(dim, dtype):
+    """Creates an inner-product FAISS index for the given storage dtype."""
+    import faiss
+    if dtype == "float32":
+        base = faiss.IndexFlatIP(dim)
+    elif dtype == "float16":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    elif dtype == "int8":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unsupported storage dtype: {dtype}")
+    return faiss.IndexIDMap2(base)
+
+
+class GalleryIndex:
+    """
+    FAISS index over gallery embeddings keyed by face id.
+
+    Args:
+        dim: Embedding dimension
+        dtype: In-memory storage dtype, one of STORAGE_DTYPES
+        full_precision_path: Optional file for float32 copies used by re-ranking.
+            It belongs to this index alone and is started empty.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, dtype="float32", full_precision_path=None):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        self.dim = dim
+        self.dtype = dtype
+        self.index = _make_faiss_index(dim, dtype)
+        self.records = {}  # face id -> metadata dict
+        self.full_precision_path = full_precision_path
+        self._fp_offsets = {}  # face id -> row in the full-precision file
+        self._fp_rows = 0
+        self._fp_map = None
+        # FAISS indexes are not safe to search while another thread adds to them
+        self._lock = threading.Lock()
+        if full_precision_path:
+            open(full_precision_path, "wb").close()
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def add(self, ids, vectors, records):
+        """Adds normalized vectors with their integer ids and metadata records."""
+        if len(ids) == 0:
+            return
+        with self._lock:
+            self._add(ids, vectors, records)
+
+    def _add(self, ids, vectors, records):
+        vectors = normalize(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.dtype == "int8" and not self.index.is_trained:
+            # The 8-bit quantizer learns per-dimension ranges. Unit vectors stay
+            # inside [-1, 1], so train on the gallery plus the range endpoints.
+            bounds = np.vstack([vectors, np.full((1, self.dim), -1, np.float32), np.ones((1, self.dim), np.float32)])
+            self.index.train(bounds)
+        self.index.add_with_ids(vectors, ids)
+        for face_id, record in zip(ids.tolist(), records):
+            self.records[face_id] = record
+        if self.full_precision_path:
+            with open(self.full_precision_path, "ab") as f:
+                f.write(vectors.tobytes())
+            for face_id in ids.tolist():
+                self._fp_offsets[face_id] = self._fp_rows
+                self._fp_rows += 1
+            self._fp_map = None
+
+    def remove(self, ids):
+        """Removes ids from the index. Returns the number of vectors removed."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if ids.size == 0:
+            return 0
+        with self._lock:
+            removed = self.index.remove_ids(ids)
+            for face_id in ids.tolist():
+                self.records.pop(face_id, None)
+                self._fp_offsets.pop(face_id, None)
+        return removed
+
+    def discard(self):
+        """
+        Deletes the full-precision file once the index has been replaced.
+        The file is mapped first, so searches still running on this index keep
+        reading it after the unlink.
+        """
+        if not self.full_precision_path:
+            return
+        with self._lock:
+            if self._fp_rows and (self._fp_map is None or self._fp_map.shape[0] != self._fp_rows):
+                self._fp_map = np.memmap(self.full_precision_path, dtype=np.float32, mode="r",
+                                         shape=(self._fp_rows, self.dim))
+            try:
+                os.remove(self.full_precision_path)
+            except OSError:
+                pass  # e.g. Windows, where a mapped file cannot be deleted
+
+    def _full_precision(self, face_ids):
+        """Returns the float32 vectors for face_ids from the memory-mapped sidecar."""
+        if self._fp_map is None or self._fp_map.shape[0] != self._fp_rows:
+            self._fp_map = np.memmap(self.full_precision_path, dtype=np.float32, mode="r",
+                                     shape=(self._fp_rows, self.dim))
+        rows = [self._fp_offsets[face_id] for face_id in face_ids]
+        return np.asarray(self._fp_map[rows])
+
+    def search(self, queries, k=1, rerank=0, allowed_ids=None):
+        """
+        Searches the gallery.
+
+        Args:
+            queries: (n, dim) array of query embeddings
+            k: Number of neighbours per query
+            rerank: If > 0 and full-precision vectors are kept, fetch k * rerank
+                candidates from the quantized index and re-score them in float32
+            allowed_ids: Optional iterable of face ids to restrict the search to
+
+        Returns:
+            (scores, ids) arrays of shape (n, k); missing neighbours have id -1
+        """
+        queries = normalize(queries)
+        with self._lock:
+            return self._search(queries, k, rerank, allowed_ids)
+
+    def _search(self, queries, k, rerank, allowed_ids):
+        k = max(1, min(k, len(self) or k))
+        can_rerank = rerank > 0 and self.dtype != "float32" and self.full_precision_path
+        fetch = min(len(self), k * rerank) if can_rerank else k
+        params = None
+        if allowed_ids is not None:
+            import faiss
+            allowed = np.asarray(list(allowed_ids), dtype=np.int64)
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed))
+        scores, ids = self.index.search(queries, max(fetch, 1), params=params)
+        if not can_rerank:
+            return scores, ids
+
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for qi, query in enumerate(queries):
+            candidates = [int(i) for i in ids[qi] if i != -1]
+            if not candidates:
+                continue
+            exact = self._full_precision(candidates) @ query
+            order = np.argsort(-exact, kind="stable")[:k]
+            out_scores[qi, :len(order)] = exact[order]
+            out_ids[qi, :len(order)] = np.asarray(candidates)[order]
+        return out_scores, out_ids
+
+    def memory_bytes(self):
+        """Approximate resident size of the stored codes in bytes."""
+        import faiss
+        base = faiss.downcast_index(self.index.index)
+        if isinstance(base, faiss.IndexFlat):
+            return base.ntotal * self.dim * 4
+        return base.ntotal * base.code_size
+
+    def ids_where(self, predicate):
+        """Returns the face ids whose metadata record satisfies predicate."""
+        return [face_id for face_id, record in self.records.items() if predicate(record)]
+
+
+class ShardedGallery:
+    """
+    Gallery partitioned into one GalleryIndex per thana (police station).
+
+    Searches scoped to some thanas only touch those shards. Unscoped searches
+    fan out over every shard in parallel (FAISS releases the GIL) and merge
+    the per-shard top-k. Rebuilding a thana replaces just its shard.
+
+    Adds and rebuilds are serialized by lock; a caller that reads a thana's
+    rows from the database for rebuild_shard holds it around the read too,
+    so a face added meanwhile is neither lost nor added twice. The shard dict
+    is replaced rather than changed in place, so searches iterate a stable
+    snapshot without taking the lock.
+
+    Args:
+        dim: Embedding dimension
+        dtype: In-memory storage dtype for every shard
+        full_precision_dir: Optional directory for per-shard re-rank sidecars
+        max_workers: Threads used to fan searches out across shards
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, dtype="float32", full_precision_dir=None, max_workers=None):
+        self.dim = dim
+        self.dtype = dtype
+        self.full_precision_dir = full_precision_dir
+        self.shards = {}  # thana -> GalleryIndex, replaced on every change
+        self.records = {}  # face id -> metadata across all shards
+        self._face_thanas = {}  # face id -> thana
+        self.lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1))
+        if full_precision_dir:
+            os.makedirs(full_precision_dir, exist_ok=True)
+            _remove_orphaned_sidecars(full_precision_dir)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards.values())
+
+    def _new_shard(self, thana):
+        fp_path = None
+        if self.full_precision_dir:
+            # A fresh file per shard generation and process: the directory is shared
+            # by worker processes, and a rebuild must not touch the live shard's file
+            name = hashlib.sha1(str(thana).encode("utf-8")).hexdigest()[:16]
+            fp_path = os.path.join(self.full_precision_dir, f"{name}.{os.getpid()}.{uuid.uuid4().hex[:12]}.bin")
+        return GalleryIndex(dim=self.dim, dtype=self.dtype, full_precision_path=fp_path)
+
+    def add(self, thana, ids, vectors, records):
+        """
+        Adds vectors to the thana's shard, creating the shard if needed.
+        Ids already in the gallery (e.g. picked up by a rebuild) are skipped.
+        """
+        with self.lock:
+            keep = [i for i, face_id in enumerate(ids) if int(face_id) not in self._face_thanas]
+            if not keep:
+                return
+            ids = [int(ids[i]) for i in keep]
+            vectors = np.asarray(vectors)[keep]
+            records = [records[i] for i in keep]
+            shard = self.shards.get(thana)
+            if shard is None:
+                shard = self._new_shard(thana)
+                self.shards = {**self.shards, thana: shard}
+            shard.add(ids, vectors, records)
+            for face_id, record in zip(ids, records):
+                self.records[face_id] = record
+                self._face_thanas[face_id] = thana
+
+    def rebuild_shard(self, thana, ids, vectors, records):
+        """Replaces the thana's shard with the given vectors; drops it when empty."""
+        with self.lock:
+            ids = [int(face_id) for face_id in ids]
+            shards = dict(self.shards)
+            if not ids:
+                old = shards.pop(thana, None)
+            else:
+                # Build the replacement first so concurrent searches never see a gap
+                shard = self._new_shard(thana)
+                shard.add(ids, vectors, records)
+                old = shards.get(thana)
+                shards[thana] = shard
+                for face_id, record in zip(ids, records):
+                    self.records[face_id] = record
+                    self._face_thanas[face_id] = thana
+            self.shards = shards
+            if old is not None:
+                for face_id in set(old.records) - set(ids):
+                    self.records.pop(face_id, None)
+                    self._face_thanas.pop(face_id, None)
+                old.discard()
+
+    def close(self):
+        """Deletes every shard's full-precision file; call when dropping the gallery."""
+        for shard in list(self.shards.values()):
+            shard.discard()
+
+    def thana_of(self, face_id):
+        """Returns the thana whose shard holds face_id, or None."""
+        return self._face_thanas.get(face_id)
+
+    def search(self, queries, k=1, rerank=0, thanas=None):
+        """
+        Searches the shards for the given thanas (all shards when None) and
+        merges their results into one (scores, ids) top-k.
+        """
+        queries = normalize(queries)
+        if thanas is None:
+            shards = list(self.shards.values())
+        else:
+            shards = [self.shards[thana] for thana in thanas if thana in self.shards]
+        if not shards:
+            return (np.full((len(queries), k), -np.inf, dtype=np.float32),
+                    np.full((len(queries), k), -1, dtype=np.int64))
+        if len(shards) == 1:
+            return shards[0].search(queries, k, rerank=rerank)
+
+        results = list(self._executor.map(lambda shard: shard.search(queries, k, rerank=rerank), shards))
+        scores = np.hstack([result[0] for result in results])
+        ids = np.hstack([result[1] for result in results])
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def _remove_orphaned_sidecars(full_precision_dir):
+    """Deletes full-precision files left behind by processes that are no longer running."""
+    for name in os.listdir(full_precision_dir):
+        parts = name.split(".")
+        if len(parts) != 4 or parts[-1] != "bin" or not parts[1].isdigit():
+            continue
+        pid = int(parts[1])
+        try:
+            os.kill(pid, 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except OSError:
+            continue  # exists, owned by another user
+        try:
+            os.remove(os.path.join(full_precision_dir, name))
+        except OSError:
+            pass
+
+
+def convert_embedding_blobs(conn, dtype):
+    """
+    Rewrites every faces.embedding blob in the given storage dtype.
+    Quantizing is lossy, so converting back to float32 does not restore precision.
+    Returns the number of rows rewritten.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, embedding FROM faces WHERE embedding IS NOT NULL")
+    rows = cursor.fetchall()
+    cursor.executemany(
+        "UPDATE faces SET embedding = ? WHERE id = ?",
+        [(encode_embedding(decode_embedding(blob), dtype), face_id) for face_id, blob in rows]
+    )
+    conn.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import sys
+    import sqlite3
+
+    if len(sys.argv) != 3 or sys.argv[1] != "convert" or sys.argv[2] not in STORAGE_DTYPES:
+        print(f"Usage: python gallery_index.py convert {{{'|'.join(STORAGE_DTYPES)}}}")
+        sys.exit(1)
+    conn = sqlite3.connect("faces.db")
+    count = convert_embedding_blobs(conn, sys.argv[2])
+    conn.close()
+    print(f"Converted {count} embeddings to {sys.argv[2]}")
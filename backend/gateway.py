@@ -0,0 +1,105 @@
+"""
+Single-process gateway serving every SherlockAI backend.
+
+Includes the routes of api.py (face records, CCTV analysis, live
+recognition), video_detector_api.py (YOLOv8 /detect/*) and skt2img_api.py
+(/generate-image) in one app, so the product runs as one process with one
+copy of torch. Models are not loaded at startup: each is loaded on first use
+through the shared registry in model_registry.py, within its memory budget,
+and unloaded again when idle.
+
+    GET /models                 state of every registered model
+    GET /models/{name}/ready    200 when loaded, 503 otherwise
+    POST /models/{name}/load    load a model ahead of the first request
+
+SHERLOCK_PRELOAD_MODELS (comma-separated names) loads models in the
+background at startup.
+
+Run from the backend folder: python gateway.py (port 8001, which the
+frontend expects).
+"""
+
+import os
+import threading
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.routing import Mount
+import model_registry
+import api
+import video_detector_api
+import skt2img_api
+
+PRELOAD_MODELS = [m.strip() for m in os.environ.get("SHERLOCK_PRELOAD_MODELS", "").split(",") if m.strip()]
+
+app = FastAPI(title="SherlockAI")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+# The gateway's own routes come first so they win over same-path routes of the backends
+@app.get("/")
+async def root():
+    """Health check with the readiness of every model"""
+    return {"status": "active", "models": {name: m["state"] for name, m in model_registry.registry.status()["models"].items()}}
+
+@app.get("/models")
+async def list_models():
+    """Registered models with their state, size estimate, last use and the memory budget"""
+    return model_registry.registry.status()
+
+@app.get("/models/{name}/ready")
+async def model_ready(name: str):
+    """200 if the model is loaded, 503 if not (yet), 404 if unknown"""
+    models = model_registry.registry.status()["models"]
+    if name not in models:
+        return JSONResponse(status_code=404, content={"status": "error", "message": f"Unknown model: {name}"})
+    ready = models[name]["state"] == model_registry.READY
+    return JSONResponse(status_code=200 if ready else 503, content={"status": "success", "model": name,
+                                                                     "state": models[name]["state"], "ready": ready})
+
+@app.post("/models/{name}/load")
+async def load_model(name: str):
+    """Loads a model now (e.g. to warm up before the first request)"""
+    try:
+        await run_in_threadpool(model_registry.get, name)
+    except model_registry.ModelUnavailable as e:
+        return JSONResponse(status_code=503, content={"status": "error", "message": str(e)})
+    return {"status": "success", "model": name, "state": model_registry.READY}
+
+
+for backend in (api, video_detector_api, skt2img_api):
+    # Routes plus their startup handlers (schema migration, enrollment worker, ...)
+    app.include_router(backend.app.router)
+    # Static mounts are not carried over by include_router
+    for route in backend.app.routes:
+        if isinstance(route, Mount):
+            app.mount(route.path, route.app, name=route.name)
+
+
+@app.on_event("startup")
+async def start_model_registry():
+    """Starts idle eviction and the optional background preload."""
+    model_registry.registry.start_reaper()
+
+    def preload():
+        for name in PRELOAD_MODELS:
+            try:
+                model_registry.get(name)
+            except model_registry.ModelUnavailable as e:
+                print(f"Preload of {name} failed: {str(e)}")
+
+    if PRELOAD_MODELS:
+        threading.Thread(target=preload, name="model-preload", daemon=True).start()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8001)
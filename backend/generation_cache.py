@@ -0,0 +1,155 @@
+"""
+Content-addressed cache of sketch-to-image results.
+
+Generation uses a fixed seed, so an image is determined by its control image
+and parameters. The key is a SHA-256 of the preprocessed Canny control image
+(size and pixels), the normalized prompts, steps, guidance scale, seed and
+pipeline name. Prompts are lower-cased and whitespace-normalized, which
+changes nothing for the CLIP tokenizer. Results are stored as PNG bytes in
+a small in-memory LRU in front of a size-limited LRU directory on disk.
+Hits refresh file mtimes, so the disk order survives restarts (as in
+thumbnails.py).
+"""
+
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+GENERATION_CACHE_DIR = "generation_cache"
+GENERATION_CACHE_MAX_MB = int(os.environ.get("SHERLOCK_GENERATION_CACHE_MB", "256"))
+GENERATION_CACHE_MEMORY_MB = int(os.environ.get("SHERLOCK_GENERATION_CACHE_MEMORY_MB", "32"))
+
+
+def normalize_prompt(prompt):
+    """Lower-cased, with runs of whitespace collapsed and none before punctuation."""
+    return re.sub(r" ([,.;:!?])", r"\1", " ".join(prompt.lower().split()))
+
+
+def cache_key(control_image, prompt, negative_prompt, num_inference_steps, guidance_scale, seed, pipeline):
+    """Hex key of one generation. control_image is the PIL image handed to the pipeline."""
+    pixels = np.ascontiguousarray(np.asarray(control_image))
+    digest = hashlib.sha256()
+    digest.update(f"{pipeline}|{control_image.size}|{control_image.mode}|".encode())
+    digest.update(pixels.tobytes())
+    digest.update(f"|{normalize_prompt(prompt)}|{normalize_prompt(negative_prompt)}|"
+                  f"{int(num_inference_steps)}|{float(guidance_scale)!r}|{seed}".encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-level LRU cache of PNG results: up to memory_bytes in memory, up to
+    max_bytes of files in cache_dir.
+    """
+
+    def __init__(self, cache_dir=GENERATION_CACHE_DIR, max_bytes=GENERATION_CACHE_MAX_MB * 1024 * 1024,
+                 memory_bytes=GENERATION_CACHE_MEMORY_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()  # key -> PNG bytes, least recently used first
+        self._memory_total = 0
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total = 0
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for name in os.listdir(cache_dir):
+            if name.startswith("."):
+                continue
+            stat = os.stat(os.path.join(cache_dir, name))
+            existing.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self._entries[name] = size
+            self._total += size
+        self._evict()
+
+    def get(self, key):
+        """PNG bytes of a cached result, or None on a miss."""
+        name = key + ".png"
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._counts["memory_hits"] += 1
+                if name in self._entries:
+                    self._entries.move_to_end(name)
+                return data
+            on_disk = name in self._entries
+            if on_disk:
+                self._entries.move_to_end(name)
+
+        path = os.path.join(self.cache_dir, name)
+        data = None
+        if on_disk:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if data is None:
+                self._counts["misses"] += 1
+                return None
+            self._counts["disk_hits"] += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """Stores PNG bytes under key in memory and on disk."""
+        name = key + ".png"
+        # Write to a private temp file and rename, so readers never see a partial file
+        tmp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}.png")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.cache_dir, name))
+        with self._lock:
+            self._counts["stores"] += 1
+            self._total += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict(keep=name)
+            self._remember(key, data)
+
+    def _remember(self, key, data):
+        """Adds to the memory level, dropping its least recently used entries. Caller holds the lock."""
+        if len(data) > self.memory_bytes:
+            return
+        self._memory_total += len(data) - len(self._memory.pop(key, b""))
+        self._memory[key] = data
+        while self._memory_total > self.memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_total -= len(dropped)
+
+    def _evict(self, keep=None):
+        """Deletes least recently used files until the cache fits. Caller holds the lock (or is __init__)."""
+        while self._total > self.max_bytes and self._entries:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self._total -= size
+            self._counts["evictions"] += 1
+            dropped = self._memory.pop(name[:-len(".png")], None)
+            if dropped is not None:
+                self._memory_total -= len(dropped)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Hit/miss counters, hit rate, and entries and bytes at both levels."""
+        with self._lock:
+            lookups = self._counts["memory_hits"] + self._counts["disk_hits"] + self._counts["misses"]
+            hits = lookups - self._counts["misses"]
+            return dict(self._counts, hit_rate=hits / lookups if lookups else None,
+                        memory_entries=len(self._memory), memory_bytes=self._memory_total,
+                        max_memory_bytes=self.memory_bytes, files=len(self._entries), bytes=self._total,
+                        max_bytes=self.max_bytes)
@@ -0,0 +1,294 @@
+"""
+Generation queue for sketch-to-image requests.
+
+Requests are queued in arrival order and run by a fixed number of worker
+threads. A worker takes the oldest queued request plus up to max_batch - 1
+later ones with the same batch key (steps, guidance scale and control image
+size) and hands them to run_batch in one call, so compatible requests share
+one pipeline pass. Each job reports its queue position, an ETA from the
+measured time per denoising step, and the step it has reached. Queued jobs
+can be cancelled; a running batch is stopped once all of its jobs are.
+
+Further requests for the same generation can attach to a job as extra
+waiters, each with its own id. Cancelling through one id cancels only that
+waiter; the job itself is cancelled when its last waiter is.
+"""
+
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+GENERATION_WORKERS = int(os.environ.get("SHERLOCK_GENERATION_WORKERS", "1"))
+GENERATION_MAX_BATCH = int(os.environ.get("SHERLOCK_GENERATION_MAX_BATCH", "4"))
+DEFAULT_STEP_SECONDS = 0.5  # per-step estimate for a batch until one has been measured
+STEP_SECONDS_SMOOTHING = 0.3  # weight of the newest measurement
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """The generation queue is at capacity."""
+
+
+class GenerationQueue:
+    """
+    Args:
+        run_batch: Callable receiving (jobs, progress). It runs the jobs' "params"
+            as one batch, calls progress(step) after each denoising step and
+            returns one result per job. progress returns True once every job in
+            the batch is cancelled, and the batch may then stop early.
+        workers: Worker threads, i.e. batches run at the same time
+        max_batch: Maximum jobs per run_batch call
+        max_pending: Queue capacity; submit raises QueueFull beyond it
+        max_tracked: Finished jobs kept for status queries before the oldest are dropped
+    """
+
+    def __init__(self, run_batch, workers=GENERATION_WORKERS, max_batch=GENERATION_MAX_BATCH,
+                 max_pending=100, max_tracked=1000):
+        self._run_batch = run_batch
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self._max_pending = max_pending
+        self._max_tracked = max_tracked
+        self._jobs = OrderedDict()  # job id -> job dict
+        self._pending = []  # queued jobs in arrival order
+        self._running = []  # (batch, started_at) per busy worker
+        self._cond = threading.Condition()
+        self._threads = []
+        self.step_seconds = None  # smoothed seconds per denoising step of a batch
+
+    def start(self):
+        """Starts the worker threads that aren't running."""
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"generation-worker-{len(self._threads)}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, params, batch_key):
+        """
+        Queues a generation and returns its job id.
+        Args:
+            params: Passed through to run_batch as job["params"]; must hold "num_inference_steps"
+            batch_key: Jobs with equal keys may be batched together
+        Raises:
+            QueueFull: max_pending jobs are already waiting
+        """
+        self.start()
+        job_id = str(uuid.uuid4())
+        job = {"job_id": job_id, "params": params, "batch_key": batch_key, "status": QUEUED,
+               "step": 0, "steps": params["num_inference_steps"], "queued_at": time.time(),
+               "done": threading.Event(), "callbacks": [], "waiters": {job_id}, "cancelled_waiters": set()}
+        with self._cond:
+            if len(self._pending) >= self._max_pending:
+                raise QueueFull(f"{len(self._pending)} generations are already queued")
+            self._jobs[job_id] = job
+            self._pending.append(job)
+            self._prune()
+            self._cond.notify()
+        return job_id
+
+    def attach(self, job_id):
+        """
+        Adds a waiter to a queued or running job that isn't being cancelled.
+        Returns:
+            The waiter's own id, usable wherever a job id is, or None if the
+            job is unknown, finished or cancelled
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES or job.get("cancel_requested"):
+                return None
+            waiter_id = str(uuid.uuid4())
+            job["waiters"].add(waiter_id)
+            self._jobs[waiter_id] = job
+            return waiter_id
+
+    def active(self, job_id):
+        """True while the job behind job_id is queued or running and not being cancelled."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job is not None and job["status"] not in FINISHED_STATES and not job.get("cancel_requested")
+
+    def status(self, job_id):
+        """
+        Public fields of a job plus its queue position (0 = next) and
+        eta_seconds until it finishes, or None if the job is unknown.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = {key: value for key, value in job.items()
+                      if key not in ("params", "batch_key", "done", "callbacks", "result", "exception", "waiters",
+                                     "cancelled_waiters")}
+            status["job_id"] = job_id
+            if job_id in job["cancelled_waiters"]:
+                # This waiter left; the job may still run for the others
+                status.update(status=CANCELLED, cancel_requested=True)
+            status["position"] = self._pending.index(job) if status["status"] == QUEUED else None
+            status["eta_seconds"] = self._eta(job) if status["status"] != CANCELLED else 0.0
+            return status
+
+    def result(self, job_id):
+        """The run_batch result of a completed job (None otherwise)."""
+        job = self._jobs.get(job_id)
+        return job.get("result") if job and job_id not in job["cancelled_waiters"] else None
+
+    def exception(self, job_id):
+        """The exception a failed job raised (None otherwise)."""
+        job = self._jobs.get(job_id)
+        return job.get("exception") if job else None
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job finishes. Returns False on timeout or for an unknown job."""
+        job = self._jobs.get(job_id)
+        return job is not None and job["done"].wait(timeout)
+
+    def add_done_callback(self, job_id, callback):
+        """
+        Calls callback() once the job finishes, at once if it already has.
+        It runs on the thread finishing the job with the queue lock held, so
+        it must only hand off (e.g. loop.call_soon_threadsafe), not block.
+        Returns:
+            False for an unknown job
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job["status"] not in FINISHED_STATES:
+                job["callbacks"].append(callback)
+                return True
+        callback()
+        return True
+
+    def cancel(self, job_id):
+        """
+        Cancels one waiter of a job. Once every waiter has cancelled, a queued
+        job is cancelled at once and a running one is marked so its batch stops
+        when all of the batch's jobs are cancelled.
+        Returns:
+            False if the job is unknown or already finished, or this waiter
+            already cancelled
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES or job_id in job["cancelled_waiters"]:
+                return False
+            job["cancelled_waiters"].add(job_id)
+            if len(job["cancelled_waiters"]) < len(job["waiters"]):
+                return True
+            job["cancel_requested"] = True
+            if job["status"] == QUEUED:
+                self._pending.remove(job)
+                self._finish(job, CANCELLED)
+            return True
+
+    def stats(self):
+        """Worker count, batch limit, queued and running jobs, and the measured seconds per step."""
+        with self._cond:
+            return {"workers": self.workers, "max_batch": self.max_batch, "queued": len(self._pending),
+                    "running": sum(len(batch) for batch, _ in self._running), "step_seconds": self.step_seconds}
+
+    def _step_seconds(self):
+        return self.step_seconds if self.step_seconds is not None else DEFAULT_STEP_SECONDS
+
+    def _eta(self, job):
+        """
+        Seconds until the job should finish. Caller holds the lock.
+        Queued work ahead is assumed to run in full batches spread over all
+        workers, which makes this an estimate when batch keys are mixed.
+        """
+        if job["status"] in FINISHED_STATES:
+            return 0.0
+        step_seconds = self._step_seconds()
+        if job["status"] == RUNNING:
+            return max(0.0, (job["steps"] - job["step"]) * step_seconds)
+        # Time until a worker frees up, then rounds of batches up to and including this job's
+        remaining = [max(0.0, (batch[0]["steps"] - batch[0]["step"]) * step_seconds) for batch, _ in self._running]
+        free_in = min(remaining) if len(remaining) >= self.workers else 0.0
+        ahead = self._pending[:self._pending.index(job) + 1]
+        rounds = math.ceil(math.ceil(len(ahead) / self.max_batch) / self.workers)
+        mean_steps = sum(j["steps"] for j in ahead) / len(ahead)
+        return free_in + rounds * mean_steps * step_seconds
+
+    def _take_batch(self):
+        """Removes the oldest queued job and compatible ones after it. Caller holds the lock."""
+        first = self._pending.pop(0)
+        batch = [first]
+        for job in list(self._pending):
+            if len(batch) >= self.max_batch:
+                break
+            if job["batch_key"] == first["batch_key"]:
+                self._pending.remove(job)
+                batch.append(job)
+        return batch
+
+    def _finish(self, job, status, **fields):
+        """Caller holds the lock."""
+        job.update(fields, status=status, finished_at=time.time())
+        job["done"].set()
+        callbacks, job["callbacks"] = job["callbacks"], []
+        for callback in callbacks:
+            callback()
+
+    def _prune(self):
+        """Drops the oldest finished jobs beyond max_tracked. Caller holds the lock."""
+        excess = len(self._jobs) - self._max_tracked
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]["status"] in FINISHED_STATES:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch = self._take_batch()
+                started_at = time.time()
+                for job in batch:
+                    job.update(status=RUNNING, started_at=started_at, batch_size=len(batch))
+                entry = (batch, started_at)
+                self._running.append(entry)
+
+            def progress(step):
+                for job in batch:
+                    job["step"] = step
+                return all(job.get("cancel_requested") for job in batch)
+
+            try:
+                results = self._run_batch(batch, progress)
+                error = None
+            except Exception as e:
+                print(f"Error running generation batch: {str(e)}")
+                results, error = None, e
+
+            elapsed = time.time() - started_at
+            with self._cond:
+                self._running.remove(entry)
+                if error is None and batch[0]["step"] > 0:
+                    measured = elapsed / batch[0]["step"]
+                    self.step_seconds = measured if self.step_seconds is None else (
+                        STEP_SECONDS_SMOOTHING * measured + (1 - STEP_SECONDS_SMOOTHING) * self.step_seconds)
+                for i, job in enumerate(batch):
+                    if job.get("cancel_requested"):
+                        self._finish(job, CANCELLED)
+                    elif error is not None:
+                        self._finish(job, FAILED, error=str(error), exception=error)
+                    else:
+                        self._finish(job, COMPLETED, result=results[i])
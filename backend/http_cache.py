@@ -0,0 +1,57 @@
+"""
+HTTP validators for listings backed by rarely-changing tables.
+
+Every insert, update or delete on a tracked table bumps its row in
+table_versions (via the triggers created in migrations.py), whichever process
+made the change. A listing endpoint reads that one row, derives an ETag and
+Last-Modified from it, and answers a matching conditional request with 304
+before touching the table itself.
+"""
+
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+
+TRACKED_TABLES = ("faces", "police_stations")
+
+
+def table_version(conn, table):
+    """Returns (version, updated_at) for a tracked table; (0, None) if it has never been tracked."""
+    row = conn.execute("SELECT version, updated_at FROM table_versions WHERE table_name = ?", (table,)).fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def cache_headers(conn, table, cache_control):
+    """
+    Builds the validator headers for a response derived from one table.
+    Returns:
+        Dict with ETag, Cache-Control and (for tracked tables) Last-Modified
+    """
+    version, updated_at = table_version(conn, table)
+    if not updated_at:
+        return {"ETag": f'"{table}-{version}"', "Cache-Control": cache_control}
+    modified = datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    # The timestamp keeps a recreated database from reusing an old version's tag
+    return {
+        "ETag": f'"{table}-{version}-{int(modified.timestamp())}"',
+        "Last-Modified": format_datetime(modified, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+def is_fresh(request_headers, headers):
+    """
+    True if the client's cached copy (If-None-Match, else If-Modified-Since)
+    still matches the validators in headers, i.e. a 304 can be sent.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"] in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            return parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
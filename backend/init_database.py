@@ -6,6 +6,7 @@ Creates all necessary tables and populates with sample data
 
 import sqlite3
 import os
+import migrations
 from datetime import datetime
 
 def init_database():
@@ -21,48 +22,9 @@ def init_database():
         
         print("🔧 Initializing SherlockAI database...")
         
-        # Create faces table for suspect records
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS faces (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                thana TEXT NOT NULL,
-                image_path TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                embedding BLOB
-            )
-        ''')
-        print("✅ Created 'faces' table")
-        
-        # Create police_stations table for authentication
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS police_stations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                thana_name TEXT NOT NULL,
-                thana_id TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                active BOOLEAN DEFAULT 1
-            )
-        ''')
-        print("✅ Created 'police_stations' table")
-        
-        # Create analysis_logs table for tracking video analysis
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS analysis_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_id TEXT UNIQUE NOT NULL,
-                video_name TEXT NOT NULL,
-                status TEXT DEFAULT 'processing',
-                progress INTEGER DEFAULT 0,
-                results TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                completed_at TEXT,
-                police_station_id INTEGER,
-                FOREIGN KEY (police_station_id) REFERENCES police_stations (id)
-            )
-        ''')
-        print("✅ Created 'analysis_logs' table")
+        # Create or upgrade faces, police_stations and analysis_logs with their indexes
+        applied = migrations.migrate(conn)
+        print(f"✅ Schema at version {migrations.schema_version(conn)}" + ("" if applied else " (already current)"))
         
         # Commit table creation
         conn.commit()
@@ -0,0 +1,114 @@
+"""
+Load test for the SQLite access layer.
+
+Hammers /get-faces and /login-police-station on a running server while
+background writer threads keep inserting into faces and analysis_logs in
+the same database file, then reports throughput and latency per endpoint
+and how many writes went through.
+
+Usage: python load_test_db.py [base_url] [seconds] [concurrency] [writers]
+    e.g. python load_test_db.py http://localhost:8001 20 32 2
+"""
+
+import asyncio
+import statistics
+import sys
+import threading
+import time
+import uuid
+import httpx
+import db
+
+ENDPOINTS = [
+    ("GET", "/get-faces", None),
+    ("POST", "/login-police-station", {"thana_id": "CPS001", "password": "password123"}),
+]
+
+
+def writer(stop, counters, lock):
+    """Inserts rows in small transactions until stopped, like enrollments and analyses do."""
+    conn = db.connect(db.DB_PATH)
+    while not stop.is_set():
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO analysis_logs (task_id, video_name, status, progress) VALUES (?, ?, 'processing', 0)",
+                    (str(uuid.uuid4()), "load_test.mp4")
+                )
+                conn.execute(
+                    "INSERT INTO faces (name, thana, image_path) VALUES (?, ?, ?)",
+                    ("Load Test", "Load Test Thana", "load_test.jpg")
+                )
+            with lock:
+                counters["writes"] += 1
+        except Exception as e:
+            with lock:
+                counters["write_errors"] += 1
+                counters["last_write_error"] = str(e)
+        time.sleep(0.005)
+    conn.close()
+
+
+async def client_loop(client, base_url, deadline, results):
+    """Alternates over ENDPOINTS until the deadline, recording latency and status."""
+    i = 0
+    while time.perf_counter() < deadline:
+        method, path, form = ENDPOINTS[i % len(ENDPOINTS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, base_url + path, data=form)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        results[path].append((time.perf_counter() - start, ok))
+
+
+async def run_clients(base_url, seconds, concurrency):
+    results = {path: [] for _, path, _ in ENDPOINTS}
+    deadline = time.perf_counter() + seconds
+    async with httpx.AsyncClient(timeout=30) as client:
+        await asyncio.gather(*[client_loop(client, base_url, deadline, results) for _ in range(concurrency)])
+    return results
+
+
+def cleanup():
+    """Removes the rows written by the load test."""
+    conn = db.connect(db.DB_PATH)
+    with conn:
+        conn.execute("DELETE FROM analysis_logs WHERE video_name = 'load_test.mp4'")
+        conn.execute("DELETE FROM faces WHERE name = 'Load Test' AND thana = 'Load Test Thana'")
+    conn.close()
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1].rstrip("/") if len(sys.argv) > 1 else "http://localhost:8001"
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    num_writers = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    counters = {"writes": 0, "write_errors": 0, "last_write_error": None}
+    writers = [threading.Thread(target=writer, args=(stop, counters, lock)) for _ in range(num_writers)]
+    for thread in writers:
+        thread.start()
+    try:
+        results = asyncio.run(run_clients(base_url, seconds, concurrency))
+    finally:
+        stop.set()
+        for thread in writers:
+            thread.join()
+        cleanup()
+
+    print(f"{seconds:.0f}s, {concurrency} concurrent clients, {num_writers} writers ({db.DB_PATH})")
+    print(f"{'endpoint':<24}{'req/s':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for path, samples in results.items():
+        latencies = sorted(latency * 1000 for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        p50 = statistics.median(latencies) if latencies else 0
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        print(f"{path:<24}{len(samples) / seconds:>10.1f}{errors:>8}{p50:>10.1f}{p95:>10.1f}")
+    print(f"writes committed: {counters['writes']} ({counters['write_errors']} failed)")
+    if counters["last_write_error"]:
+        print(f"last write error: {counters['last_write_error']}")
@@ -0,0 +1,283 @@
+"""
+Versioned schema migrations for faces.db.
+
+Earlier scripts created the faces table in several incompatible layouts:
+TEXT or INTEGER ids, thana or location, img or image_path, and JSON
+features or an embedding blob. migrate() brings any of them, or an empty
+file, to one schema:
+
+    faces (id INTEGER PRIMARY KEY AUTOINCREMENT, name, thana, image_path,
+           created_at, embedding BLOB)
+
+It also creates police_stations and analysis_logs, the indexes behind the
+hot lookups, the change counters used for HTTP caching (http_cache.py) and
+faces.name_key, the case-folded name searched by name prefix
+(face_records.py). The enrollment tables are created here too:
+enrollment_cache (enroll_cache.py), enrollment_manifest (bulk_enroll.py)
+and ingest_files (watch_ingest.py).
+The applied version is kept in PRAGMA user_version. Each migration runs in
+its own transaction and records its version in that transaction, so an
+interrupted run resumes where it stopped. When the file is already current,
+migrate() only reads the pragma.
+
+Usage: python migrations.py [db_path]
+
+tests/test_migrations.py migrates every historical layout.
+"""
+
+import json
+import sys
+from array import array
+
+from face_records import name_key
+
+FACES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS faces (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        thana TEXT NOT NULL,
+        image_path TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        embedding BLOB
+    )
+'''
+FACES_COLUMNS = ("id", "name", "thana", "image_path", "created_at", "embedding")
+
+
+def _create_base_tables(conn):
+    """v1: the tables every part of the app expects."""
+    conn.execute(FACES_SCHEMA)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS police_stations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            thana_name TEXT NOT NULL,
+            thana_id TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            active BOOLEAN DEFAULT 1
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id TEXT UNIQUE NOT NULL,
+            video_name TEXT NOT NULL,
+            status TEXT DEFAULT 'processing',
+            progress INTEGER DEFAULT 0,
+            results TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            completed_at TEXT,
+            police_station_id INTEGER,
+            FOREIGN KEY (police_station_id) REFERENCES police_stations (id)
+        )
+    ''')
+
+
+def _integer_id(value):
+    """Keeps ids that are already integers (or digit strings); others get a new id."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _legacy_embedding(row):
+    """Embedding blob for a row, converting JSON features to a raw float32 blob."""
+    if row.get("embedding") is not None:
+        return row["embedding"]
+    if row.get("features"):
+        return array("f", json.loads(row["features"])).tobytes()
+    return None
+
+
+def _converge_faces(conn):
+    """
+    v2: rebuilds faces into the one schema. thana falls back to location,
+    image_path to img, embedding to the JSON features. Numeric ids are kept;
+    rows with non-numeric TEXT ids are renumbered after them.
+    """
+    info = conn.execute("PRAGMA table_info(faces)").fetchall()
+    columns = tuple(col[1] for col in info)
+    id_type = next((col[2].upper() for col in info if col[1] == "id"), "")
+    if columns == FACES_COLUMNS and id_type == "INTEGER":
+        return
+
+    cursor = conn.execute("SELECT * FROM faces")
+    names = [d[0] for d in cursor.description]
+    rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    conn.execute("ALTER TABLE faces RENAME TO faces_old")
+    conn.execute(FACES_SCHEMA)
+    used_ids = set()
+    kept, renumbered = [], []
+    for row in rows:
+        face_id = _integer_id(row.get("id"))
+        values = (
+            row.get("name") or "",
+            row.get("thana") or row.get("location") or "",
+            row.get("image_path") or row.get("img"),
+            row.get("created_at"),
+            _legacy_embedding(row),
+        )
+        if face_id is None or face_id in used_ids:
+            renumbered.append(values)
+        else:
+            used_ids.add(face_id)
+            kept.append((face_id,) + values)
+    conn.executemany(
+        "INSERT INTO faces (id, name, thana, image_path, created_at, embedding) VALUES (?, ?, ?, ?, ?, ?)", kept
+    )
+    conn.executemany(
+        "INSERT INTO faces (name, thana, image_path, created_at, embedding) VALUES (?, ?, ?, ?, ?)", renumbered
+    )
+    conn.execute("DROP TABLE faces_old")
+    if renumbered:
+        print(f"Renumbered {len(renumbered)} faces with non-numeric ids")
+
+
+def _add_indexes(conn):
+    """v3: indexes for the filtered and keyed lookups."""
+    conn.execute("DROP INDEX IF EXISTS idx_faces_location")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_faces_thana ON faces (thana)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_faces_name_nocase ON faces (name COLLATE NOCASE)")
+    # thana_id and task_id are UNIQUE and thus already indexed in the v1 tables,
+    # but tables created by older scripts may lack the constraint
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_police_stations_thana_id ON police_stations (thana_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_logs_task_id ON analysis_logs (task_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_logs_status ON analysis_logs (status)")
+
+
+def _add_change_counters(conn):
+    """v4: a version counter per listed table, bumped by triggers on every write."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    ''')
+    for table in ("faces", "police_stations"):
+        conn.execute("INSERT OR IGNORE INTO table_versions (table_name, updated_at) VALUES (?, CURRENT_TIMESTAMP)",
+                     (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE table_name = '{table}';
+                END
+            ''')
+
+
+def _add_name_keys(conn):
+    """
+    v5: faces.name_key, the Unicode case-folded name (face_records.name_key),
+    indexed for prefix search. SQLite's NOCASE and lower() fold only ASCII.
+    The app sets the key on insert; for rows inserted by other tools a trigger
+    falls back to lower(name), which is the same for ASCII names.
+    """
+    conn.execute("ALTER TABLE faces ADD COLUMN name_key TEXT")
+    rows = conn.execute("SELECT id, name FROM faces").fetchall()
+    conn.executemany("UPDATE faces SET name_key = ? WHERE id = ?", [(name_key(name), face_id) for face_id, name in rows])
+    conn.execute("DROP INDEX IF EXISTS idx_faces_name_nocase")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_faces_name_key ON faces (name_key)")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS faces_insert_name_key AFTER INSERT ON faces
+        WHEN NEW.name_key IS NULL
+        BEGIN
+            UPDATE faces SET name_key = lower(NEW.name) WHERE id = NEW.id;
+        END
+    ''')
+
+
+def _add_ingest_files(conn):
+    """v6: the version (size, mtime) of each drop-folder file last ingested."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_files (
+            file_path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            ingested_at TEXT NOT NULL
+        )
+    ''')
+
+
+def _add_enrollment_tables(conn):
+    """v7: the content-addressed enrollment cache and the bulk import manifest."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS enrollment_cache (
+            content_hash TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            crop BLOB,
+            embedding BLOB,
+            face_id INTEGER,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (content_hash, model_version)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS enrollment_manifest (
+            source_path TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            face_id INTEGER,
+            error TEXT,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+
+# (version, description, migration), applied in order
+MIGRATIONS = [
+    (1, "create base tables", _create_base_tables),
+    (2, "converge faces schema", _converge_faces),
+    (3, "add lookup indexes", _add_indexes),
+    (4, "add table change counters", _add_change_counters),
+    (5, "add case-folded name keys", _add_name_keys),
+    (6, "add ingest_files", _add_ingest_files),
+    (7, "add enrollment cache and manifest", _add_enrollment_tables),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Applies every pending migration.
+    Returns:
+        The list of versions applied (empty when the schema was current)
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+    if conn.in_transaction:
+        conn.commit()
+
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock in case another process just migrated
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied schema migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    import db
+    conn = db.connect(sys.argv[1] if len(sys.argv) > 1 else db.DB_PATH)
+    applied = migrate(conn)
+    print(f"Schema at version {schema_version(conn)}" + ("" if applied else " (already current)"))
+    conn.close()
@@ -0,0 +1,206 @@
+"""
+Shared, lazily loaded models for every backend in one process.
+
+Models are registered with a loader and an estimated memory footprint and
+are loaded on first use by get(). Loading a model that would take the loaded
+total past the memory budget first unloads the least recently used other
+models. A reaper thread unloads models that have been idle for idle_seconds.
+Callers should fetch the model with get() each time they need it rather
+than keeping their own reference, so an evicted model is really freed.
+
+The gateway (gateway.py) reports each model's state from status(); the
+standalone apps use the same registry, so they load only what they call.
+
+Config: SHERLOCK_MODEL_MEMORY_MB (budget), SHERLOCK_MODEL_IDLE_SECONDS
+(0 disables idle eviction), SHERLOCK_YOLO_MODEL.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("SHERLOCK_MODEL_MEMORY_MB", "6144"))
+MODEL_IDLE_SECONDS = float(os.environ.get("SHERLOCK_MODEL_IDLE_SECONDS", "900"))
+REAPER_INTERVAL_SECONDS = 30
+YOLO_MODEL_PATH = os.environ.get("SHERLOCK_YOLO_MODEL", "yolov8n.pt")
+
+# Model states
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelUnavailable(Exception):
+    """A model is unknown or failed to load."""
+
+
+class ModelRegistry:
+    """
+    Args:
+        memory_budget_mb: Total estimated size of models kept loaded at once
+        idle_seconds: Unload models not used for this long (0 disables)
+    """
+
+    def __init__(self, memory_budget_mb=MODEL_MEMORY_BUDGET_MB, idle_seconds=MODEL_IDLE_SECONDS):
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_seconds = idle_seconds
+        self._entries = {}  # name -> entry dict
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name, loader, size_mb, evictable=True):
+        """
+        Adds a model. loader() is called with no arguments on first use and
+        returns the model; size_mb is its estimated resident size.
+        Re-registering a name replaces its loader (and unloads it).
+        """
+        with self._lock:
+            old = self._entries.get(name)
+            self._entries[name] = {
+                "loader": loader, "size_mb": size_mb, "evictable": evictable,
+                "model": None, "state": NOT_LOADED, "error": None,
+                "loaded_at": None, "last_used": None, "load_seconds": None,
+                "load_lock": old["load_lock"] if old else threading.Lock(),
+            }
+
+    def get(self, name):
+        """
+        Returns the loaded model, loading it first if needed.
+        Raises:
+            ModelUnavailable: unknown name or the loader failed
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ModelUnavailable(f"Unknown model: {name}")
+        model = entry["model"]
+        if model is not None:
+            entry["last_used"] = time.time()
+            return model
+
+        with entry["load_lock"]:
+            # Another thread may have finished loading while we waited
+            if entry["model"] is not None:
+                entry["last_used"] = time.time()
+                return entry["model"]
+            self._make_room(entry["size_mb"], keep=name)
+            entry["state"] = LOADING
+            print(f"Loading model {name}...")
+            start = time.time()
+            try:
+                model = entry["loader"]()
+            except Exception as e:
+                entry["state"] = FAILED
+                entry["error"] = str(e)
+                print(f"Error loading model {name}: {str(e)}")
+                raise ModelUnavailable(f"Model {name} failed to load: {e}") from e
+            now = time.time()
+            entry.update(model=model, state=READY, error=None, loaded_at=now, last_used=now,
+                         load_seconds=now - start)
+            print(f"Model {name} loaded in {now - start:.1f}s")
+            return model
+
+    def is_ready(self, name):
+        entry = self._entries.get(name)
+        return entry is not None and entry["state"] == READY
+
+    def unload(self, name):
+        """Drops the registry's reference to a model and frees what it can."""
+        entry = self._entries.get(name)
+        if entry is None or entry["model"] is None:
+            return
+        entry.update(model=None, state=NOT_LOADED, loaded_at=None)
+        print(f"Unloaded model {name}")
+        _free_memory()
+
+    def _loaded_mb(self):
+        return sum(e["size_mb"] for e in self._entries.values() if e["model"] is not None)
+
+    def _make_room(self, size_mb, keep):
+        """Unloads least recently used evictable models until size_mb more fits the budget."""
+        while self._loaded_mb() + size_mb > self.memory_budget_mb:
+            with self._lock:
+                candidates = [(e["last_used"], n) for n, e in self._entries.items()
+                              if n != keep and e["model"] is not None and e["evictable"]]
+            if not candidates:
+                print(f"Model memory budget of {self.memory_budget_mb} MB exceeded, loading {keep} anyway")
+                return
+            self.unload(min(candidates)[1])
+
+    def evict_idle(self):
+        """Unloads evictable models idle for longer than idle_seconds."""
+        if not self.idle_seconds:
+            return
+        cutoff = time.time() - self.idle_seconds
+        for name, entry in list(self._entries.items()):
+            if entry["model"] is not None and entry["evictable"] and entry["last_used"] < cutoff:
+                if entry["load_lock"].acquire(blocking=False):
+                    try:
+                        self.unload(name)
+                    finally:
+                        entry["load_lock"].release()
+
+    def start_reaper(self, interval=REAPER_INTERVAL_SECONDS):
+        """Starts the idle-eviction thread if it isn't running."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    print(f"Error evicting idle models: {str(e)}")
+
+        self._reaper = threading.Thread(target=run, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def status(self):
+        """Per-model state (not_loaded, loading, ready, failed) plus the memory budget."""
+        models = {}
+        for name, entry in list(self._entries.items()):
+            models[name] = {key: entry[key] for key in
+                            ("state", "size_mb", "evictable", "error", "loaded_at", "last_used", "load_seconds")}
+        return {
+            "memory_budget_mb": self.memory_budget_mb,
+            "loaded_mb": self._loaded_mb(),
+            "idle_seconds": self.idle_seconds,
+            "models": models,
+        }
+
+
+def _free_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+registry = ModelRegistry()
+
+
+def get(name):
+    """Shortcut for registry.get(name)."""
+    return registry.get(name)
+
+
+# Models shared by several backends. Backend-specific ones register themselves
+# (e.g. skt2img_api registers "sketch_to_image").
+
+def _load_face_analysis():
+    from insightface.app import FaceAnalysis
+    face_app = FaceAnalysis(name='buffalo_l')
+    face_app.prepare(ctx_id=-1, det_size=(640, 640))
+    return face_app
+
+
+def _load_yolo():
+    from ultralytics import YOLO
+    return YOLO(YOLO_MODEL_PATH)
+
+
+registry.register("face_analysis", _load_face_analysis, size_mb=600)
+registry.register("yolo", _load_yolo, size_mb=200)
@@ -0,0 +1,105 @@
+"""
+Person-first cascade for face recognition in CCTV footage.
+
+Running the face detector over the whole frame costs the same whether or not
+anyone is in view. In cascade mode the shared YOLOv8 model ("yolo" in
+model_registry) runs first as a person detector: frames without people stop
+there, and the face detector only looks at the upper-body region of each
+detected person (merged where they overlap), at a smaller input size than
+the full-frame pass. Faces found in the regions are
+aligned on the full frame and embedded in one recognition batch, as in
+api.embed_faces_batch.
+
+Faces of people the person detector misses (heavily occluded, very small or
+cut off at the frame edge) are missed too; benchmark_face_cascade.py
+measures that recall against the full-frame path.
+"""
+
+from collections import namedtuple
+import numpy as np
+from insightface.utils import face_align
+import model_registry
+import yolo_video
+
+PERSON_CLASS_ID = 0  # "person" in the COCO classes
+PERSON_CONF = 0.35
+PERSON_IMGSZ = 640
+UPPER_BODY_FRACTION = 0.5  # top part of the person box searched for a face
+ROI_MARGIN = 0.15  # widening of each region, as a fraction of its size
+ROI_DET_SIZE = (320, 320)
+
+# Same fields the recognition loop uses from insightface's Face objects
+CascadeFace = namedtuple("CascadeFace", ["bbox", "kps", "det_score", "embedding"])
+
+
+def get_person_model():
+    """The shared YOLOv8 model used as the person detector, loaded on first use."""
+    return model_registry.get("yolo")
+
+
+def detect_persons(model, frame_bgr, conf=PERSON_CONF, imgsz=PERSON_IMGSZ):
+    """Returns an (n, 6) array of person boxes (x1, y1, x2, y2, confidence, class)."""
+    results = model(frame_bgr, conf=conf, classes=[PERSON_CLASS_ID], imgsz=imgsz, verbose=False)
+    return yolo_video.detection_array(results[0])
+
+
+def upper_body_rois(person_boxes, frame_shape, fraction=UPPER_BODY_FRACTION, margin=ROI_MARGIN):
+    """
+    Upper-body search regions for person boxes, widened by margin, clipped to
+    the frame and merged while any two overlap.
+    Returns:
+        List of integer (x1, y1, x2, y2)
+    """
+    height, width = frame_shape[:2]
+    rois = []
+    for x1, y1, x2, y2 in person_boxes[:, :4].tolist():
+        box_w, box_h = x2 - x1, (y2 - y1) * fraction
+        rois.append([max(0, int(x1 - margin * box_w)), max(0, int(y1 - margin * box_h)),
+                     min(width, int(x2 + margin * box_w)), min(height, int(y1 + box_h + margin * box_h))])
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(roi) for roi in rois if roi[2] - roi[0] > 1 and roi[3] - roi[1] > 1]
+
+
+def detect_faces(face_app, person_model, frame_bgr, img_rgb, det_size=ROI_DET_SIZE):
+    """
+    Cascade replacement for face_app.get(img_rgb).
+    Returns:
+        (faces, persons): CascadeFace list in full-frame coordinates and the
+        number of persons detected (0 means the frame was skipped)
+    """
+    persons = detect_persons(person_model, frame_bgr)
+    if len(persons) == 0:
+        return [], 0
+
+    rec_model = face_app.models['recognition']
+    detected = []
+    crops = []
+    for x1, y1, x2, y2 in upper_body_rois(persons, img_rgb.shape):
+        bboxes, kpss = face_app.det_model.detect(img_rgb[y1:y2, x1:x2], input_size=det_size,
+                                                 max_num=0, metric='default')
+        if kpss is None:
+            continue
+        offset = np.array([x1, y1], dtype=np.float32)
+        for bbox, kps in zip(bboxes, kpss):
+            kps = kps + offset
+            crops.append(face_align.norm_crop(img_rgb, landmark=kps, image_size=rec_model.input_size[0]))
+            detected.append((bbox[:4] + np.tile(offset, 2), kps, float(bbox[4])))
+    if not crops:
+        return [], len(persons)
+    embeddings = rec_model.get_feat(crops)
+    faces = [CascadeFace(bbox, kps, score, embedding)
+             for (bbox, kps, score), embedding in zip(detected, embeddings)]
+    return faces, len(persons)
@@ -2,15 +2,12 @@ import cv2
 import numpy as np
 import os
 import time
-import firebase_admin
-from firebase_admin import credentials, firestore
 import sqlite3
-import json
-from insightface.app import FaceAnalysis
+from gallery_index import decode_embedding
+import web_video
+import person_cascade
+import model_registry
 DB_PATH = os.path.join(os.path.dirname(__file__), "faces.db")
-# Initialize FaceAnalysis model
-face_app = FaceAnalysis(name='buffalo_l')
-face_app.prepare(ctx_id=-1, det_size=(640, 640))
 
 # Create necessary directories
 os.makedirs("screenshots_original", exist_ok=True)
@@ -22,13 +19,12 @@ def load_face_data():
     """Fetches stored face data from SQLite."""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute("SELECT name, features FROM faces")
+    cursor.execute("SELECT name, embedding FROM faces WHERE embedding IS NOT NULL")
     rows = cursor.fetchall()
     conn.close()
     face_database = {}
-    for name, features_json in rows:
-        feature_vector = np.array(json.loads(features_json))
-        face_database[name] = feature_vector
+    for name, embedding in rows:
+        face_database[name] = decode_embedding(embedding)
     return face_database
 
 
@@ -44,10 +40,16 @@ def format_time(seconds):
     return f"{minutes}:{seconds:02d}"
 
 
-def recognize_faces_from_video(video_path, threshold=0.3, skip_seconds=3, speed_up_factor=1.5, exit_delay=10, progress_callback=None):
-    """Detects, recognizes faces, and saves clips in a video."""
+def recognize_faces_from_video(video_path, threshold=0.3, skip_seconds=3, speed_up_factor=1.5, exit_delay=10, progress_callback=None, capture=None, cascade=False):
+    """
+    Detects, recognizes faces, and saves clips in a video.
+    capture optionally replaces cv2.VideoCapture(video_path), e.g. with a
+    chunked_upload.GrowingVideoCapture for a file still being uploaded.
+    cascade runs a YOLOv8 person detector first and looks for faces only in
+    the upper bodies of detected persons (see person_cascade.py).
+    """
 
-    cap = cv2.VideoCapture(video_path)
+    cap = capture if capture is not None else cv2.VideoCapture(video_path)
 
     if not cap.isOpened():
         print(f"Error: Could not open video {video_path}")
@@ -63,6 +65,10 @@ def recognize_faces_from_video(video_path, threshold=0.3, skip_seconds=3, speed_
 
     face_database = load_face_data()
     print(f"Loaded {len(face_database)} faces from database")
+    # Shared models (see model_registry.py), loaded on first use
+    face_app = model_registry.get("face_analysis")
+    person_model = person_cascade.get_person_model() if cascade else None
+    frames_without_persons = 0
 
     active_faces = {}  # Tracks active faces with their last detected timestamp
     face_clips = {}  # Stores start timestamps for video clips
@@ -88,7 +94,12 @@ def recognize_faces_from_video(video_path, threshold=0.3, skip_seconds=3, speed_
         current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / \
             1000  # Convert ms to seconds
         img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        faces = face_app.get(img_rgb)
+        if cascade:
+            faces, persons = person_cascade.detect_faces(face_app, person_model, frame, img_rgb)
+            if persons == 0:
+                frames_without_persons += 1
+        else:
+            faces = face_app.get(img_rgb)
         detected_faces = []
 
         for face in faces:
@@ -261,6 +272,9 @@ def recognize_faces_from_video(video_path, threshold=0.3, skip_seconds=3, speed_
     if out:
         out.release()
 
+    # Rewrite the mp4v clips as faststart H.264 so browsers can stream them
+    web_video.make_web_playable_all(list(face_clips.values()) + [highlight_output_path])
+
     print("\nFinal exits recorded for all faces.")
     print(
         f"Total Execution Time: {format_time(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)}")
@@ -270,5 +284,7 @@ def recognize_faces_from_video(video_path, threshold=0.3, skip_seconds=3, speed_
         "framesProcessed": frame_count,
         "matchesFound": len(results)
     }
+    if cascade:
+        stats["framesWithoutPersons"] = frames_without_persons
     
     return results, stats
\ No newline at end of file
@@ -1,23 +1,37 @@
-import torch
-import cv2
 import numpy as np
+import asyncio
 import base64
+import os
+import time
+import types
 from io import BytesIO
 from PIL import Image
 
 # FastAPI Imports
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware # Required for web integration
+import generation_cache
+import generation_queue
+import model_registry
 
-# Diffusers Imports
-from diffusers import StableDiffusionControlNetPipeline, ControlNetModel, UniPCMultistepScheduler
+# --- Model ---
+# The pipeline is loaded on the first request through the shared model
+# registry (see model_registry.py), which may unload it again when idle.
+# torch, diffusers and cv2 are imported on first use too, so importing this
+# module (e.g. into gateway.py) stays cheap.
+SKETCH_MODEL_SIZE_MB = 3500
+# "controlnet", or "standin" for StandInPipeline (no weights or GPU, e.g. for CI)
+SKETCH_PIPELINE = os.environ.get("SHERLOCK_SKETCH_PIPELINE", "controlnet")
+GENERATION_SEED = 42  # fixed seed for consistency
 
-# --- Global Variables for Model ---
-# These will be populated when the server starts up (lifespan event)
-pipe = None
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"CUDA available: {torch.cuda.is_available()}")
+
+def get_device():
+    """Torch device for generation: cuda when a GPU is available, else cpu."""
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
 
 # --- FastAPI App Setup ---
 app = FastAPI(title="ControlNet Sketch-to-Image API")
@@ -62,15 +76,26 @@ def base64_to_image(base64_string: str) -> Image.Image:
     return Image.open(BytesIO(img_bytes)).convert("RGB")
 
 
-def image_to_base64(image: Image.Image) -> str:
-    """Encodes a PIL Image to a Base64 string."""
+def image_to_png(image: Image.Image) -> bytes:
+    """Encodes a PIL Image as PNG bytes."""
     buffered = BytesIO()
     image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return buffered.getvalue()
+
+
+def image_to_base64(image: Image.Image) -> str:
+    """Encodes a PIL Image to a Base64 string."""
+    return png_to_base64(image_to_png(image))
+
+
+def png_to_base64(png: bytes) -> str:
+    """Encodes PNG bytes to a Base64 string."""
+    return base64.b64encode(png).decode("utf-8")
 
 
 def preprocess_sketch(image: Image.Image) -> Image.Image:
     """Converts a PIL image to Canny edges and resizes it."""
+    import cv2
     # Convert PIL Image to OpenCV format (BGR)
     img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
     
@@ -88,85 +113,315 @@ def preprocess_sketch(image: Image.Image) -> Image.Image:
         
     return pil_img
 
-# --- MODEL LOADING (Runs once when server starts) ---
+# --- MODEL LOADING (Runs on first use, through the model registry) ---
 
-@app.on_event("startup")
-async def load_model():
+def load_pipeline():
     """Initializes the ControlNet pipeline and places it on GPU."""
-    global pipe
+    import torch
+    from diffusers import StableDiffusionControlNetPipeline, ControlNetModel, UniPCMultistepScheduler
     print("--- STARTING MODEL INITIALIZATION ---")
-    try:
-        # 1. Load ControlNet and SD base models
-        controlnet = ControlNetModel.from_pretrained(
-            "lllyasviel/control_v11p_sd15_scribble",
-            torch_dtype=torch.float16
-        )
-        pipe = StableDiffusionControlNetPipeline.from_pretrained(
-            "runwayml/stable-diffusion-v1-5",
-            controlnet=controlnet,
-            torch_dtype=torch.float16
-        )
-
-        # 2. Apply VRAM Optimizations
-        pipe.scheduler = UniPCMultistepScheduler.from_config(pipe.scheduler.config)
-        pipe.enable_xformers_memory_efficient_attention()
-        # This moves modules to CPU/Disk when not in use
-        pipe.enable_model_cpu_offload() 
-        
-        print(f"✅ Model loaded successfully on {device}!")
+    print(f"CUDA available: {torch.cuda.is_available()}")
+    # 1. Load ControlNet and SD base models
+    controlnet = ControlNetModel.from_pretrained(
+        "lllyasviel/control_v11p_sd15_scribble",
+        torch_dtype=torch.float16
+    )
+    pipe = StableDiffusionControlNetPipeline.from_pretrained(
+        "runwayml/stable-diffusion-v1-5",
+        controlnet=controlnet,
+        torch_dtype=torch.float16
+    )
 
-    except Exception as e:
-        print(f"🚨 FATAL ERROR LOADING MODEL: {e}")
-        # In a real app, you might raise an exception here to halt startup.
-        raise HTTPException(status_code=500, detail="AI Model failed to initialize. Check GPU/VRAM.")
+    # 2. Apply VRAM Optimizations
+    pipe.scheduler = UniPCMultistepScheduler.from_config(pipe.scheduler.config)
+    pipe.enable_xformers_memory_efficient_attention()
+    # This moves modules to CPU/Disk when not in use
+    pipe.enable_model_cpu_offload() 
+    
+    print(f"✅ Model loaded successfully on {get_device()}!")
+    return pipe
 
-# --- API ENDPOINT ---
+class StandInPipeline:
+    """
+    Lightweight stand-in with the call signature of the ControlNet pipeline,
+    so the queue and endpoints run without model weights or a GPU. Each step
+    sleeps step_seconds; each output is its control image tinted by a hash of
+    the prompt.
+    """
 
-@app.post("/generate-image")
-async def generate_image_endpoint(request: GenerationRequest):
-    """Generates an image based on the sketch and prompt."""
-    if pipe is None:
-        raise HTTPException(status_code=503, detail="AI Model not yet initialized.")
+    def __init__(self, step_seconds=0.01):
+        self.step_seconds = step_seconds
 
-    try:
-        # --- 1. PROMPT CONSTRUCTION (New Logic) ---
-        
-        # Combine user's positive features with the fixed base quality features
-        final_positive_prompt = f"{request.user_features}, {BASE_POSITIVE_PROMPT}"
-        
-        # Combine user's negative prompts with the fixed base quality suppressors
-        final_negative_prompt = f"{request.user_negative_prompts}, {BASE_NEGATIVE_PROMPT}"
-        
-        print(f"DEBUG: Final Prompt: {final_positive_prompt[:70]}...")
-        
-        # 2. Decode the input sketch
-        sketch_pil = base64_to_image(request.sketch_base64)
-        
-        # 3. Preprocess to Canny Edges
-        control_image = preprocess_sketch(sketch_pil)
-        
-        # 4. Run Inference (The GPU-intensive part)
+    def __call__(self, prompt, image, negative_prompt, num_inference_steps, guidance_scale,
+                 generator=None, callback_on_step_end=None):
+        self._interrupt = False
+        for step in range(num_inference_steps):
+            if self._interrupt:
+                break
+            time.sleep(self.step_seconds)
+            if callback_on_step_end is not None:
+                callback_on_step_end(self, step, step, {})
+        images = []
+        for text, control in zip(prompt, image):
+            tint = np.frombuffer(text.encode("utf-8")[:3].ljust(3, b"\0"), dtype=np.uint8)
+            images.append(Image.fromarray((np.asarray(control) // 2 + tint // 2).astype(np.uint8)))
+        return types.SimpleNamespace(images=images)
+
+
+if SKETCH_PIPELINE == "standin":
+    model_registry.registry.register("sketch_to_image", StandInPipeline, size_mb=0)
+else:
+    model_registry.registry.register("sketch_to_image", load_pipeline, size_mb=SKETCH_MODEL_SIZE_MB)
+
+
+def run_batch(jobs, progress):
+    """
+    Runs queued generations with equal steps and guidance as one pipeline call
+    (blocking; called on a generation worker thread). Every image gets its own
+    generator seeded with GENERATION_SEED, so it matches an unbatched run.
+    Returns the images as PNG bytes, which are also added to the result cache.
+    """
+    pipe = model_registry.get("sketch_to_image")
+    params = [job["params"] for job in jobs]
+
+    def on_step_end(pipe, step_index, timestep, callback_kwargs):
+        # Returns True once every job in the batch is cancelled
+        if progress(step_index + 1):
+            pipe._interrupt = True
+        return callback_kwargs
+
+    kwargs = dict(
+        prompt=[p["prompt"] for p in params],
+        image=[p["control_image"] for p in params],
+        negative_prompt=[p["negative_prompt"] for p in params],
+        num_inference_steps=params[0]["num_inference_steps"],
+        guidance_scale=params[0]["guidance_scale"],
+        callback_on_step_end=on_step_end
+    )
+    if isinstance(pipe, StandInPipeline):
+        images = pipe(**kwargs).images
+    else:
+        import torch
         with torch.no_grad():
-            result = pipe(
-                final_positive_prompt, # Use the constructed prompt
-                image=control_image,
-                negative_prompt=final_negative_prompt, # Use the constructed negative prompt
-                num_inference_steps=request.num_inference_steps,
-                guidance_scale=request.guidance_scale,
-                generator=torch.Generator(device=device).manual_seed(42) # Fixed seed for consistency
-            ).images[0]
-        
-        # 5. Encode the result back to Base64
-        result_base64 = image_to_base64(result)
-        
-        return {"image_base64": result_base64}
+            generators = [torch.Generator(device=get_device()).manual_seed(GENERATION_SEED) for _ in jobs]
+            images = pipe(**kwargs, generator=generators).images
+
+    results = []
+    for job, image in zip(jobs, images):
+        png = image_to_png(image)
+        # A batch stopped early by cancellation returns partly denoised images
+        if not job.get("cancel_requested"):
+            result_cache.put(job["params"]["cache_key"], png)
+        results.append(png)
+    return results
+
+
+# A diffusers pipeline is not safe to call from several threads at once
+# (shared scheduler state and offload hooks), so the real pipeline runs one
+# batch at a time; batching is where its throughput comes from.
+generation_workers = generation_queue.GENERATION_WORKERS
+if SKETCH_PIPELINE != "standin" and generation_workers > 1:
+    print(f"SHERLOCK_GENERATION_WORKERS={generation_workers} ignored: the ControlNet pipeline runs one batch at a time")
+    generation_workers = 1
+generation_jobs = generation_queue.GenerationQueue(run_batch, workers=generation_workers)
+
+# Finished images by content key (see generation_cache.py), and the job
+# currently generating each key, so retries share one run
+result_cache = generation_cache.ResultCache()
+inflight_jobs = {}  # cache key -> job id
+
+
+def join_inflight_job(key):
+    """
+    Attaches to the queued or running, not cancelled, job for key and returns
+    the new waiter's id (None if there is none). Forgets finished jobs.
+    """
+    for other_key, job_id in list(inflight_jobs.items()):
+        if not generation_jobs.active(job_id):
+            del inflight_jobs[other_key]
+    job_id = inflight_jobs.get(key)
+    return generation_jobs.attach(job_id) if job_id else None
+
 
+def prepare_generation(request: GenerationRequest):
+    """Builds the prompts and the Canny control image of a request (CPU work, run on a worker thread)."""
+    # --- 1. PROMPT CONSTRUCTION (New Logic) ---
+    
+    # Combine user's positive features with the fixed base quality features
+    final_positive_prompt = f"{request.user_features}, {BASE_POSITIVE_PROMPT}"
+    
+    # Combine user's negative prompts with the fixed base quality suppressors
+    final_negative_prompt = f"{request.user_negative_prompts}, {BASE_NEGATIVE_PROMPT}"
+    
+    print(f"DEBUG: Final Prompt: {final_positive_prompt[:70]}...")
+    
+    # 2. Decode the input sketch
+    sketch_pil = base64_to_image(request.sketch_base64)
+    
+    # 3. Preprocess to Canny Edges
+    control_image = preprocess_sketch(sketch_pil)
+    
+    return {
+        "prompt": final_positive_prompt,
+        "negative_prompt": final_negative_prompt,
+        "control_image": control_image,
+        "num_inference_steps": request.num_inference_steps,
+        "guidance_scale": request.guidance_scale,
+        "cache_key": generation_cache.cache_key(control_image, final_positive_prompt, final_negative_prompt,
+                                                request.num_inference_steps, request.guidance_scale,
+                                                GENERATION_SEED, SKETCH_PIPELINE)
+    }
+
+# --- API ENDPOINT ---
+
+@app.post("/generate-image")
+async def generate_image_endpoint(request: GenerationRequest, job: bool = False):
+    """
+    Generates an image based on the sketch and prompt.
+    
+    Requests are queued and compatible ones (same steps, guidance scale and
+    control image size) are generated together in one batch. With job=true
+    the job id, queue position and ETA are returned at once (202); poll
+    /generate-image/jobs/{job_id} for the image and DELETE it to cancel.
+    
+    Results are cached by content (generation_cache.py): a repeated request
+    is answered at once with "cached": true (also with job=true, then 200
+    without a job id), and one repeated while the first is still queued or
+    running waits for that same job under its own job id. Cancelling one of
+    those ids drops only that request; the generation stops when all are.
+    """
+    try:
+        params = await run_in_threadpool(prepare_generation, request)
     except Exception as e:
         print(f"🚨 Generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Image generation error: {e}")
 
+    cached = await run_in_threadpool(result_cache.get, params["cache_key"])
+    if cached is not None:
+        return {"image_base64": png_to_base64(cached), "cached": True}
+
+    job_id = join_inflight_job(params["cache_key"])
+    if job_id is None:
+        try:
+            await run_in_threadpool(model_registry.get, "sketch_to_image")
+        except model_registry.ModelUnavailable as e:
+            print(f"🚨 FATAL ERROR LOADING MODEL: {e}")
+            raise HTTPException(status_code=503, detail="AI Model failed to initialize. Check GPU/VRAM.")
+
+        batch_key = (params["num_inference_steps"], params["guidance_scale"], params["control_image"].size)
+        try:
+            job_id = generation_jobs.submit(params, batch_key)
+        except generation_queue.QueueFull as e:
+            raise HTTPException(status_code=503, detail=f"Generation queue is full: {e}")
+        inflight_jobs[params["cache_key"]] = job_id
+
+    if job:
+        status = generation_jobs.status(job_id)
+        return JSONResponse(status_code=202, content={
+            "status": "success",
+            "job_id": job_id,
+            "job_status": status["status"],
+            "position": status["position"],
+            "eta_seconds": status["eta_seconds"],
+            "status_url": f"/generate-image/jobs/{job_id}"
+        })
+
+    # 4. Run Inference (The GPU-intensive part) on a generation worker
+    await wait_for_job(job_id)
+    return generation_response(job_id)
+
+
+async def wait_for_job(job_id):
+    """
+    Waits until a job finishes without holding a threadpool thread, which
+    run_in_threadpool(generation_jobs.wait) would do for the whole generation.
+    """
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+
+    def set_finished():
+        if not finished.done():  # the request may have been cancelled meanwhile
+            finished.set_result(None)
+
+    generation_jobs.add_done_callback(job_id, lambda: loop.call_soon_threadsafe(set_finished))
+    await finished
+
+
+def generation_response(job_id):
+    """Image of a finished job as {"image_base64": ...}, or the HTTPException for its outcome."""
+    status = generation_jobs.status(job_id)
+    if status["status"] == generation_queue.CANCELLED:
+        raise HTTPException(status_code=409, detail="Generation was cancelled")
+    if status["status"] == generation_queue.FAILED:
+        print(f"🚨 Generation failed: {status['error']}")
+        if isinstance(generation_jobs.exception(job_id), model_registry.ModelUnavailable):
+            raise HTTPException(status_code=503, detail="AI Model failed to initialize. Check GPU/VRAM.")
+        raise HTTPException(status_code=500, detail=f"Image generation error: {status['error']}")
+    
+    # 5. Encode the result back to Base64
+    result_base64 = png_to_base64(generation_jobs.result(job_id))
+    
+    return {"image_base64": result_base64, "cached": False, "job_id": job_id, "batch_size": status["batch_size"],
+            "queue_seconds": status["started_at"] - status["queued_at"]}
+
+
+def get_generation_job_or_404(job_id):
+    status = generation_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.get("/generate-image/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """
+    Status of a queued generation: job_status (queued, running, completed,
+    failed, cancelled), position in the queue (0 = next), eta_seconds, step of
+    steps, and image_base64 once completed
+    """
+    status = get_generation_job_or_404(job_id)
+    content = {
+        "status": "success",
+        "job_id": job_id,
+        "job_status": status["status"],
+        "position": status["position"],
+        "eta_seconds": status["eta_seconds"],
+        "step": status["step"],
+        "steps": status["steps"],
+        "batch_size": status.get("batch_size"),
+        "error": status.get("error")
+    }
+    if status["status"] == generation_queue.COMPLETED:
+        content["image_base64"] = png_to_base64(generation_jobs.result(job_id))
+    return content
+
+
+@app.delete("/generate-image/jobs/{job_id}")
+async def cancel_generation_job(job_id: str):
+    """
+    Cancels a generation request. A generation shared by several requests
+    runs on until all of them are cancelled, and a running batch stops once
+    all of its generations are.
+    """
+    get_generation_job_or_404(job_id)
+    if not generation_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return {"status": "success", "job_id": job_id, "job_status": generation_jobs.status(job_id)["status"]}
+
+
+@app.get("/generate-image/queue")
+async def get_generation_queue():
+    """Workers, batch limit, queued and running generations, and the measured seconds per step"""
+    return generation_jobs.stats()
+
+
+@app.get("/generate-image/cache")
+async def get_generation_cache():
+    """Result cache hits (memory and disk), misses, hit rate, evictions and sizes"""
+    return result_cache.stats()
+
 # --- RUNNING INSTRUCTIONS ---
-# To run this server:
-# 1. Save this code as ai_api.py
-# 2. Ensure you have uvicorn[standard] installed: pip install uvicorn[standard] fastapi
-# 3. Run from your terminal: uvicorn ai_api:app --reload --host 0.0.0.0 --port 8000
\ No newline at end of file
+# The full product runs as one process through the gateway (gateway.py, port 8001).
+# To run this server on its own:
+# 1. Ensure you have uvicorn[standard] installed: pip install uvicorn[standard] fastapi
+# 2. Run from the backend folder: uvicorn skt2img_api:app --reload --host 0.0.0.0 --port 8002
\ No newline at end of file
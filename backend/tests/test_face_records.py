@@ -0,0 +1,55 @@
+"""Name prefix search and paging of the faces records."""
+
+import sqlite3
+
+import pytest
+
+import face_records
+import migrations
+
+NAMES = ["Élodie Martin", "élise Durand", "ÖZGÜR Yılmaz", "Straße Weber", "Ravi Kumar", "ravindra Singh"]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.executemany("INSERT INTO faces (name, name_key, thana) VALUES (?, ?, ?)",
+                     [(name, face_records.name_key(name), "Central") for name in NAMES])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def names(conn, prefix):
+    faces, _ = face_records.query_faces(conn, ["name"], name_prefix=prefix)
+    return [face["name"] for face in faces]
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("ravi", ["Ravi Kumar", "ravindra Singh"]),
+    ("RAVI K", ["Ravi Kumar"]),
+    ("él", ["Élodie Martin", "élise Durand"]),
+    ("ÉL", ["Élodie Martin", "élise Durand"]),
+    ("özgür", ["ÖZGÜR Yılmaz"]),
+    ("STRASSE", ["Straße Weber"]),
+    ("x", []),
+])
+def test_prefix_folds_case_beyond_ascii(conn, prefix, expected):
+    assert names(conn, prefix) == expected
+    assert face_records.count_faces(conn, name_prefix=prefix) == len(expected)
+
+
+def test_rows_inserted_without_a_key_get_one(conn):
+    conn.execute("INSERT INTO faces (name, thana) VALUES ('Rahul Das', 'Central')")
+    assert names(conn, "RAH") == ["Rahul Das"]
+
+
+def test_pages_follow_the_cursor(conn):
+    seen, after = [], None
+    while True:
+        faces, after = face_records.query_faces(conn, ["id", "name"], after=after, limit=4)
+        seen += [face["name"] for face in faces]
+        if after is None:
+            break
+    assert seen == NAMES
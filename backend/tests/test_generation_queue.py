@@ -0,0 +1,161 @@
+"""Batching, queue position/ETA and cancellation of sketch-to-image generations."""
+
+import base64
+import importlib
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageDraw
+
+import generation_queue
+
+STEPS = 10
+
+
+class GatedBatches:
+    """
+    run_batch stand-in that records each batch and holds it at step 0 until
+    release is set, stopping early once progress reports every job cancelled.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, jobs, progress):
+        self.batches.append([job["params"]["name"] for job in jobs])
+        self.started.set()
+        while not self.release.wait(0.01):
+            if progress(0):
+                return [None] * len(jobs)
+        for step in range(1, STEPS + 1):
+            progress(step)
+        return [job["params"]["name"].upper() for job in jobs]
+
+
+@pytest.fixture
+def batches():
+    return GatedBatches()
+
+
+@pytest.fixture
+def queue(batches):
+    yield generation_queue.GenerationQueue(batches, workers=1, max_batch=4)
+    batches.release.set()
+
+
+def submit(queue, name, key="a"):
+    return queue.submit({"name": name, "num_inference_steps": STEPS}, key)
+
+
+def test_compatible_jobs_share_a_batch(queue, batches):
+    first = submit(queue, "first")
+    assert batches.started.wait(5)
+    jobs = {name: submit(queue, name, key) for name, key in [("b1", "b"), ("a1", "a"), ("b2", "b"), ("a2", "a")]}
+    batches.release.set()
+    assert all(queue.wait(job_id, timeout=5) for job_id in [first, *jobs.values()])
+
+    assert batches.batches == [["first"], ["b1", "b2"], ["a1", "a2"]]
+    assert queue.result(jobs["b2"]) == "B2"
+    assert queue.status(jobs["a2"])["batch_size"] == 2
+
+
+def test_queued_jobs_report_position_and_eta(batches):
+    queue = generation_queue.GenerationQueue(batches, workers=1, max_batch=1)
+    running = submit(queue, "running")
+    assert batches.started.wait(5)
+    queued = [submit(queue, f"q{i}", key=f"k{i}") for i in range(3)]
+
+    status = queue.status(running)
+    assert status["status"] == generation_queue.RUNNING and status["position"] is None
+    assert status["eta_seconds"] == pytest.approx(STEPS * generation_queue.DEFAULT_STEP_SECONDS)
+    statuses = [queue.status(job_id) for job_id in queued]
+    assert [s["position"] for s in statuses] == [0, 1, 2]
+    etas = [s["eta_seconds"] for s in statuses]
+    assert status["eta_seconds"] < etas[0] < etas[1] < etas[2]
+    batches.release.set()
+
+
+def test_cancelling_a_queued_job_drops_it(queue, batches):
+    submit(queue, "running")
+    assert batches.started.wait(5)
+    kept, dropped = submit(queue, "kept"), submit(queue, "dropped", key="b")
+
+    assert queue.cancel(dropped)
+    assert queue.status(dropped)["status"] == generation_queue.CANCELLED
+    assert queue.status(kept)["position"] == 0
+    assert not queue.cancel(dropped)
+    batches.release.set()
+    assert queue.wait(kept, timeout=5)
+    assert batches.batches == [["running"], ["kept"]]
+
+
+def test_cancelling_a_running_batch_stops_it(queue, batches):
+    first = submit(queue, "first")
+    assert batches.started.wait(5)
+    second = queue.attach(first)
+    assert queue.status(second)["status"] == generation_queue.RUNNING
+
+    queue.cancel(first)
+    assert not queue.wait(first, timeout=0.1)  # the second waiter still wants the image
+    queue.cancel(second)
+    assert queue.wait(first, timeout=5) and queue.wait(second, timeout=5)
+    assert not batches.release.is_set()
+    assert {queue.status(job_id)["status"] for job_id in (first, second)} == {generation_queue.CANCELLED}
+    assert queue.result(first) is None
+
+
+def test_done_callback_runs_when_the_job_finishes(queue, batches):
+    job_id = submit(queue, "job")
+    finished = threading.Event()
+    assert queue.add_done_callback(job_id, finished.set)
+    assert not finished.wait(0.05)
+    batches.release.set()
+    assert finished.wait(5)
+
+    called = []
+    queue.add_done_callback(job_id, lambda: called.append(True))
+    assert called == [True]
+    assert not queue.add_done_callback("unknown", finished.set)
+
+
+@pytest.fixture
+def sketch_api(tmp_path, monkeypatch):
+    """skt2img_api on StandInPipeline, with a fresh queue and a result cache in tmp_path."""
+    pytest.importorskip("cv2")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SHERLOCK_SKETCH_PIPELINE", "standin")
+    api = importlib.import_module("skt2img_api")
+    if api.SKETCH_PIPELINE != "standin":
+        pytest.skip("skt2img_api was already imported with the ControlNet pipeline")
+    monkeypatch.setattr(api, "generation_jobs", generation_queue.GenerationQueue(api.run_batch, workers=1))
+    monkeypatch.setattr(api, "result_cache", api.generation_cache.ResultCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(api, "inflight_jobs", {})
+    return api
+
+
+def sketch(seed):
+    image = Image.new("RGB", (64, 64), "white")
+    ImageDraw.Draw(image).ellipse((seed, seed, 40 + seed, 40 + seed), outline="black", width=3)
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
+def test_standin_requests_are_batched_and_cached(sketch_api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(sketch_api.app)
+    requests = [{"sketch_base64": sketch(i), "user_features": f"person {i}", "num_inference_steps": 50}
+                for i in range(3)]
+    queued = [client.post("/generate-image", params={"job": True}, json=body).json() for body in requests[:2]]
+    assert all(response["status_url"].endswith(response["job_id"]) for response in queued)
+
+    # Waits on the event loop for the batch holding the second and third requests
+    response = client.post("/generate-image", json=requests[2]).json()
+    assert response["cached"] is False and response["batch_size"] == 2
+    second = client.get(f"/generate-image/jobs/{queued[1]['job_id']}").json()
+    assert second["job_status"] == generation_queue.COMPLETED and second["batch_size"] == 2
+    assert client.post("/generate-image", json=requests[2]).json()["cached"] is True
@@ -0,0 +1,91 @@
+"""Every faces layout created by earlier setup scripts migrates to the current schema."""
+
+import json
+import sqlite3
+from array import array
+
+import pytest
+
+import migrations
+
+# Layouts of faces created by earlier versions of the setup scripts
+HISTORICAL_LAYOUTS = {
+    "faces_db_init": "CREATE TABLE faces (id TEXT PRIMARY KEY, name TEXT NOT NULL, thana TEXT NOT NULL, img TEXT)",
+    "faces_db_init_patched": "CREATE TABLE faces (id TEXT PRIMARY KEY, name TEXT NOT NULL, thana TEXT NOT NULL, "
+                             "img TEXT, image_path TEXT)",
+    "store_face": "CREATE TABLE faces (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, location TEXT, "
+                  "image_path TEXT, features TEXT)",
+    "api_location": "CREATE TABLE faces (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, location TEXT, "
+                    "image_path TEXT, embedding BLOB)",
+    "init_database": migrations.FACES_SCHEMA,
+}
+SAMPLES = [("7", "Ravi Kumar", "Central Police Station", [0.5, -0.25]),
+           ("abc", "Jane Doe", "North Zone Station", None)]
+
+
+def populate(conn, create_sql):
+    """Creates faces in the given layout and inserts SAMPLES. Returns its column names."""
+    conn.execute(create_sql)
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(faces)").fetchall()]
+    for face_id, person, thana, vector in SAMPLES:
+        values = {"name": person, "thana" if "thana" in columns else "location": thana}
+        values["image_path" if "image_path" in columns else "img"] = f"cropped_faces/{person}.jpg"
+        if "TEXT PRIMARY" in create_sql:
+            values["id"] = face_id
+        if vector is not None and "features" in columns:
+            values["features"] = json.dumps(vector)
+        if vector is not None and "embedding" in columns:
+            values["embedding"] = array("f", vector).tobytes()
+        conn.execute(
+            f"INSERT INTO faces ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})", list(values.values())
+        )
+    conn.commit()
+    return columns
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("create_sql", HISTORICAL_LAYOUTS.values(), ids=HISTORICAL_LAYOUTS.keys())
+def test_historical_layout_converges(conn, create_sql):
+    columns = populate(conn, create_sql)
+    migrations.migrate(conn)
+
+    info = conn.execute("PRAGMA table_info(faces)").fetchall()
+    assert tuple(col[1] for col in info) == migrations.FACES_COLUMNS + ("name_key",)
+    assert info[0][2] == "INTEGER"
+    assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+    rows = conn.execute("SELECT id, name, thana, image_path, embedding, name_key FROM faces ORDER BY id").fetchall()
+    assert [row[1] for row in rows] == ["Ravi Kumar", "Jane Doe"]
+    assert all(row[2] and row[3] for row in rows)
+    assert [row[5] for row in rows] == ["ravi kumar", "jane doe"]
+    assert all(isinstance(row[0], int) for row in rows)
+    if "TEXT PRIMARY" in create_sql:
+        assert rows[0][0] == 7  # numeric TEXT ids are kept
+    if "features" in columns or "embedding" in columns:
+        assert array("f", rows[0][4]).tolist() == [0.5, -0.25]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_faces_thana", "idx_faces_name_key", "idx_analysis_logs_status"} <= indexes
+
+
+@pytest.mark.parametrize("create_sql", HISTORICAL_LAYOUTS.values(), ids=HISTORICAL_LAYOUTS.keys())
+def test_second_run_is_a_no_op(conn, create_sql):
+    populate(conn, create_sql)
+    migrations.migrate(conn)
+    assert migrations.migrate(conn) == []
+
+
+def test_writes_bump_the_change_counter(conn):
+    populate(conn, HISTORICAL_LAYOUTS["store_face"])
+    migrations.migrate(conn)
+    version = conn.execute("SELECT version FROM table_versions WHERE table_name = 'faces'").fetchone()[0]
+    conn.execute("DELETE FROM faces WHERE name = 'Ravi Kumar'")
+    assert conn.execute("SELECT version FROM table_versions WHERE table_name = 'faces'").fetchone()[0] == version + 1
+
+
+def test_empty_database_gets_every_migration(conn):
+    assert migrations.migrate(conn) == [version for version, _, _ in migrations.MIGRATIONS]
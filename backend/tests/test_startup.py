@@ -0,0 +1,132 @@
+"""
+Startup cost of the API processes.
+
+Heavy libraries (torch, insightface, faiss, cv2, ultralytics, diffusers) are
+imported inside the functions that use them and models are loaded on first
+use through model_registry.py, so starting a process that only serves login,
+station lookups and records should be fast and small. For each app module,
+in a fresh interpreter, these check that:
+
+- importing it pulls in none of HEAVY_MODULES and stays within the import
+  budget (SHERLOCK_IMPORT_BUDGET_MS, default 3000)
+- uvicorn serving it answers its health path with 200 within
+  FIRST_RESPONSE_TIMEOUT
+
+Import time, baseline RSS and time to first response are recorded as test
+properties (pytest --junitxml) and printed (pytest -s). The processes run in a
+temporary directory with their own SHERLOCK_DB_PATH and SHERLOCK_DATA_DIR, so
+the folders and the database they create never land in backend/.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+IMPORT_BUDGET_MS = float(os.environ.get("SHERLOCK_IMPORT_BUDGET_MS", "3000"))
+FIRST_RESPONSE_TIMEOUT = 60.0
+HEAVY_MODULES = ("torch", "torchvision", "insightface", "faiss", "cv2", "ultralytics", "diffusers", "onnxruntime")
+# Module -> path answered without loading any model
+HEALTH_PATHS = {"api": "/test", "gateway": "/test", "video_detector_api": "/"}
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line
+_IMPORT_PROBE = """
+import importlib, json, resource, sys, time
+baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+heavy = [m for m in sys.argv[2].split(",") if m in sys.modules]
+print(json.dumps({"seconds": seconds, "baseline_kb": baseline_kb,
+                  "peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "heavy": heavy}))
+"""
+
+
+def isolated_env(workdir):
+    """Environment for a child process that keeps its database in workdir and can import the backend."""
+    pythonpath = os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")]))
+    return {**os.environ, "SHERLOCK_DB_PATH": str(workdir / "faces.db"), "SHERLOCK_DATA_DIR": str(workdir),
+            "PYTHONPATH": pythonpath}
+
+
+def measure_import(module, workdir):
+    """Import time, RSS before/after and heavy modules loaded by importing module in a new interpreter."""
+    proc = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, module, ",".join(HEAVY_MODULES)],
+                          cwd=workdir, env=isolated_env(workdir), capture_output=True, text=True)
+    assert proc.returncode == 0, f"import {module} failed:\n{proc.stderr.strip()}"
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_rss_mb(pid):
+    """Current resident size of a process from /proc (None where unavailable)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def measure_first_response(module, path, workdir):
+    """
+    Starts uvicorn serving module:app and polls path.
+    Returns:
+        (seconds until the first 200 response, server RSS in MB at that point)
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", BACKEND_DIR,
+                               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                              cwd=workdir, env=isolated_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while time.perf_counter() - start < FIRST_RESPONSE_TIMEOUT:
+            if server.poll() is not None:
+                pytest.fail(f"uvicorn {module}:app exited:\n{server.stderr.read().decode().strip()}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start, process_rss_mb(server.pid)
+            except OSError:
+                time.sleep(0.05)
+        pytest.fail(f"{url} did not answer within {FIRST_RESPONSE_TIMEOUT:.0f}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+@pytest.mark.parametrize("module", HEALTH_PATHS)
+def test_import_is_light(module, tmp_path, record_property):
+    result = measure_import(module, tmp_path)
+    import_ms = result["seconds"] * 1000
+    rss_mb = (result["peak_kb"] - result["baseline_kb"]) / 1024
+    record_property("import_ms", round(import_ms))
+    record_property("import_rss_mb", round(rss_mb, 1))
+    print(f"{module}: import {import_ms:.0f} ms, +{rss_mb:.1f} MB RSS")
+    assert not result["heavy"], f"importing {module} loads {', '.join(result['heavy'])}; import them on first use"
+    assert import_ms <= IMPORT_BUDGET_MS, f"import took {import_ms:.0f} ms, budget {IMPORT_BUDGET_MS:.0f} ms"
+
+
+@pytest.mark.parametrize("module", HEALTH_PATHS)
+def test_first_response(module, tmp_path, record_property):
+    seconds, rss_mb = measure_first_response(module, HEALTH_PATHS[module], tmp_path)
+    record_property("first_response_ms", round(seconds * 1000))
+    record_property("server_rss_mb", rss_mb and round(rss_mb, 1))
+    print(f"{module}: first response {seconds * 1000:.0f} ms, server RSS {rss_mb or 0:.1f} MB")
@@ -0,0 +1,150 @@
+"""
+On-demand thumbnails for face crops, uploaded suspect photos and screenshots.
+
+A thumbnail is generated on first request for a (source file, width bucket,
+format) and kept in a disk cache with a total size limit, evicting the least
+recently used files first. Requested widths are rounded up to a small set of
+buckets so that a handful of files per source serve every layout. Images are
+never upscaled.
+
+Cache files are keyed on the source's path, size and mtime, so a replaced
+source gets fresh thumbnails. Listings carry the source's version (size and
+mtime, see source_version) for clients to add to thumbnail URLs as ?v=, so
+those URLs can be cached as immutable: a replaced source gets a new URL.
+The thumbnail key is also the response's ETag for unversioned URLs.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+# Directories thumbnails may be generated from
+SOURCE_DIRS = ("cropped_faces", "screenshots_original", "images")
+WIDTH_BUCKETS = (96, 192, 384, 768)
+FORMATS = {"jpeg": ("image/jpeg", ".jpg"), "webp": ("image/webp", ".webp")}
+QUALITY = 80
+
+
+def bucket_width(width):
+    """Rounds a requested width up to the nearest bucket (capped at the largest)."""
+    for bucket in WIDTH_BUCKETS:
+        if width <= bucket:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+def resolve_source(path, base_dirs):
+    """
+    Maps a URL path such as cropped_faces/x.jpg or backend/images/x.png onto a
+    file inside one of SOURCE_DIRS under the given base directories.
+    Returns:
+        Absolute file path, or None if it is outside the allowed directories or missing
+    """
+    rel = path.lstrip("/")
+    if rel.startswith("backend/"):
+        rel = rel[len("backend/"):]
+    top = rel.split("/", 1)[0]
+    if top not in SOURCE_DIRS:
+        return None
+    for base in base_dirs:
+        root = os.path.realpath(os.path.join(base, top))
+        full = os.path.realpath(os.path.join(base, rel))
+        if full.startswith(root + os.sep) and os.path.isfile(full):
+            return full
+    return None
+
+
+def render_thumbnail(source, width, fmt, out_path):
+    """Writes a thumbnail of source at most width pixels wide to out_path."""
+    from PIL import Image, ImageOps
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        img.save(out_path, "JPEG" if fmt == "jpeg" else "WEBP", quality=QUALITY)
+
+
+def source_version(source):
+    """Short hex version of a source file from its size and mtime (None if it is gone)."""
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def thumbnail_key(source, width, fmt):
+    """Hex key of one thumbnail, changing whenever the source file is replaced."""
+    stat = os.stat(source)
+    return hashlib.sha1(f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{width}|{fmt}".encode()).hexdigest()
+
+
+class ThumbnailCache:
+    """
+    Size-limited LRU cache of thumbnail files in cache_dir. Access order
+    survives restarts through the files' mtimes, which hits refresh.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for name in os.listdir(cache_dir):
+            if name.startswith("."):
+                continue
+            stat = os.stat(os.path.join(cache_dir, name))
+            existing.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self._entries[name] = size
+            self._total += size
+        self._evict()
+
+    def get(self, source, width, fmt):
+        """
+        Returns the path of the thumbnail of source at the given bucket width
+        and format ("jpeg" or "webp"), generating it on a miss.
+        """
+        name = thumbnail_key(source, width, fmt) + FORMATS[fmt][1]
+        path = os.path.join(self.cache_dir, name)
+
+        with self._lock:
+            hit = name in self._entries
+            if hit:
+                self._entries.move_to_end(name)
+        if hit and os.path.exists(path):
+            os.utime(path)
+            return path
+
+        # Render to a private temp file and rename, so readers never see a partial file
+        tmp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}{FORMATS[fmt][1]}")
+        render_thumbnail(source, width, fmt, tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict(keep=name)
+        return path
+
+    def _evict(self, keep=None):
+        """Deletes least recently used files until the cache fits. Caller holds the lock (or is __init__)."""
+        while self._total > self.max_bytes and self._entries:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
@@ -1,15 +1,18 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
-from ultralytics import YOLO
-import cv2
 import numpy as np
 import os
+import json
 from tempfile import NamedTemporaryFile
-import shutil
 from typing import Optional, List
 from pydantic import BaseModel
 import time
+import chunked_upload
+import detection_jobs
+import model_registry
+import yolo_video
 
 app = FastAPI(
     title="YOLOv8 Video Analysis API",
@@ -17,134 +20,219 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Configuration
-MODEL_PATH = "yolov8n.pt"
+# Configuration (the YOLOv8 weights are set by SHERLOCK_YOLO_MODEL, see model_registry.py)
 CONFIDENCE_THRESHOLD = 0.5
 TEMP_FOLDER = "temp_files"
+UPLOAD_READ_SIZE = 1024 * 1024
+# Response formats for /detect/video; the streamed ones keep memory flat on long videos
+RESPONSE_FORMATS = ("json", "ndjson", "columnar")
+STREAM_FORMATS = ("ndjson", "columnar")
+# Where annotations are drawn: into a server-encoded video, or by the client from the detections
+RENDER_MODES = ("server", "client")
+COLUMNAR_BLOCK_SIZE = 1000  # detections per columnar block line
+JOB_PROGRESS_INTERVAL = 1.0  # seconds between job progress updates
 
 # Create temp folder if it doesn't exist
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 
-# Load the YOLOv8 model
-try:
-    model = YOLO(MODEL_PATH)
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+# Chunked uploads made through the main API (same uploads/ folder)
+upload_store = chunked_upload.UploadStore()
+
+# Background detection jobs, shared with the other worker processes through the jobs folder
+job_store = detection_jobs.JobStore()
+
+def get_model():
+    """The shared YOLOv8 model from the model registry, loaded on first use."""
+    return model_registry.get("yolo")
 
 class DetectionResponse(BaseModel):
     filename: str
     processed_filename: str
     detections: List[dict]
+    frames_processed: int
+    frame_stride: int
     processing_time: float
+    detections_filename: Optional[str] = None
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {"status": "active", "model_loaded": model is not None}
+    return {"status": "active", "model_loaded": model_registry.registry.is_ready("yolo")}
 
 @app.post("/detect/video", response_model=DetectionResponse)
 async def detect_video(
-    video: UploadFile = File(...),
+    video: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     conf_threshold: Optional[float] = CONFIDENCE_THRESHOLD,
-    save_video: Optional[bool] = True
+    save_video: Optional[bool] = True,
+    frame_stride: int = 1,
+    target_fps: Optional[float] = None,
+    batch_size: int = yolo_video.DEFAULT_BATCH_SIZE,
+    imgsz: Optional[int] = None,
+    format: str = "json",
+    save_npz: bool = False,
+    job: bool = False,
+    render: str = "server"
 ):
     """
     Process a video file and return detections
     
     Parameters:
     - video: Video file to process
+    - upload_id: Instead of video, a chunked upload session (see chunked_upload.py);
+      processing starts on the part already received
     - conf_threshold: Confidence threshold for detections (0-1)
-    - save_video: Whether to save the processed video with annotations
+    - save_video: Whether to save the processed video with annotations (drawn
+      and encoded by a separate writer process)
+    - frame_stride: Process every n-th frame (1 = every frame)
+    - target_fps: Sample about this many frames per second instead of frame_stride
+    - batch_size: Frames per model call
+    - imgsz: Inference resolution (model default when unset)
+    - format: "json" (one body at the end), "ndjson" (a line per frame with
+      detections, sent while processing) or "columnar" (streamed blocks of
+      parallel frame/class/confidence/bbox arrays, class ids indexing the
+      "classes" list in the start line)
+    - save_npz: Also save every detection as column arrays in a .npz file
+      (frame, class_id, confidence, bbox, classes), fetched from /video/{name}
+    - job: Return a job id at once (202) and process in the background; poll
+      /detect/jobs/{job_id}, read partial results from
+      /detect/jobs/{job_id}/detections and fetch the outputs when completed
+    - render: "server" (annotated video per save_video) or "client": no video
+      is encoded; the client draws the boxes over its own copy of the video,
+      placing each frame's boxes at frame / fps seconds in the width x height
+      pixel space given in the stream's start line
     
     Returns:
-    - JSON with detections and processed video path
+    - JSON with detections and processed video path, an NDJSON stream, or a job id
     """
-    if not model:
-        raise HTTPException(status_code=500, detail="Model not loaded")
-    
-    if not video.filename.lower().endswith(('.mp4', '.avi', '.mov')):
-        raise HTTPException(status_code=400, detail="Unsupported file format")
+    import cv2
+    try:
+        await run_in_threadpool(get_model)
+    except model_registry.ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+    if render not in RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"render must be one of {', '.join(RENDER_MODES)}")
+    if render == "client":
+        save_video = False
+
+    if upload_id:
+        session = upload_store.get(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        filename = session["filename"]
+        input_path = upload_store.part_path(upload_id)
+    elif video is not None:
+        filename = os.path.basename(video.filename)
+        if not filename.lower().endswith(('.mp4', '.avi', '.mov')):
+            raise HTTPException(status_code=400, detail="Unsupported file format")
+    else:
+        raise HTTPException(status_code=400, detail="Provide a video file or an upload_id")
+
+    if job:
+        job_id = job_store.create(filename=filename, upload_id=upload_id)["job_id"]
+        if not upload_id:
+            input_path = job_store.path(job_id, f"input_{filename}")
+    elif not upload_id:
+        input_path = os.path.join(TEMP_FOLDER, f"input_{filename}")
+
+    if not upload_id:
+        # Save uploaded file temporarily, writing on a worker thread
+        try:
+            with open(input_path, "wb") as buffer:
+                while True:
+                    chunk = await video.read(UPLOAD_READ_SIZE)
+                    if not chunk:
+                        break
+                    await run_in_threadpool(buffer.write, chunk)
+        except Exception as e:
+            cleanup_input(input_path, upload_id)
+            if job:
+                job_store.update(job_id, status=detection_jobs.FAILED, error=f"Upload failed: {e}",
+                                 finished_at=time.time())
+            raise HTTPException(status_code=500, detail=f"Could not save the uploaded video: {e}")
 
-    # Save uploaded file temporarily
-    input_path = os.path.join(TEMP_FOLDER, f"input_{video.filename}")
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
+    if job:
+        options = {
+            "conf_threshold": conf_threshold,
+            "save_video": save_video,
+            "frame_stride": frame_stride,
+            "target_fps": target_fps,
+            "batch_size": max(1, batch_size),
+            "imgsz": imgsz
+        }
+        job_store.update(job_id, options=options)
+        job_store.submit(run_detection_job, job_id, input_path, upload_id, options)
+        return JSONResponse(status_code=202, content={
+            "status": "success",
+            "job_id": job_id,
+            "job_status": detection_jobs.QUEUED,
+            "status_url": f"/detect/jobs/{job_id}"
+        })
     
     # Process video
+    streaming = False
     try:
         # Output path for processed video
-        output_path = os.path.join(TEMP_FOLDER, f"processed_{video.filename}")
+        output_path = os.path.join(TEMP_FOLDER, f"processed_{filename}")
+        npz_filename = f"detections_{os.path.splitext(filename)[0]}.npz" if save_npz else None
         
-        # Open the video
-        cap = cv2.VideoCapture(input_path)
-        if not cap.isOpened():
-            raise HTTPException(status_code=500, detail="Could not open video file")
+        # Opening a chunked upload can wait minutes for the first bytes; keep it off the event loop
+        cap = await run_in_threadpool(open_capture, input_path, upload_id)
         
         # Get video properties
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        stride = yolo_video.sample_stride(fps, frame_stride, target_fps)
         
-        # Create video writer if save_video is True
-        if save_video:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        frames = process_frames(cap, conf_threshold, stride, max(1, batch_size), imgsz,
+                                output_path if save_video else None, max(1.0, fps / stride), (width, height))
         
-        # Process each frame
-        all_detections = []
-        frame_count = 0
-        start_time = time.time()
+        if format in STREAM_FORMATS:
+            header = {
+                "filename": filename,
+                "processed_filename": f"processed_{filename}" if save_video else None,
+                "fps": fps,
+                "frame_stride": stride,
+                "width": width,
+                "height": height,
+                "render": render
+            }
+            if format == "columnar":
+                header["classes"] = class_names()
+            lines = detection_stream(frames, format, header, lambda: cleanup_input(input_path, upload_id), npz_filename)
+            streaming = True
+            return StreamingResponse(lines, media_type="application/x-ndjson")
         
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
-                
-            # Run YOLOv8 inference
-            results = model(frame, conf=conf_threshold)
-            
-            # Get detections for this frame
-            frame_detections = []
-            for r in results:
-                boxes = r.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf[0])
-                    cls = int(box.cls[0])
-                    name = model.names[cls]
-                    
-                    detection = {
-                        "frame": frame_count,
-                        "class": name,
-                        "confidence": conf,
-                        "bbox": [x1, y1, x2, y2]
-                    }
-                    frame_detections.append(detection)
-            
-            all_detections.extend(frame_detections)
-            
-            # Save frame if requested
-            if save_video:
-                # Draw YOLO detections with default visualization
-                annotated_frame = results[0].plot()
-                out.write(annotated_frame)
-            
-            frame_count += 1
-        
-        # Cleanup
-        cap.release()
-        if save_video:
-            out.release()
+        # Single JSON body with every detection, collected as columns and converted once.
+        # Inference runs on a worker thread so the event loop stays responsive.
+        detections = yolo_video.DetectionBuffer()
+        start_time = time.time()
+        frame_count = await run_in_threadpool(collect_detections, frames, detections)
         
         processing_time = time.time() - start_time
+        if npz_filename:
+            detections.save_npz(os.path.join(TEMP_FOLDER, npz_filename), class_names())
+        
+        names = class_names()
+        columns = detections.to_lists()
+        bboxes = columns["bbox"]
+        all_detections = [
+            {"frame": frame_index, "class": names[cls], "confidence": conf, "bbox": bboxes[4 * i:4 * i + 4]}
+            for i, (frame_index, cls, conf) in enumerate(zip(columns["frame"], columns["class"], columns["confidence"]))
+        ]
         
         # Prepare response
         response = {
-            "filename": video.filename,
-            "processed_filename": f"processed_{video.filename}" if save_video else None,
+            "filename": filename,
+            "processed_filename": f"processed_{filename}" if save_video else None,
             "detections": all_detections,
-            "processing_time": processing_time
+            "frames_processed": frame_count,
+            "frame_stride": stride,
+            "processing_time": processing_time,
+            "detections_filename": npz_filename
         }
         
         return response
@@ -153,9 +241,237 @@ async def detect_video(
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
-        # Cleanup input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
+        # A streamed response cleans up when its stream ends
+        if not streaming:
+            cleanup_input(input_path, upload_id)
+
+def open_capture(input_path, upload_id):
+    """Opens the input video, following it while a chunked upload is still in progress."""
+    import cv2
+    if upload_id:
+        cap = chunked_upload.GrowingVideoCapture(input_path, lambda: upload_store.is_complete(upload_id))
+    else:
+        cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise HTTPException(status_code=500, detail="Could not open video file")
+    return cap
+
+def cleanup_input(input_path, upload_id):
+    """Removes the temporary input file (chunked uploads belong to the upload store)."""
+    if not upload_id and os.path.exists(input_path):
+        os.remove(input_path)
+
+def class_names():
+    """Model class names indexed by class id."""
+    names = get_model().names
+    return [names[i] for i in range(len(names))]
+
+def process_frames(cap, conf_threshold, stride, batch_size, imgsz, output_path, output_fps, size):
+    """
+    Runs detection over the sampled frames of cap. If output_path is given, the
+    frames and their boxes are handed to a writer process that draws and encodes
+    the annotated video alongside. Releases cap and waits for the writer when done.
+    Yields:
+        (frame_index, detections) per sampled frame, detections being the
+        (n, 6) array from yolo_video.detection_array
+    """
+    out = None
+    if output_path:
+        import annotated_writer
+        out = annotated_writer.AnnotatedVideoWriter(output_path, output_fps, size, class_names())
+    try:
+        for frame_index, frame, r in yolo_video.detect_batches(get_model(), cap, conf_threshold, stride, batch_size, imgsz):
+            detections = yolo_video.detection_array(r)
+            if out is not None:
+                out.write(frame, detections)
+            yield frame_index, detections
+    finally:
+        cap.release()
+        if out is not None:
+            out.close()
+
+def collect_detections(frames, detections):
+    """Appends every frame's detections to a DetectionBuffer. Returns the number of frames."""
+    frame_count = 0
+    for frame_index, frame_detections in frames:
+        detections.append(frame_index, frame_detections)
+        frame_count += 1
+    return frame_count
+
+def frame_record(frame_index, detections, names):
+    """NDJSON "frame" line object for one frame's (n, 6) detections array."""
+    return {
+        "type": "frame",
+        "frame": frame_index,
+        "detections": [
+            {"class": names[int(cls)], "confidence": round(conf, 4), "bbox": [int(x1), int(y1), int(x2), int(y2)]}
+            for x1, y1, x2, y2, conf, cls in detections.tolist()
+        ]
+    }
+
+def detection_stream(frames, format, header, cleanup, npz_filename=None):
+    """
+    NDJSON lines for a streamed /detect/video response. Each line is an object
+    with a "type": one "start" (the header), then "frame" lines (ndjson) or
+    "block" lines (columnar), then "end", or "error" if processing fails.
+    Only frames with detections are sent. Runs in Starlette's threadpool, so
+    inference does not block the event loop. With npz_filename, every
+    detection is also kept (as compact columns) and saved when the video ends.
+    """
+    frame_count = 0
+    start_time = time.time()
+    names = class_names()
+    block = yolo_video.DetectionBuffer(COLUMNAR_BLOCK_SIZE)
+    saved = yolo_video.DetectionBuffer() if npz_filename else None
+    try:
+        yield json.dumps({"type": "start", **header}) + "\n"
+        for frame_index, detections in frames:
+            frame_count += 1
+            if len(detections) == 0:
+                continue
+            if saved is not None:
+                saved.append(frame_index, detections)
+            if format == "ndjson":
+                yield json.dumps(frame_record(frame_index, detections, names)) + "\n"
+                continue
+            block.append(frame_index, detections)
+            if len(block) >= COLUMNAR_BLOCK_SIZE:
+                yield columnar_line(block)
+                block.clear()
+        if format == "columnar" and len(block):
+            yield columnar_line(block)
+        end = {
+            "type": "end",
+            "frames_processed": frame_count,
+            "processing_time": time.time() - start_time
+        }
+        if saved is not None:
+            saved.save_npz(os.path.join(TEMP_FOLDER, npz_filename), names)
+            end["detections_filename"] = npz_filename
+        yield json.dumps(end) + "\n"
+    except Exception as e:
+        print(f"Error streaming detections: {str(e)}")
+        yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+    finally:
+        frames.close()
+        cleanup()
+
+def columnar_line(block):
+    """One columnar block line: parallel per-detection arrays, bbox flattened as x1,y1,x2,y2,..."""
+    return json.dumps({"type": "block", **block.to_lists()}, separators=(",", ":")) + "\n"
+
+def run_detection_job(job_id, input_path, upload_id, options):
+    """
+    Processes a queued job once a concurrency slot is free. Detections are
+    appended to the job's detections.ndjson as frames finish; progress is
+    recorded about once per JOB_PROGRESS_INTERVAL seconds.
+    """
+    import cv2
+    try:
+        with job_store.slot():
+            start_time = time.time()
+            job_store.update(job_id, status=detection_jobs.RUNNING, started_at=start_time)
+            cap = open_capture(input_path, upload_id)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            stride = yolo_video.sample_stride(fps, options["frame_stride"], options["target_fps"])
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if upload_id:
+                # The container's count is unreliable while the upload is incomplete
+                total_frames = 0
+            expected = -(-total_frames // stride) if total_frames > 0 else 0
+            size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            output_path = job_store.path(job_id, "processed.mp4") if options["save_video"] else None
+            frames = process_frames(cap, options["conf_threshold"], stride, options["batch_size"],
+                                    options["imgsz"], output_path, max(1.0, fps / stride), size)
+
+            names = class_names()
+            detections = yolo_video.DetectionBuffer()
+            frame_count = 0
+            last_update = start_time
+            with open(job_store.path(job_id, "detections.ndjson"), "w", encoding="utf-8") as f:
+                for frame_index, frame_detections in frames:
+                    frame_count += 1
+                    if len(frame_detections):
+                        detections.append(frame_index, frame_detections)
+                        f.write(json.dumps(frame_record(frame_index, frame_detections, names)) + "\n")
+                    if time.time() - last_update >= JOB_PROGRESS_INTERVAL:
+                        f.flush()
+                        last_update = time.time()
+                        job_store.update(job_id, frames_processed=frame_count, detections_count=len(detections),
+                                         expected_frames=expected, frame_stride=stride,
+                                         progress=min(99.0, 100.0 * frame_count / expected) if expected else 0.0)
+
+            detections.save_npz(job_store.path(job_id, "detections.npz"), names)
+            job_store.update(job_id, status=detection_jobs.COMPLETED, progress=100.0,
+                             frames_processed=frame_count, detections_count=len(detections),
+                             expected_frames=expected, frame_stride=stride,
+                             processing_time=time.time() - start_time, finished_at=time.time(),
+                             has_video=output_path is not None)
+    except Exception as e:
+        message = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"Detection job {job_id} failed: {message}")
+        job_store.update(job_id, status=detection_jobs.FAILED, error=message, finished_at=time.time())
+    finally:
+        cleanup_input(input_path, upload_id)
+
+def get_job_or_404(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/detect/jobs/{job_id}")
+async def get_detection_job(job_id: str):
+    """
+    Status of a background detection job: status (queued, running, completed,
+    failed), progress (0-100, estimated from the frame count), frames_processed,
+    detections_count, error, and the result URLs once completed
+    """
+    job = get_job_or_404(job_id)
+    if job["status"] == detection_jobs.COMPLETED:
+        job["detections_url"] = f"/detect/jobs/{job_id}/detections"
+        job["npz_url"] = f"/detect/jobs/{job_id}/detections.npz"
+        if job.get("has_video"):
+            job["video_url"] = f"/detect/jobs/{job_id}/video"
+    return job
+
+@app.get("/detect/jobs/{job_id}/detections")
+async def get_detection_job_results(job_id: str, offset: int = 0):
+    """
+    Detections found so far, as the NDJSON frame objects of format=ndjson.
+    Pass the returned next_offset back to receive only newer frames; done is
+    true once the job has finished and everything has been returned.
+    """
+    job = get_job_or_404(job_id)
+    frames, next_offset = await run_in_threadpool(job_store.read_partial, job_id, "detections.ndjson", max(0, offset))
+    done = False
+    if job["status"] in detection_jobs.FINISHED_STATES:
+        path = job_store.path(job_id, "detections.ndjson")
+        done = not os.path.exists(path) or next_offset >= os.path.getsize(path)
+    return {
+        "job_status": job["status"],
+        "frames": frames,
+        "next_offset": next_offset,
+        "done": done
+    }
+
+@app.get("/detect/jobs/{job_id}/video")
+async def get_detection_job_video(job_id: str):
+    """Annotated video of a completed job"""
+    job = get_job_or_404(job_id)
+    path = job_store.path(job_id, "processed.mp4")
+    if job["status"] != detection_jobs.COMPLETED or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Video not available")
+    return FileResponse(path, media_type="video/mp4")
+
+@app.get("/detect/jobs/{job_id}/detections.npz")
+async def get_detection_job_npz(job_id: str):
+    """Every detection of a completed job as column arrays (see DetectionBuffer.save_npz)"""
+    job = get_job_or_404(job_id)
+    path = job_store.path(job_id, "detections.npz")
+    if job["status"] != detection_jobs.COMPLETED or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Detections not available")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"detections_{job_id}.npz")
 
 @app.get("/video/{filename}")
 async def get_processed_video(filename: str):
@@ -169,4 +485,4 @@ async def get_processed_video(filename: str):
     return FileResponse(file_path)
 
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("video_detector_api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
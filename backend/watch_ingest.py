@@ -0,0 +1,189 @@
+"""
+Folder-watch ingestion of suspect photos.
+
+Photos are dropped into a folder together with a sidecar that lists them,
+one sidecar per batch. The sidecar is written last and starts the batch:
+
+    incoming/batch_0042.csv     file,name,thana
+                                0001.jpg,Ravi Kumar,Central Police Station
+    incoming/batch_0042.json    [{"file": "0001.jpg", "name": "...", "thana": "..."}]
+
+Image paths are relative to the sidecar. Write the sidecar under a
+dot-name and rename it into place so a half-written file is never read.
+Only files that are new or have changed (size/mtime) since they were last
+ingested are enrolled, through the bulk pipeline and its enrollment cache.
+Source files are never deleted.
+
+Sidecars are picked up with inotify on Linux (requires inotify_simple) and by
+polling everywhere else.
+
+Usage: python watch_ingest.py [drop_folder] [poll_seconds]
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+import db
+import migrations
+from bulk_enroll import enroll_images, DB_PATH
+
+SIDECAR_EXTENSIONS = (".csv", ".json")
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+
+def read_sidecar(sidecar_path):
+    """
+    Reads a CSV or JSON batch sidecar.
+    Returns:
+        List of (image_path, name, thana) with image paths resolved against the sidecar
+    """
+    base_dir = os.path.dirname(os.path.abspath(sidecar_path))
+    if sidecar_path.lower().endswith(".csv"):
+        with open(sidecar_path, "r", encoding="utf-8", newline="") as f:
+            entries = list(csv.DictReader(f))
+    else:
+        with open(sidecar_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+
+    jobs = []
+    for line_no, entry in enumerate(entries, start=1):
+        file_name = (entry.get("file") or "").strip()
+        name = (entry.get("name") or "").strip()
+        thana = (entry.get("thana") or "").strip()
+        if not file_name or not name or not thana:
+            print(f"{sidecar_path}: entry {line_no} needs file, name and thana, skipping")
+            continue
+        jobs.append((os.path.join(base_dir, file_name), name, thana))
+    return jobs
+
+
+def changed_jobs(conn, jobs):
+    """
+    Filters jobs down to files that are new or changed since their last ingest.
+    Changed files have their manifest row cleared so the bulk pipeline
+    enrolls them again. Missing files are reported and skipped.
+    """
+    pending = []
+    for job in jobs:
+        image_path = job[0]
+        try:
+            stat = os.stat(image_path)
+        except FileNotFoundError:
+            print(f"Missing file {image_path}, skipping")
+            continue
+        row = conn.execute("SELECT size, mtime_ns FROM ingest_files WHERE file_path = ?", (image_path,)).fetchone()
+        if row is not None and row == (stat.st_size, stat.st_mtime_ns):
+            continue
+        if row is not None:
+            conn.execute("DELETE FROM enrollment_manifest WHERE source_path = ?", (image_path,))
+        pending.append((job, stat))
+    conn.commit()
+    return pending
+
+
+def ingest_sidecar(sidecar_path, db_path=DB_PATH, rec_model=None, on_batch=None):
+    """Enrolls the new or changed files listed in one sidecar. Returns the bulk stats, or None."""
+    try:
+        jobs = read_sidecar(sidecar_path)
+    except Exception as e:
+        print(f"Could not read sidecar {sidecar_path}: {str(e)}")
+        return None
+
+    conn = db.connect(db_path)
+    try:
+        migrations.migrate(conn)
+        pending = changed_jobs(conn, jobs)
+        if not pending:
+            return None
+
+        stats = enroll_images([job for job, _ in pending], db_path=db_path, rec_model=rec_model,
+                              workers=min(len(pending), os.cpu_count() or 1), on_batch=on_batch)
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        conn.executemany(
+            "INSERT OR REPLACE INTO ingest_files (file_path, size, mtime_ns, ingested_at) VALUES (?, ?, ?, ?)",
+            [(job[0], stat.st_size, stat.st_mtime_ns, now) for job, stat in pending]
+        )
+        conn.commit()
+        print(f"{os.path.basename(sidecar_path)}: enrolled {stats['enrolled']}, duplicates {stats['duplicate']}, "
+              f"failed {stats['failed']}")
+        return stats
+    finally:
+        conn.close()
+
+
+def _ingest_safely(sidecar_path, db_path, rec_model, on_batch):
+    """ingest_sidecar that logs instead of raising, so one bad batch never stops the watcher."""
+    try:
+        return ingest_sidecar(sidecar_path, db_path, rec_model, on_batch)
+    except Exception as e:
+        print(f"Error ingesting {sidecar_path}: {str(e)}")
+        return None
+
+
+def find_sidecars(drop_dir):
+    """
+    Lists batch sidecars in the drop folder with their mtimes, oldest first.
+    Sidecars removed while listing are left out.
+    """
+    sidecars = []
+    for f in os.listdir(drop_dir):
+        if f.lower().endswith(SIDECAR_EXTENSIONS) and not f.startswith("."):
+            path = os.path.join(drop_dir, f)
+            try:
+                sidecars.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+    return [(path, mtime) for mtime, path in sorted(sidecars)]
+
+
+def watch(drop_dir, db_path=DB_PATH, poll_seconds=5.0, rec_model=None, on_batch=None, stop_event=None):
+    """
+    Ingests existing sidecars, then keeps ingesting new or rewritten ones until
+    stop_event is set. Uses inotify when available and polling otherwise.
+    """
+    os.makedirs(drop_dir, exist_ok=True)
+    for sidecar, _ in find_sidecars(drop_dir):
+        _ingest_safely(sidecar, db_path, rec_model, on_batch)
+
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    if INotify is not None and sys.platform.startswith("linux"):
+        print(f"Watching {drop_dir} with inotify")
+        inotify = INotify()
+        inotify.add_watch(drop_dir, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        while not stopped():
+            for event in inotify.read(timeout=int(poll_seconds * 1000)):
+                if event.name.lower().endswith(SIDECAR_EXTENSIONS) and not event.name.startswith("."):
+                    _ingest_safely(os.path.join(drop_dir, event.name), db_path, rec_model, on_batch)
+        inotify.close()
+        return
+
+    print(f"Polling {drop_dir} every {poll_seconds}s")
+    seen = dict(find_sidecars(drop_dir))
+    while not stopped():
+        time.sleep(poll_seconds)
+        try:
+            sidecars = find_sidecars(drop_dir)
+        except OSError as e:
+            print(f"Could not list {drop_dir}: {str(e)}")
+            continue
+        for sidecar, mtime in sidecars:
+            if seen.get(sidecar) != mtime:
+                seen[sidecar] = mtime
+                _ingest_safely(sidecar, db_path, rec_model, on_batch)
+
+
+if __name__ == "__main__":
+    drop_folder = sys.argv[1] if len(sys.argv) > 1 else "incoming"
+    poll = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    try:
+        watch(drop_folder, poll_seconds=poll)
+    except KeyboardInterrupt:
+        print("Stopped watching")
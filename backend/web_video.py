@@ -0,0 +1,163 @@
+"""
+Browser-ready evidence clips.
+
+cv2.VideoWriter writes MPEG-4 Part 2 ("mp4v") with the moov atom at the end
+of the file, which most browsers either can't decode or can't start playing
+before the whole file has downloaded. make_web_playable() rewrites a clip in
+place as H.264 with the moov atom up front (faststart): a stream copy when the
+clip is already H.264, a transcode otherwise. It also saves a JPEG poster
+frame next to it. This needs an ffmpeg binary (on PATH, in SHERLOCK_FFMPEG
+or from the optional imageio-ffmpeg package). Without one, clips are left as
+they are.
+
+range_response() serves a file with Range support (206 Partial Content), so
+players can seek within a clip without downloading it first.
+"""
+
+import os
+import shutil
+import subprocess
+from fastapi.responses import Response, StreamingResponse
+
+H264_FOURCCS = ("avc1", "h264", "H264", "x264", "X264")
+TRANSCODE_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p"]
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_ffmpeg = None
+
+
+def find_ffmpeg():
+    """Returns the ffmpeg executable to use, or None if there isn't one."""
+    global _ffmpeg
+    if _ffmpeg is None:
+        path = os.environ.get("SHERLOCK_FFMPEG") or shutil.which("ffmpeg")
+        if path is None:
+            try:
+                import imageio_ffmpeg
+                path = imageio_ffmpeg.get_ffmpeg_exe()
+            except Exception:
+                path = ""
+        _ffmpeg = path
+    return _ffmpeg or None
+
+
+def video_fourcc(path):
+    """Four-character codec code of a video file as reported by OpenCV."""
+    import cv2
+    cap = cv2.VideoCapture(path)
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    cap.release()
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+
+def poster_path(clip_path):
+    return os.path.splitext(clip_path)[0] + ".poster.jpg"
+
+
+def save_poster(clip_path, at_seconds=0.5):
+    """Writes a JPEG of the frame at at_seconds (or the first frame) next to the clip."""
+    import cv2
+    cap = cv2.VideoCapture(clip_path)
+    cap.set(cv2.CAP_PROP_POS_MSEC, at_seconds * 1000)
+    ret, frame = cap.read()
+    if not ret:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        return None
+    path = poster_path(clip_path)
+    cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return path
+
+
+def make_web_playable(clip_path):
+    """
+    Rewrites a clip in place as faststart H.264 MP4 and saves its poster frame.
+    Returns:
+        "remuxed", "transcoded", or "skipped" when ffmpeg is unavailable or fails
+    """
+    save_poster(clip_path)
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        print(f"ffmpeg not found, leaving {clip_path} as written")
+        return "skipped"
+
+    remux = video_fourcc(clip_path) in H264_FOURCCS
+    codec_args = ["-c:v", "copy"] if remux else TRANSCODE_ARGS
+    tmp_path = clip_path + ".web.mp4"
+    command = [ffmpeg, "-y", "-loglevel", "error", "-i", clip_path, *codec_args, "-an",
+               "-movflags", "+faststart", tmp_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error converting {clip_path}: {result.stderr.strip()}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return "skipped"
+    os.replace(tmp_path, clip_path)
+    return "remuxed" if remux else "transcoded"
+
+
+def make_web_playable_all(clip_paths):
+    """Converts every clip that exists, logging failures without raising."""
+    for clip_path in clip_paths:
+        if not os.path.exists(clip_path):
+            continue
+        try:
+            outcome = make_web_playable(clip_path)
+            print(f"Web clip {clip_path}: {outcome}")
+        except Exception as e:
+            print(f"Error preparing {clip_path} for the web: {str(e)}")
+
+
+def parse_range(range_header, file_size):
+    """
+    Parses a single "bytes=start-end" range (open-ended and suffix forms included).
+    Returns:
+        (start, end) inclusive, None for a header to ignore (absent, malformed
+        or multi-range: serve the whole file), or "unsatisfiable"
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            suffix = int(end_text)
+            if suffix == 0:
+                return "unsatisfiable"
+            return max(0, file_size - suffix), file_size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else file_size - 1
+    except ValueError:
+        return None
+    if start >= file_size or end < start:
+        return "unsatisfiable"
+    return start, min(end, file_size - 1)
+
+
+def _read_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def range_response(range_header, path, media_type, headers=None):
+    """Serves path whole (200) or the requested byte range (206), advertising Range support."""
+    file_size = os.path.getsize(path)
+    headers = dict(headers or {}, **{"Accept-Ranges": "bytes"})
+    byte_range = parse_range(range_header, file_size)
+    if byte_range == "unsatisfiable":
+        return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{file_size}"}))
+    if byte_range is None:
+        headers["Content-Length"] = str(file_size)
+        return StreamingResponse(_read_file(path, 0, file_size), media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_read_file(path, start, end - start + 1), status_code=206,
+                             media_type=media_type, headers=headers)
@@ -0,0 +1,185 @@
+"""
+Frame sampling, decode prefetch and batched YOLOv8 inference for videos.
+
+Frames are decoded on a background thread into a bounded queue while the
+model runs, only every stride-th frame is decoded in full (the rest are
+grabbed and dropped), and sampled frames are sent to the model in batches of
+batch_size per call instead of one call per frame.
+
+Detections come off each result as one array (detection_array) and collect
+in DetectionBuffer's column arrays rather than a dict per box.
+"""
+
+import queue
+import threading
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 8
+PREFETCH_FRAMES = 64
+
+_END = object()
+
+
+def sample_stride(fps, frame_stride=1, target_fps=None):
+    """
+    Frames to advance per sampled frame. target_fps, when given, overrides
+    frame_stride, e.g. 30 fps video at target_fps=5 -> stride 6.
+    """
+    if target_fps:
+        if fps <= 0:
+            return max(1, int(frame_stride))
+        return max(1, round(fps / target_fps))
+    return max(1, int(frame_stride))
+
+
+def prefetch_frames(cap, stride=1, max_prefetch=PREFETCH_FRAMES):
+    """
+    Yields (frame_index, frame) for every stride-th frame of an opened
+    cv2.VideoCapture, decoding on a background thread. Skipped frames are
+    grab()bed without being retrieved. The capture is not released.
+    """
+    frames = queue.Queue(maxsize=max_prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up if the consumer stopped early, instead of blocking forever
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def decode():
+        frame_index = 0
+        try:
+            while not stop.is_set():
+                if frame_index % stride:
+                    if not cap.grab():
+                        break
+                else:
+                    ret, frame = cap.read()
+                    if not ret or not put((frame_index, frame)):
+                        break
+                frame_index += 1
+        except Exception as e:
+            put(e)
+        put(_END)
+
+    thread = threading.Thread(target=decode, name="frame-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def batched(items, batch_size):
+    """Groups an iterable into lists of up to batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detect_batches(model, cap, conf, stride=1, batch_size=DEFAULT_BATCH_SIZE, imgsz=None):
+    """
+    Runs the model over the sampled frames of cap in batches.
+    Yields:
+        (frame_index, frame, result) per sampled frame, in order
+    """
+    options = {"conf": conf, "verbose": False}
+    if imgsz:
+        options["imgsz"] = imgsz
+    for batch in batched(prefetch_frames(cap, stride), batch_size):
+        results = model([frame for _, frame in batch], **options)
+        for (frame_index, frame), result in zip(batch, results):
+            yield frame_index, frame, result
+
+
+def detection_array(result):
+    """
+    All boxes of one result as a single (n, 6) float32 array of
+    x1, y1, x2, y2, confidence, class id, copied off the device in one go.
+    """
+    data = result.boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data[:, :6], dtype=np.float32)
+
+
+class DetectionBuffer:
+    """
+    Growable column buffers for detections across frames: frame index,
+    class id, confidence and an (n, 4) integer bbox. Capacity doubles when
+    full, so appending a frame costs a few slice copies.
+    """
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self.frame = np.empty(capacity, dtype=np.int32)
+        self.cls = np.empty(capacity, dtype=np.int16)
+        self.conf = np.empty(capacity, dtype=np.float32)
+        self.bbox = np.empty((capacity, 4), dtype=np.int32)
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed):
+        capacity = len(self.frame)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("frame", "cls", "conf", "bbox"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, frame_index, detections):
+        """Adds the (n, 6) array from detection_array() for one frame."""
+        n = len(detections)
+        if n == 0:
+            return
+        end = self._size + n
+        if end > len(self.frame):
+            self._grow(end)
+        self.frame[self._size:end] = frame_index
+        self.cls[self._size:end] = detections[:, 5]
+        self.conf[self._size:end] = detections[:, 4]
+        self.bbox[self._size:end] = detections[:, :4]  # truncates like int()
+        self._size = end
+
+    def clear(self):
+        self._size = 0
+
+    def columns(self):
+        """Dict of trimmed array views (no copy)."""
+        n = self._size
+        return {"frame": self.frame[:n], "class": self.cls[:n], "confidence": self.conf[:n], "bbox": self.bbox[:n]}
+
+    def to_lists(self, decimals=4):
+        """Columns as plain lists for JSON, bbox flattened to x1, y1, x2, y2, ..."""
+        columns = self.columns()
+        return {
+            "frame": columns["frame"].tolist(),
+            "class": columns["class"].tolist(),
+            "confidence": np.round(columns["confidence"].astype(np.float64), decimals).tolist(),
+            "bbox": columns["bbox"].ravel().tolist(),
+        }
+
+    def save_npz(self, path, class_names):
+        """Writes the columns plus the class name table to a compressed .npz."""
+        np.savez_compressed(path, classes=np.array(class_names), **{
+            ("class_id" if name == "class" else name): values for name, values in self.columns().items()})
@@ -0,0 +1,3 @@
+// Base URL of the SherlockAI gateway (backend/gateway.py), which serves every backend API.
+// Defaults to the Vite dev proxy (/api -> http://localhost:8001); set VITE_API_BASE_URL to point elsewhere.
+export const API_BASE_URL: string = import.meta.env.VITE_API_BASE_URL ?? '/api';
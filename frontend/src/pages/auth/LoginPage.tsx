@@ -3,6 +3,7 @@ import React, { useState, useEffect } from 'react';
 import Select from 'react-select';
 import { Lock, AlertCircle, Eye, EyeOff, Loader2 } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
+import { API_BASE_URL } from '../../config';
 
 interface PoliceStation {
   value: string;
@@ -21,7 +22,6 @@ const LoginPage: React.FC = () => {
   const [isLoadingStations, setIsLoadingStations] = useState(true);
 
   // API base URL
-  const API_BASE_URL = "/api"; // Using Vite's proxy to avoid CORS issues
 
   // Fetch registered police stations from SQLite via API
   useEffect(() => {
@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import { Shield, AlertCircle, Eye, EyeOff } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
+import { API_BASE_URL } from '../../config';
 
 const RegisterPage: React.FC = () => {
   const navigate = useNavigate();
@@ -15,7 +16,6 @@ const RegisterPage: React.FC = () => {
   const [showPassword, setShowPassword] = useState(false);
 
   // API base URL
-  const API_BASE_URL = "/api"; // Using Vite's proxy to avoid CORS issues
 
   const validateThanaId = async (id: string): Promise<boolean> => {
     if (!id) return false;
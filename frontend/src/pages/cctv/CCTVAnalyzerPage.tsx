@@ -14,6 +14,7 @@ import {
 } from "lucide-react";
 import { useNavigate } from "react-router-dom";
 import { convertAnalysisToReport } from "./VideoAnalysisReport";
+import { API_BASE_URL } from "../../config";
 
 interface FileUploadProps {
   accept: string;
@@ -188,9 +189,63 @@ interface AnalysisResult {
   suspectName: string;
   timestamp: string;
   screenshot: string;
+  thumbnail?: string;
   videoClip?: string;
 }
 
+const UPLOAD_MAX_RETRIES = 5;
+
+// Uploads file to a chunked upload session, resuming from the server's offset
+// after a failed chunk. onFirstChunk runs once the first chunk is stored.
+async function uploadInChunks(
+  sessionUrl: string,
+  file: File,
+  chunkSize: number,
+  onFirstChunk: () => Promise<void>
+) {
+  let offset = 0;
+  let retries = 0;
+  let started = false;
+
+  while (offset < file.size) {
+    const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+    const digest = await crypto.subtle.digest("SHA-256", chunk);
+    const checksum = Array.from(new Uint8Array(digest))
+      .map((b) => b.toString(16).padStart(2, "0"))
+      .join("");
+
+    try {
+      const response = await fetch(`${sessionUrl}?offset=${offset}`, {
+        method: "PUT",
+        headers: { "X-Chunk-SHA256": checksum },
+        body: chunk,
+      });
+      if (!response.ok && response.status !== 409) {
+        throw new Error(`Chunk upload failed: ${response.status}`);
+      }
+      // A 409 also reports the offset the server has, so both paths resume from it
+      const data = await response.json();
+      offset = data.offset;
+      retries = 0;
+    } catch (err) {
+      if (++retries > UPLOAD_MAX_RETRIES) {
+        throw new Error("Failed to upload video");
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+      const status = await fetch(sessionUrl).then((r) => r.json()).catch(() => null);
+      if (status && status.status === "success") {
+        offset = status.offset;
+      }
+      continue;
+    }
+
+    if (!started) {
+      started = true;
+      await onFirstChunk();
+    }
+  }
+}
+
 interface AnalysisStats {
   framesProcessed: number;
   matchesFound: number;
@@ -256,7 +311,6 @@ const CCTVAnalyzerPage: React.FC = () => {
   const [error, setError] = useState<string | null>(null);
 
   // API base URL
-  const API_BASE_URL = "/api"; // Using Vite's proxy to avoid CORS issues
 
   const handleSuspectImageSelect = (file: File) => {
     setSuspectImage(file);
@@ -302,31 +356,35 @@ const CCTVAnalyzerPage: React.FC = () => {
         console.log("Suspect added successfully:", suspectData);
       }
 
-      // Upload the video
-      const formData = new FormData();
-      formData.append("video", videoToUse);
+      // Start a resumable chunked upload of the video
+      const sessionForm = new FormData();
+      sessionForm.append("filename", videoToUse.name);
+      sessionForm.append("size", String(videoToUse.size));
 
-      const uploadResponse = await fetch(`${API_BASE_URL}/upload-video`, {
+      const sessionResponse = await fetch(`${API_BASE_URL}/upload-video/sessions`, {
         method: "POST",
-        body: formData,
+        body: sessionForm,
       });
 
-      if (!uploadResponse.ok) {
+      if (!sessionResponse.ok) {
         throw new Error("Failed to upload video");
       }
 
-      const uploadData = await uploadResponse.json();
-      const { task_id } = uploadData;
+      const { task_id, upload_id, chunk_size } = await sessionResponse.json();
       setTaskId(task_id);
 
-      // Start analysis
-      const analyzeResponse = await fetch(`${API_BASE_URL}/analyze-video/${task_id}`, {
-        method: "POST",
-      });
+      // Analysis starts on the first chunk and follows the upload
+      const startAnalysis = async () => {
+        const analyzeResponse = await fetch(`${API_BASE_URL}/analyze-video/${task_id}`, {
+          method: "POST",
+        });
 
-      if (!analyzeResponse.ok) {
-        throw new Error("Failed to start analysis");
-      }
+        if (!analyzeResponse.ok) {
+          throw new Error("Failed to start analysis");
+        }
+      };
+
+      await uploadInChunks(`${API_BASE_URL}/upload-video/sessions/${upload_id}`, videoToUse, chunk_size, startAnalysis);
 
       // Poll for status updates
       const statusInterval = setInterval(async () => {
@@ -352,6 +410,8 @@ const CCTVAnalyzerPage: React.FC = () => {
                 suspectName: result.suspectName,
                 timestamp: result.timestamp,
                 screenshot: `${API_BASE_URL}${result.screenshot}`,
+                // Resized copy for the result cards; the report keeps the full frame
+                thumbnail: `${API_BASE_URL}/thumbnail${result.screenshot}?w=384`,
                 videoClip: `${API_BASE_URL}/detected_clips_original/${result.suspectName}_${result.timestamp.replace(/[: ]/g, '_')}.mp4`
               }));
 
@@ -721,15 +781,16 @@ const CCTVAnalyzerPage: React.FC = () => {
                               <video
                                 src={result.videoClip}
                                 controls
+                                preload="metadata"
                                 className="w-full h-full object-cover"
-                                poster={result.screenshot}
+                                poster={result.thumbnail || result.screenshot}
                                 onError={(e) => {
                                   // Fallback to screenshot if video fails to load
                                   const target = e.target as HTMLVideoElement;
                                   const parent = target.parentElement;
                                   if (parent) {
                                     const img = document.createElement('img');
-                                    img.src = result.screenshot;
+                                    img.src = result.thumbnail || result.screenshot;
                                     img.className = "w-full h-full object-cover";
                                     img.alt = `Detection at ${result.timestamp}`;
                                     parent.innerHTML = '';
@@ -741,8 +802,9 @@ const CCTVAnalyzerPage: React.FC = () => {
                           ) : (
                             <div className="aspect-video">
                               <img
-                                src={result.screenshot}
+                                src={result.thumbnail || result.screenshot}
                                 alt={`Detection at ${result.timestamp}`}
+                                loading="lazy"
                                 className="w-full h-full object-cover"
                               />
                             </div>
@@ -5,9 +5,9 @@ import {
   ArrowLeft, Camera, AlertCircle, Upload,
   UserPlus, Play, Loader2, Video, VideoOff
 } from 'lucide-react';
+import { API_BASE_URL } from '../../config';
 
 // API endpoint constants
-const API_BASE_URL = 'http://localhost:8001';
 const UPLOAD_SUSPECT_ENDPOINT = `${API_BASE_URL}/upload-suspect`;
 const PROCESS_FRAME_ENDPOINT = `${API_BASE_URL}/process-live-frame`;
 
@@ -2,52 +2,80 @@ import React, { useState, useEffect, useCallback } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useNavigate } from 'react-router-dom';
 import { ArrowLeft, Trash2, AlertCircle, Loader2, RefreshCw } from 'lucide-react';
+import { API_BASE_URL } from '../../config';
 
 // API endpoint constants
-const API_BASE_URL = 'http://localhost:8001';
 const GET_FACES_ENDPOINT = `${API_BASE_URL}/get-faces`;
+const COUNT_FACES_ENDPOINT = `${API_BASE_URL}/get-faces/count`;
 const DELETE_FACE_ENDPOINT = `${API_BASE_URL}/delete-face`;
+const PAGE_SIZE = 50;
+
+// Resized copy of a stored image, served and cached by the backend thumbnail service.
+// The version changes when the image is replaced, so the browser may cache each URL for good.
+const thumbnailUrl = (imagePath: string, width: number, version: string | null) =>
+  `${API_BASE_URL}/thumbnail/${imagePath}?w=${width}${version ? `&v=${encodeURIComponent(version)}` : ''}`;
 
 interface FaceData {
   id: string;
   name: string;
-  location: string;
+  thana: string;
   image_path: string;
+  thumbnail_version: string | null;
   created_at: string;
 }
 
 const RecordsPage: React.FC = () => {
   const navigate = useNavigate();
   const [faces, setFaces] = useState<FaceData[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalCount, setTotalCount] = useState<number | null>(null);
   const [isLoading, setIsLoading] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [isDeleting, setIsDeleting] = useState<{[key: string]: boolean}>({});
 
-  // Fetch faces from database
+  // Fetch one page of faces; without a cursor this starts over from the first page
+  const fetchPage = async (cursor: string | null) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+
+    const response = await fetch(`${GET_FACES_ENDPOINT}?${params}`, {
+      method: 'GET',
+      headers: {
+        'Accept': 'application/json',
+      },
+      mode: 'cors',
+    });
+
+    if (!response.ok) {
+      throw new Error(`Server error: ${response.status} ${response.statusText}`);
+    }
+
+    const data = await response.json();
+
+    if (data.status !== 'success') {
+      throw new Error(data.message || 'Failed to fetch faces');
+    }
+    return data as { faces: FaceData[]; next_cursor: string | null };
+  };
+
+  // Fetch the first page of faces and the total count
   const fetchFaces = useCallback(async () => {
     try {
       setIsLoading(true);
       setError(null);
-      
-      const response = await fetch(GET_FACES_ENDPOINT, {
-        method: 'GET',
-        headers: {
-          'Accept': 'application/json',
-        },
-        mode: 'cors',
-      });
 
-      if (!response.ok) {
-        throw new Error(`Server error: ${response.status} ${response.statusText}`);
-      }
+      const [page, countResponse] = await Promise.all([
+        fetchPage(null),
+        fetch(COUNT_FACES_ENDPOINT, { mode: 'cors' }),
+      ]);
+      setFaces(page.faces || []);
+      setNextCursor(page.next_cursor);
 
-      const data = await response.json();
-      
-      if (data.status === 'success') {
-        setFaces(data.faces || []);
-      } else {
-        throw new Error(data.message || 'Failed to fetch faces');
-      }
+      const countData = await countResponse.json();
+      setTotalCount(countData.status === 'success' ? countData.count : null);
     } catch (err) {
       console.error("Error fetching faces:", err);
       setError(err instanceof Error ? err.message : 'Failed to fetch faces from database');
@@ -56,6 +84,24 @@ const RecordsPage: React.FC = () => {
     }
   }, []);
 
+  // Append the next page of faces
+  const loadMore = async () => {
+    if (!nextCursor) {
+      return;
+    }
+    try {
+      setIsLoadingMore(true);
+      const page = await fetchPage(nextCursor);
+      setFaces(prev => [...prev, ...(page.faces || [])]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error("Error fetching faces:", err);
+      setError(err instanceof Error ? err.message : 'Failed to fetch faces from database');
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   // Delete face from database
   const deleteFace = async (faceId: string) => {
     try {
@@ -78,6 +124,7 @@ const RecordsPage: React.FC = () => {
       if (result.status === 'success') {
         // Remove the deleted face from state
         setFaces(faces.filter(face => face.id !== faceId));
+        setTotalCount(prev => (prev === null ? prev : prev - 1));
       } else {
         throw new Error(result.message || 'Failed to delete face');
       }
@@ -161,6 +208,11 @@ const RecordsPage: React.FC = () => {
         <motion.div variants={itemVariants} className="mb-12 text-center">
           <h1 className="text-4xl font-bold mb-2">Face Records</h1>
           <p className="text-gray-400">View and manage face data in the database</p>
+          {totalCount !== null && (
+            <p className="text-gray-500 text-sm mt-2">
+              Showing {faces.length} of {totalCount} records
+            </p>
+          )}
         </motion.div>
 
         {error && (
@@ -205,7 +257,10 @@ const RecordsPage: React.FC = () => {
                     {face.image_path && (
                       <div className="w-full md:w-48 h-48 bg-gray-700 flex-shrink-0">
                         <img 
-                          src={face.image_path.startsWith('http') ? face.image_path : `${API_BASE_URL}/${face.image_path}`} 
+                          src={face.image_path.startsWith('http') ? face.image_path : thumbnailUrl(face.image_path, 384, face.thumbnail_version)} 
+                          srcSet={face.image_path.startsWith('http') ? undefined : [192, 384, 768].map(w => `${thumbnailUrl(face.image_path, w, face.thumbnail_version)} ${w}w`).join(', ')}
+                          sizes="(min-width: 768px) 192px, 100vw"
+                          loading="lazy"
                           alt={face.name}
                           className="w-full h-full object-cover"
                           onError={(e) => {
@@ -219,7 +274,7 @@ const RecordsPage: React.FC = () => {
                       <div className="flex justify-between items-start mb-4">
                         <div>
                           <h2 className="text-2xl font-semibold mb-1">{face.name}</h2>
-                          <p className="text-blue-400">{face.location}</p>
+                          <p className="text-blue-400">{face.thana}</p>
                           {face.created_at && (
                             <p className="text-gray-500 text-sm mt-2">
                               Added on {new Date(face.created_at).toLocaleDateString()} at {new Date(face.created_at).toLocaleTimeString()}
@@ -251,6 +306,20 @@ const RecordsPage: React.FC = () => {
                 </motion.div>
               ))}
             </motion.div>
+            {nextCursor && (
+              <div className="flex justify-center mt-8">
+                <motion.button
+                  whileHover={{ scale: 1.05 }}
+                  whileTap={{ scale: 0.95 }}
+                  onClick={loadMore}
+                  disabled={isLoadingMore}
+                  className="flex items-center gap-2 px-6 py-2 bg-gray-800 rounded-lg hover:bg-gray-700 transition-colors disabled:opacity-50"
+                >
+                  {isLoadingMore && <Loader2 className="w-5 h-5 animate-spin" />}
+                  <span>Load more</span>
+                </motion.button>
+              </div>
+            )}
           </AnimatePresence>
         )}
       </motion.div>
@@ -2,6 +2,7 @@ import React, { useState } from 'react';
 import { motion } from 'framer-motion';
 import { useNavigate } from 'react-router-dom';
 import { ArrowLeft, Upload, Image as ImageIcon, Loader2, Download } from 'lucide-react';
+import { API_BASE_URL } from '../../config';
 
 const SketchToImagePage: React.FC = () => {
   const navigate = useNavigate();
@@ -33,7 +34,7 @@ const SketchToImagePage: React.FC = () => {
       const formData = new FormData();
       formData.append('sketch', sketch);
 
-  const response = await fetch('http://localhost:8001/generate-image', {
+  const response = await fetch(`${API_BASE_URL}/generate-image`, {
         method: 'POST',
         body: formData,
       });